@@ -0,0 +1,144 @@
+""" Contains the ControlServer class. """
+
+import json
+import os
+import selectors
+import socket
+import stat
+import threading
+from typing import Any
+
+
+class ControlServer:
+    """
+    Accepts parameter updates from external controllers on a local socket.
+    `address` is either the path of a Unix socket or a TCP port on localhost.
+    Clients send one json object per line, e.g. {"gamma": [0.1, 0.2, 0.3, 0.4, -1]}.
+    Updates are merged on a background thread, so only the latest value of every field
+    is kept until the frame loop calls `take`, which never blocks on the network.
+    """
+
+    def __init__(self, address:"str|int", fields:"set[str]|None"=None, maxline:int=1 << 16):
+        self.address = address
+        self.fields = fields
+        self.maxline = maxline
+        self.received = 0 # accepted or skipped because a newer update superseded them
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._pending: dict[str, Any] = {}
+        self._selector = selectors.DefaultSelector()
+        self._buffers: dict[socket.socket, bytes] = {}
+        self._listener: "socket.socket|None" = None
+        self._running = False
+        self._thread: "threading.Thread|None" = None
+
+    def start(self):
+        """ Bind the socket and start serving on a background thread. """
+        if self._running:
+            return
+        if isinstance(self.address, str):
+            if os.path.exists(self.address):
+                # Only replace stale sockets, never files that happen to be at the path.
+                if not stat.S_ISSOCK(os.stat(self.address).st_mode):
+                    raise FileExistsError(f"{self.address} exists and is not a socket.")
+                os.remove(self.address)
+            self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._listener.bind(self.address)
+        else:
+            self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._listener.bind(("127.0.0.1", self.address))
+            self.address = self._listener.getsockname()[1]
+        self._listener.listen()
+        self._listener.setblocking(False)
+        self._selector.register(self._listener, selectors.EVENT_READ)
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, name="ControlServer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Close every connection and the socket. """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for connection in list(self._buffers):
+            self._close(connection)
+        if self._listener is not None:
+            self._selector.unregister(self._listener)
+            self._listener.close()
+            self._listener = None
+            if isinstance(self.address, str) and os.path.exists(self.address) \
+                    and stat.S_ISSOCK(os.stat(self.address).st_mode):
+                os.remove(self.address)
+
+    def take(self) -> dict[str, Any]:
+        """ Return the latest value of every field updated since the last call. """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def _serve(self):
+        while self._running:
+            for key, _mask in self._selector.select(timeout=.1):
+                if key.fileobj is self._listener:
+                    self._accept()
+                else:
+                    self._read(key.fileobj)
+
+    def _accept(self):
+        assert self._listener is not None
+        try:
+            connection, _ = self._listener.accept()
+        except BlockingIOError:
+            return
+        connection.setblocking(False)
+        self._buffers[connection] = b""
+        self._selector.register(connection, selectors.EVENT_READ)
+
+    def _read(self, connection):
+        try:
+            data = connection.recv(1 << 16)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._close(connection)
+            return
+        *lines, rest = (self._buffers[connection] + data).split(b"\n")
+        if len(rest) > self.maxline:
+            self.rejected += 1
+            rest = b""
+        self._buffers[connection] = rest
+        # Later lines override earlier ones, so the batch is merged newest first and parsing stops
+        # as soon as every field is known. A flood of updates is mostly skipped and holds the lock once.
+        merged: dict[str, Any] = {}
+        for index in range(len(lines) - 1, -1, -1):
+            if self.fields is not None and merged.keys() >= self.fields:
+                self.received += index + 1
+                break
+            self._merge(lines[index], merged)
+        if merged:
+            with self._lock:
+                self._pending.update(merged)
+
+    def _merge(self, line:bytes, merged:dict[str, Any]):
+        if not line.strip():
+            return
+        try:
+            update = json.loads(line)
+        except ValueError:
+            self.rejected += 1
+            return
+        if not isinstance(update, dict) or (self.fields is not None and not update.keys() <= self.fields):
+            self.rejected += 1
+            return
+        self.received += 1
+        for field, value in update.items():
+            merged.setdefault(field, value)
+
+    def _close(self, connection):
+        self._selector.unregister(connection)
+        del self._buffers[connection]
+        connection.close()
@@ -0,0 +1,169 @@
+"""
+Contains the CutAndProject class, which generates quasiperiodic point sets from a lattice Z^n.
+The cut is c(x) = A x + gamma for points x of the d-dimensional physical space, and the point set is
+every K in Z^n with K - c(x) in [0, 1)^n for some x, i.e. K = ceil(c(x)) as in the multigrid maps.
+Equivalently, the projection of K - gamma to the internal space lies in the projection of the unit cube,
+a zonotope. The Fibonacci chain (2 -> 1), Ammann-Beenker (4 -> 2) and Penrose (5 -> 2) are special cases.
+"""
+
+from itertools import combinations
+
+import numpy as np
+
+from penroseGenerator.src.core.geometry import Line2D
+
+
+def _orthogonal_complement(matrix: np.ndarray) -> np.ndarray:
+    """ Return an orthonormal basis of the complement of the column space of `matrix`, one row per vector. """
+    u, singular, _ = np.linalg.svd(matrix, full_matrices=True)
+    rank = int(np.sum(singular > 1e-10 * max(float(singular.max()), 1.0)))
+    return u[:, rank:].T
+
+
+def _interval_image(matrix: np.ndarray, lower: np.ndarray, upper: np.ndarray):
+    """ Return the bounding box of the image of the box between `lower` and `upper` under `matrix`. """
+    center, radius = (lower + upper) / 2, (upper - lower) / 2
+    return matrix @ center - np.abs(matrix) @ radius, matrix @ center + np.abs(matrix) @ radius
+
+
+class Zonotope:
+    """
+    The zonotope {sum_i t_i g_i, t in [0, 1]^n} of the generators g_i, the rows of `generators`.
+    It is stored as the slabs between its pairs of opposite facets, so testing many points
+    is one matrix product and two comparisons.
+    """
+
+    def __init__(self, generators: np.ndarray) -> None:
+        self.generators = np.asarray(generators, dtype=float)
+        dim = self.generators.shape[1]
+        normals = []
+        if dim == 1:
+            normals.append(np.ones(1))
+        elif dim > 1:
+            # Every facet is spanned by dim - 1 generators, its normal is orthogonal to them.
+            for subset in combinations(range(len(self.generators)), dim - 1):
+                complement = _orthogonal_complement(self.generators[list(subset)].T)
+                if len(complement) == 1:
+                    normals.append(complement[0])
+        self.normals = np.array(normals).reshape(-1, dim)
+        heights = self.generators @ self.normals.T
+        self.lower = np.minimum(heights, 0).sum(axis=0)
+        self.upper = np.maximum(heights, 0).sum(axis=0)
+
+    def contains(self, points: np.ndarray, tolerance: float = 1e-9) -> np.ndarray:
+        """ Return for every row of `points` whether it lies in the (closed) zonotope. """
+        heights = np.asarray(points, dtype=float) @ self.normals.T
+        return np.all((heights >= self.lower - tolerance) & (heights <= self.upper + tolerance), axis=-1)
+
+
+class CutAndProject:
+    """
+    Enumerates the points of a cut-and-project set in a box of physical space.
+    `cut` is the (n, d) matrix A of the cut c(x) = A x + gamma and `projection` the (d, n) matrix
+    placing the lattice points K at `projection @ K`, by default the transpose of `cut`.
+    The first coordinates enumerated are the d grids whose lines cross at the steepest angle.
+    Their cells bound every other coordinate to a few values, and after adding each coordinate
+    the candidates are pruned by the window of the coordinates chosen so far.
+    """
+
+    def __init__(self, cut: np.ndarray, gamma: np.ndarray, projection: "np.ndarray|None" = None) -> None:
+        self.cut = np.asarray(cut, dtype=float)
+        self.gamma = np.asarray(gamma, dtype=float)
+        self.projection = self.cut.T if projection is None else np.asarray(projection, dtype=float)
+        self.dimension, self.physical_dimension = self.cut.shape
+        assert self.gamma.shape == (self.dimension,)
+        assert self.projection.shape == (self.physical_dimension, self.dimension)
+        assert np.linalg.matrix_rank(self.projection @ self.cut) == self.physical_dimension
+        self.internal = _orthogonal_complement(self.cut)
+        self.window = Zonotope(self.internal.T)
+        self.basis = list(max(
+            combinations(range(self.dimension), self.physical_dimension),
+            key=lambda subset: abs(np.linalg.det(self.cut[list(subset)])),
+        ))
+        self.order = self.basis + [j for j in range(self.dimension) if j not in self.basis]
+        # The points restricted to the first i coordinates are a cut-and-project set themselves.
+        self.stages = []
+        for count in range(self.physical_dimension + 1, self.dimension + 1):
+            subset = self.order[:count]
+            internal = _orthogonal_complement(self.cut[subset])
+            self.stages.append((subset, internal, Zonotope(internal.T)))
+
+    @classmethod
+    def from_line(cls, line: Line2D) -> "CutAndProject":
+        """ The squares of the unit lattice crossed by `line`, e.g. the Fibonacci chain for the slope 1/phi. """
+        return cls(line.direction[:, None], line.start)
+
+    @classmethod
+    def from_multigrid(cls, multigridmap) -> "CutAndProject":
+        """
+        The vertices of the tiling of a multigrid map, e.g. a PenroseMap (5 -> 2)
+        or a MultigridMap with four grids for the Ammann-Beenker tiling (4 -> 2).
+        """
+        factor = np.asarray(multigridmap.c_to_r5_factor)
+        placement = np.asarray(multigridmap.r5_to_c_factor)
+        return cls(
+            np.stack([factor.real, -factor.imag], axis=1),
+            np.asarray(multigridmap.gamma, dtype=float),
+            np.stack([placement.real, placement.imag]),
+        )
+
+    def positions(self, k_vals: np.ndarray) -> np.ndarray:
+        """ Return the positions of the lattice points `k_vals` in physical space. """
+        return np.asarray(k_vals, dtype=float) @ self.projection.T
+
+    def contains(self, k_vals: np.ndarray) -> np.ndarray:
+        """ Return for every lattice point whether it belongs to the point set. """
+        return self.window.contains((np.asarray(k_vals, dtype=float) - self.gamma) @ self.internal.T)
+
+    def _cell_corners(self, prefixes: np.ndarray) -> np.ndarray:
+        """ Return the corners (m, 2^d, d) of the cells of the basis grids with the values `prefixes`. """
+        inverse = np.linalg.inv(self.cut[self.basis])
+        steps = np.array(np.meshgrid(*[[0, 1]] * self.physical_dimension, indexing="ij")).reshape(
+            self.physical_dimension, -1).T
+        targets = (prefixes - self.gamma[self.basis])[:, None, :] - steps
+        return targets @ inverse.T
+
+    def points(self, lower: np.ndarray, upper: np.ndarray, blocksize: int = 1 << 16):
+        """
+        Return the lattice points (m, n) whose positions lie in the box between `lower` and `upper`,
+        and their positions (m, d). The cells of the basis grids are processed in blocks of `blocksize`,
+        so memory stays bounded for large regions.
+        """
+        lower, upper = np.asarray(lower, dtype=float), np.asarray(upper, dtype=float)
+        # Positions are G x + P (gamma + t) with G = P A, which bounds x and with it every coordinate.
+        spread = self.projection @ (self.gamma + .5)
+        inverse = np.linalg.inv(self.projection @ self.cut)
+        xlow, xhigh = _interval_image(
+            inverse, lower - spread - np.abs(self.projection).sum(axis=1) / 2,
+            upper - spread + np.abs(self.projection).sum(axis=1) / 2,
+        )
+        klow, khigh = _interval_image(self.cut[self.basis], xlow, xhigh)
+        ranges = [np.arange(np.ceil(a + g), np.ceil(b + g) + 1)
+                  for a, b, g in zip(klow, khigh, self.gamma[self.basis])]
+        grid = np.array(np.meshgrid(*ranges, indexing="ij")).reshape(self.physical_dimension, -1).T
+        results = [np.empty((0, self.dimension), dtype=np.int64)]
+        for start in range(0, len(grid), blocksize):
+            results.append(self._expand(grid[start:start + blocksize], lower, upper))
+        k_vals = np.concatenate(results)
+        return k_vals, self.positions(k_vals)
+
+    def _expand(self, prefixes: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        corners = self._cell_corners(prefixes)
+        origins = np.arange(len(prefixes))
+        candidates = prefixes
+        for subset, internal, window in self.stages:
+            j = subset[-1]
+            values = corners[origins] @ self.cut[j] + self.gamma[j]
+            first = np.ceil(values.min(axis=1))
+            counts = (np.ceil(values.max(axis=1)) - first).astype(np.int64) + 1
+            rows = np.repeat(np.arange(len(candidates)), counts)
+            within = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+            candidates = np.column_stack([candidates[rows], first[rows] + within])
+            origins = origins[rows]
+            keep = window.contains((candidates - self.gamma[subset]) @ internal.T)
+            candidates, origins = candidates[keep], origins[keep]
+        k_vals = np.empty_like(candidates)
+        k_vals[:, self.order] = candidates
+        positions = self.positions(k_vals)
+        inside = np.all((positions >= lower) & (positions <= upper), axis=1)
+        return np.rint(k_vals[inside]).astype(np.int64)
@@ -0,0 +1,130 @@
+""" Contains the FrameProfiler class. """
+
+import gc
+import json
+import linecache
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+
+def get_peak_rss() -> "int|None":
+    """ Return the peak resident set size of this process in bytes, if the platform reports it. """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class FrameProfiler:
+    """
+    Records time and memory per frame stage with tracemalloc and writes one json line per frame to `path`.
+    Every `snapshot_interval` frames the `top` call sites that allocated the most since the last
+    snapshot are written as well. Tracing slows everything down, so only use it when needed.
+    """
+
+    def __init__(self, path:str, snapshot_interval:int=60, top:int=10, traceback_depth:int=1):
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+        self.top = top
+        self.traceback_depth = traceback_depth
+        self.frame = 0
+        self._file = None
+        self._stages: dict[str, dict[str, float]] = {}
+        self._gc_pauses: list[float] = []
+        self._gc_start = 0.0
+        self._frame_start = (0.0, 0, 0)
+        self._snapshot: "tracemalloc.Snapshot|None" = None
+
+    def start(self):
+        """ Start tracing allocations and garbage collections. """
+        self._file = open(self.path, "w", encoding="utf-8")
+        tracemalloc.start(self.traceback_depth)
+        gc.callbacks.append(self._on_gc)
+        self._snapshot = tracemalloc.take_snapshot()
+        self.begin_frame()
+
+    def stop(self):
+        """ Stop tracing and close the report. """
+        if self._file is None:
+            return
+        gc.callbacks.remove(self._on_gc)
+        tracemalloc.stop()
+        self._file.close()
+        self._file = None
+
+    @property
+    def active(self) -> bool:
+        """ Whether the profiler is currently recording. """
+        return self._file is not None
+
+    def begin_frame(self):
+        """ Mark the start of a frame. """
+        tracemalloc.reset_peak()
+        self._stages.clear()
+        self._gc_pauses.clear()
+        self._frame_start = (time.perf_counter(), tracemalloc.get_traced_memory()[0], sys.getallocatedblocks())
+
+    @contextmanager
+    def stage(self, name:str):
+        """ Record duration and traced memory growth of the enclosed code as stage `name`. """
+        start, memory = time.perf_counter(), tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            self._stages[name] = {
+                "ms": (time.perf_counter() - start) * 1000,
+                "bytes": tracemalloc.get_traced_memory()[0] - memory,
+            }
+
+    def end_frame(self):
+        """ Write the record of the current frame and begin the next one. """
+        assert self._file is not None
+        start, memory, blocks = self._frame_start
+        current, peak = tracemalloc.get_traced_memory()
+        record = {
+            "frame": self.frame,
+            "ms": (time.perf_counter() - start) * 1000,
+            "stages": self._stages,
+            "bytes": current - memory,
+            "peak_bytes": peak - memory,
+            "blocks": sys.getallocatedblocks() - blocks,
+            "gc_pauses_ms": [pause * 1000 for pause in self._gc_pauses],
+            "peak_rss": get_peak_rss(),
+        }
+        if self.snapshot_interval and self.frame % self.snapshot_interval == self.snapshot_interval - 1:
+            record["top_allocations"] = self._top_allocations()
+        self._file.write(json.dumps(record) + "\n")
+        self.frame += 1
+        self.begin_frame()
+
+    def _top_allocations(self) -> list[dict]:
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        )
+        assert self._snapshot is not None
+        statistics = sorted(
+            snapshot.compare_to(self._snapshot, "lineno"), key=lambda stat: stat.size_diff, reverse=True
+        )[:self.top]
+        self._snapshot = snapshot
+        return [
+            {
+                "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "code": linecache.getline(stat.traceback[0].filename, stat.traceback[0].lineno).strip(),
+                "size_diff": stat.size_diff,
+                "count_diff": stat.count_diff,
+            }
+            for stat in statistics
+        ]
+
+    def _on_gc(self, phase:str, _info:dict):
+        if phase == "start":
+            self._gc_start = time.perf_counter()
+        else:
+            self._gc_pauses.append(time.perf_counter() - self._gc_start)
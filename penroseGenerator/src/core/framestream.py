@@ -0,0 +1,172 @@
+"""
+Contains the PipeFrameStream and SharedMemoryFrameRing classes, which hand rendered frames to other processes
+as raw video without going through disk.
+Frames are read through a NumPy view of the SDL surface pixels, so the only copy is the one into the pipe
+or the shared memory.
+"""
+
+import ctypes
+import os
+import sys
+from multiprocessing import shared_memory
+
+import numpy as np
+
+RING_MAGIC = 0x50454E524F534531  # "PENROSE1"
+RING_HEADER = 8  # magic, width, height, slots, pitch, frames written, two reserved fields
+
+
+def surface_pixels(surface) -> np.ndarray:
+    """
+    Return a (height, width, 4) uint8 view of the pixels of a 32 bit SDL surface without copying.
+    The view is only valid as long as the surface exists.
+    """
+    contents = surface.contents
+    assert contents.format.contents.BytesPerPixel == 4
+    buffer = (ctypes.c_uint8 * (contents.pitch * contents.h)).from_address(contents.pixels)
+    rows = np.frombuffer(buffer, dtype=np.uint8).reshape(contents.h, contents.pitch)
+    return rows[:, :4 * contents.w].reshape(contents.h, contents.w, 4)
+
+
+def raw_pixel_format(surface) -> str:
+    """ Return the byte order of the pixels of `surface` in memory as an ffmpeg pixel format, e.g. "abgr". """
+    pixelformat = surface.contents.format.contents
+    masks = {"r": pixelformat.Rmask, "g": pixelformat.Gmask, "b": pixelformat.Bmask, "a": pixelformat.Amask}
+    shifts = {channel: (mask & -mask).bit_length() - 1 for channel, mask in masks.items() if mask}
+    order = "".join(sorted(shifts, key=shifts.__getitem__))
+    return order if sys.byteorder == "little" else order[::-1]
+
+
+class PipeFrameStream:
+    """
+    Writes every frame as raw video to stdout (`target` "-") or to a file or named pipe.
+    A missing `target` is created as a named pipe, and opening it waits for a reader,
+    e.g. `ffmpeg -f rawvideo -pixel_format abgr -video_size 1920x1080 -framerate 60 -i target out.mp4`.
+    """
+
+    def __init__(self, target: str, surface) -> None:
+        self.target = target
+        self.pixels = surface_pixels(surface)
+        self.frames = 0
+        if target == "-":
+            self.file = sys.stdout.buffer
+        else:
+            if not os.path.exists(target) and hasattr(os, "mkfifo"):
+                os.mkfifo(target)
+            self.file = open(target, "wb", buffering=0)  #pylint: disable=consider-using-with
+
+    def write(self, frame: int):
+        """ Write the current pixels. Returns False once the reader went away. """
+        del frame  # Raw video carries no frame numbers.
+        try:
+            if self.pixels.flags.c_contiguous:
+                self.file.write(memoryview(self.pixels))
+            else:
+                for row in self.pixels:
+                    self.file.write(memoryview(row))
+        except BrokenPipeError:
+            return False
+        self.frames += 1
+        return True
+
+    def close(self):
+        """ Flush and close the target, stdout is only flushed. """
+        try:
+            self.file.flush()
+            if self.file is not sys.stdout.buffer:
+                self.file.close()
+        except BrokenPipeError:
+            pass
+
+
+class SharedMemoryFrameRing:
+    """
+    Copies every frame into one of `slots` frame buffers in the shared memory block `name`.
+    The block starts with RING_HEADER uint64 fields and one counter per slot, followed by the frames.
+    A slot counter is 0 while its frame is written and then the frame number plus one,
+    so readers detect torn frames by reading the counter before and after copying.
+    """
+
+    def __init__(self, name: str, surface, slots: int = 4) -> None:
+        assert slots > 0
+        self.pixels = surface_pixels(surface)
+        height, width, _ = self.pixels.shape
+        self.framebytes = height * width * 4
+        headerbytes = 8 * (RING_HEADER + slots)
+        self.memory = shared_memory.SharedMemory(name, create=True, size=headerbytes + slots * self.framebytes)
+        self.header = np.ndarray(RING_HEADER + slots, dtype=np.uint64, buffer=self.memory.buf)
+        self.header[:] = 0
+        self.header[:5] = (RING_MAGIC, width, height, slots, 4 * width)
+        self.frames = np.ndarray((slots, height, width, 4), dtype=np.uint8, buffer=self.memory.buf,
+                                 offset=headerbytes)
+        self.slots = slots
+
+    @property
+    def written(self) -> int:
+        """ The number of frames written so far. """
+        return int(self.header[5])
+
+    def write(self, frame: int):
+        """ Copy the current pixels into the next slot, tagged with `frame`. """
+        slot = self.written % self.slots
+        self.header[RING_HEADER + slot] = 0
+        np.copyto(self.frames[slot], self.pixels)
+        self.header[RING_HEADER + slot] = frame + 1
+        self.header[5] = self.written + 1
+        return True
+
+    def close(self):
+        """ Release and remove the shared memory block. """
+        del self.header, self.frames
+        self.memory.close()
+        self.memory.unlink()
+
+
+class SharedMemoryFrameReader:
+    """ Reads the frames of a SharedMemoryFrameRing from another process. """
+
+    def __init__(self, name: str) -> None:
+        self.memory = shared_memory.SharedMemory(name)
+        fields = np.ndarray(RING_HEADER, dtype=np.uint64, buffer=self.memory.buf)
+        assert int(fields[0]) == RING_MAGIC
+        self.width, self.height, self.slots = int(fields[1]), int(fields[2]), int(fields[3])
+        headerbytes = 8 * (RING_HEADER + self.slots)
+        self.header = np.ndarray(RING_HEADER + self.slots, dtype=np.uint64, buffer=self.memory.buf)
+        self.frames = np.ndarray((self.slots, self.height, self.width, 4), dtype=np.uint8,
+                                 buffer=self.memory.buf, offset=headerbytes)
+
+    @property
+    def written(self) -> int:
+        """ The number of frames the writer has finished. """
+        return int(self.header[5])
+
+    def read(self, index: int) -> "tuple[int, np.ndarray]|None":
+        """
+        Return the frame number and a copy of the `index`th frame written,
+        or None if it was overwritten or is being written.
+        """
+        if not self.written - self.slots <= index < self.written:
+            return None
+        slot = index % self.slots
+        before = int(self.header[RING_HEADER + slot])
+        pixels = self.frames[slot].copy()
+        if before == 0 or int(self.header[RING_HEADER + slot]) != before or self.written - self.slots > index:
+            return None
+        return before - 1, pixels
+
+    def latest(self) -> "tuple[int, np.ndarray]|None":
+        """ Return the frame number and pixels of the newest complete frame. """
+        return self.read(self.written - 1) if self.written else None
+
+    def close(self):
+        """ Detach from the shared memory block. """
+        del self.header, self.frames
+        self.memory.close()
+
+
+def open_frame_stream(target: str, surface) -> "PipeFrameStream|SharedMemoryFrameRing":
+    """ Open a frame stream: "shm:NAME" or "shm:NAME:SLOTS" for shared memory, "-" for stdout, else a path. """
+    if target.startswith("shm:"):
+        name, _, slots = target[4:].partition(":")
+        return SharedMemoryFrameRing(name, surface, int(slots) if slots else 4)
+    return PipeFrameStream(target, surface)
@@ -0,0 +1,80 @@
+""" Contains the FrameWorker class. """
+
+import threading
+from typing import Any, Callable
+
+
+class FrameWorker:
+    """
+    Computes frame data on a background thread.
+    Only the most recent snapshot is computed, older pending ones are dropped.
+    Finished results are double-buffered: the main thread reads the front buffer
+    while the worker fills the back buffer, and the two are swapped once it is done.
+    An exception in `compute` stops the worker and is raised again on the main thread by `poll`.
+    """
+
+    def __init__(self, compute:Callable[[Any], Any]) -> None:
+        self.compute = compute
+        self._condition = threading.Condition()
+        self._pending: "tuple[int, Any]|None" = None
+        self._front: "tuple[int, Any]|None" = None
+        self._submitted = 0
+        self._running = False
+        self._thread: "threading.Thread|None" = None
+        self._error: "BaseException|None" = None
+
+    def start(self):
+        """ Start the worker thread. """
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._work, name="FrameWorker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stop the worker thread once its current computation is finished. """
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, snapshot:Any):
+        """ Queue `snapshot` for computation, replacing any snapshot that has not been started yet. """
+        with self._condition:
+            self._submitted += 1
+            self._pending = (self._submitted, snapshot)
+            self._condition.notify()
+
+    def poll(self):
+        """ Raise the exception that stopped the worker thread, if there is one. """
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def latest(self) -> Any:
+        """ Return the most recently completed frame data, or None if nothing is finished yet. """
+        front = self._front
+        return None if front is None else front[1]
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while self._running and self._pending is None:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                assert self._pending is not None
+                sequence, snapshot = self._pending
+                self._pending = None
+            try:
+                back = self.compute(snapshot)
+            except BaseException as error: #pylint: disable=broad-exception-caught
+                with self._condition:
+                    self._error = error
+                    self._running = False
+                return
+            with self._condition:
+                if self._front is None or self._front[0] < sequence:
+                    self._front = (sequence, back)
@@ -169,3 +169,34 @@ def project_point_line_2d(point: np.ndarray, start: np.ndarray, direction: np.nd
     dirx, diry = direction
     best_param = (dirx * (pointx - startx) + diry * (pointy - starty)) / (dirx**2 + diry**2)
     return start + best_param * direction
+
+def intersect_lattices(lattices:list[Lattice], pairs:"tuple[np.ndarray, np.ndarray]|None"=None):
+    """
+    Return every intersection between every pair of lattices as an array of rows (x, y, i, j),
+    ordered by lattice pair (i < j) first and line of lattice j second.
+    Pass `pairs` as two index arrays to only intersect those lattice pairs, in that order.
+    All lattices need the same number of lines. Parallel pairs are left out.
+    """
+    starts = np.array([lattice[1] for lattice in lattices])
+    linecount = lattices[0][2] - lattices[0][1] + 1
+    assert all(lattice[2] - lattice[1] + 1 == linecount for lattice in lattices)
+    normals = np.array([lattice[0].normal for lattice in lattices])
+    steps = np.array([lattice[3] for lattice in lattices], dtype=float)
+    offsets = np.array([lattice[4] for lattice in lattices], dtype=float)
+    lat_i, lat_j = np.triu_indices(len(lattices), 1) if pairs is None else pairs
+    systems = np.stack([normals[lat_i], normals[lat_j]], axis=1)
+    solvable = np.abs(np.linalg.det(systems)) > 1e-10
+    lat_i, lat_j = lat_i[solvable], lat_j[solvable]
+    inverses = np.linalg.inv(systems[solvable])
+    linenos = starts[:, None] + np.arange(linecount)
+    dists_i = linenos[lat_i] * steps[lat_i, None] + offsets[lat_i, None]
+    dists_j = linenos[lat_j] * steps[lat_j, None] + offsets[lat_j, None]
+    # Every point x on line a of lattice i and line b of lattice j solves
+    # normal_i . x = dist_i[a] and normal_j . x = dist_j[b].
+    points = inverses[:, None, None, :, 0] * dists_i[:, None, :, None] \
+        + inverses[:, None, None, :, 1] * dists_j[:, :, None, None]
+    intersections = np.empty((len(lat_i), linecount, linecount, 4), dtype=float)
+    intersections[..., :2] = points
+    intersections[..., 2] = lat_i[:, None, None]
+    intersections[..., 3] = lat_j[:, None, None]
+    return np.reshape(intersections, (-1, 4))
@@ -0,0 +1,70 @@
+""" Contains the QuadBuffer class. """
+
+import ctypes
+
+import numpy as np
+import sdl2
+
+# Every quad (v0, v1, v2, v3) is split into the triangles (v0, v1, v2) and (v0, v2, v3).
+QUAD_INDICES = np.array([0, 1, 2, 0, 2, 3], dtype=np.int32)
+
+
+class QuadBuffer:
+    """
+    Keeps filled quads in persistent vertex, color and index buffers and draws all of them
+    with a single SDL_RenderGeometryRaw call. Setting new quads only reallocates if the capacity is exceeded,
+    and moving the camera only rewrites the screen positions in place.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.quads = np.empty((0, 4, 2), dtype=np.float32)
+        self.positions = np.empty((0, 4, 2), dtype=np.float32)
+        self.colors = np.empty((0, 4, 4), dtype=np.uint8)
+        self.indices = np.empty(0, dtype=np.int32)
+
+    def reserve(self, count:int):
+        """ Make room for at least `count` quads, growing by half to amortize reallocations. """
+        capacity = len(self.quads)
+        if count <= capacity:
+            return
+        capacity = max(count, capacity + capacity // 2)
+        self.quads = np.resize(self.quads, (capacity, 4, 2))
+        self.positions = np.empty((capacity, 4, 2), dtype=np.float32)
+        self.colors = np.resize(self.colors, (capacity, 4, 4))
+        self.indices = (QUAD_INDICES + 4 * np.arange(capacity, dtype=np.int32)[:, None]).ravel()
+
+    def set_quads(self, quads:np.ndarray, colors:np.ndarray):
+        """ Replace the quads of shape (n, 4, 2) and their colors of shape (n, 3|4). """
+        count = len(quads)
+        self.reserve(count)
+        self.count = count
+        self.quads[:count] = quads
+        self.colors[:count, :, :colors.shape[1]] = colors[:, None, :]
+        if colors.shape[1] == 3:
+            self.colors[:count, :, 3] = 255
+
+    def set_alpha(self, alpha:int):
+        """ Set the opacity of every quad. """
+        self.colors[:self.count, :, 3] = alpha
+
+    def transform(self, xyscale:np.ndarray, origin:np.ndarray, height:float):
+        """ Write the screen positions (xyscale * (quad + origin)) with y pointing down into the vertex buffer. """
+        positions = self.positions[:self.count]
+        np.add(self.quads[:self.count], np.asarray(origin, np.float32), out=positions)
+        positions *= np.asarray(xyscale, np.float32)
+        np.subtract(np.float32(height), positions[..., 1], out=positions[..., 1])
+
+    def draw(self, renderer):
+        """ Submit every quad to `renderer` in one call. """
+        if not self.count:
+            return
+        sdl2.SDL_SetRenderDrawBlendMode(renderer, sdl2.SDL_BLENDMODE_BLEND)
+        sdl2.SDL_RenderGeometryRaw(
+            renderer, None,
+            self.positions.ctypes.data_as(ctypes.POINTER(ctypes.c_float)), 8,
+            self.colors.ctypes.data_as(ctypes.POINTER(sdl2.SDL_Color)), 4,
+            None, 0,
+            4 * self.count,
+            self.indices.ctypes.data_as(ctypes.c_void_p), 6 * self.count, 4,
+        )
@@ -0,0 +1,86 @@
+""" Contains the InputRecorder and InputReplay classes. """
+
+import json
+import statistics
+from collections import defaultdict
+
+import sdl2
+
+
+class InputRecorder:
+    """ Writes every dispatched key event with its frame and SDL ticks as one json line to `path`. """
+
+    def __init__(self, path:str):
+        self.path = path
+        self._file = open(path, "w", encoding="utf-8")
+
+    def record(self, frame:int, event:sdl2.SDL_Event):
+        """ Append the key event `event` that was dispatched during frame `frame`. """
+        self._file.write(json.dumps({
+            "frame": frame,
+            "ticks": sdl2.SDL_GetTicks(),
+            "type": event.type,
+            "sym": event.key.keysym.sym,
+            "mod": event.key.keysym.mod,
+            "repeat": event.key.repeat,
+        }) + "\n")
+
+    def close(self):
+        """ Flush and close the recording. """
+        self._file.close()
+
+
+class InputReplay:
+    """
+    Feeds the key events of a recording back at the frames they were recorded in,
+    and collects the time every replayed frame took.
+    The replay is over `tail` frames after the last recorded event.
+    """
+
+    def __init__(self, path:str, tail:int=30):
+        self.events: dict[int, list[dict]] = defaultdict(list)
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.events[entry["frame"]].append(entry)
+        self.lastframe = max(self.events, default=-1) + tail
+        self.frametimes: list[float] = []
+
+    def events_for(self, frame:int) -> list[sdl2.SDL_Event]:
+        """ Return the recorded key events of frame `frame` as SDL events. """
+        events = []
+        for entry in self.events.get(frame, []):
+            event = sdl2.SDL_Event()
+            event.type = entry["type"]
+            event.key.type = entry["type"]
+            event.key.state = sdl2.SDL_PRESSED if entry["type"] == sdl2.SDL_KEYDOWN else sdl2.SDL_RELEASED
+            event.key.repeat = entry["repeat"]
+            event.key.keysym.sym = entry["sym"]
+            event.key.keysym.mod = entry["mod"]
+            events.append(event)
+        return events
+
+    def finished(self, frame:int) -> bool:
+        """ Whether every recorded event was replayed and the tail is over. """
+        return frame > self.lastframe
+
+    def report(self) -> dict:
+        """ Summarize the collected frame times in milliseconds. """
+        times = sorted(self.frametimes)
+        if not times:
+            return {"frames": 0}
+        return {
+            "frames": len(times),
+            "total_ms": sum(times),
+            "mean_ms": statistics.fmean(times),
+            "median_ms": statistics.median(times),
+            "p95_ms": times[min(len(times) - 1, int(len(times) * .95))],
+            "max_ms": times[-1],
+            "frametimes_ms": self.frametimes,
+        }
+
+    def write_report(self, path:str):
+        """ Write the report as json to `path`. """
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.report(), file, indent=1)
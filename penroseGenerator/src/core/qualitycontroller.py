@@ -0,0 +1,54 @@
+""" Contains the QualityController class. """
+
+from typing import Callable
+
+
+class QualityController:
+    """
+    Keeps measured frame times within a budget by stepping through quality levels,
+    0 being the best one and `levels - 1` the cheapest one.
+    Frame times are smoothed exponentially. The level is lowered as soon as the smoothed time
+    exceeds the budget, and raised again once it stayed below `raise_at` of the budget for `patience` frames.
+    """
+
+    def __init__(
+        self,
+        budget_ms:float,
+        levels:int,
+        apply:Callable[[int], None],
+        smoothing:float=.2,
+        raise_at:float=.6,
+        patience:int=30,
+    ):
+        assert levels > 0 and 0 < smoothing <= 1 and 0 < raise_at < 1
+        self.budget_ms = budget_ms
+        self.levels = levels
+        self.apply = apply
+        self.smoothing = smoothing
+        self.raise_at = raise_at
+        self.patience = patience
+        self.level = 0
+        self.average_ms: "float|None" = None
+        self._calm_frames = 0
+
+    def update(self, frametime_ms:float):
+        """ Account for a frame that took `frametime_ms` of work and change the level if needed. """
+        if self.average_ms is None:
+            self.average_ms = frametime_ms
+        else:
+            self.average_ms += self.smoothing * (frametime_ms - self.average_ms)
+        if self.average_ms > self.budget_ms and self.level < self.levels - 1:
+            self._set_level(self.level + 1)
+        elif self.average_ms < self.raise_at * self.budget_ms and self.level > 0:
+            self._calm_frames += 1
+            if self._calm_frames >= self.patience:
+                self._set_level(self.level - 1)
+        else:
+            self._calm_frames = 0
+
+    def _set_level(self, level:int):
+        self.level = level
+        self._calm_frames = 0
+        # Forget the old average, it was measured at another level.
+        self.average_ms = None
+        self.apply(level)
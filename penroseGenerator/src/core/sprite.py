@@ -1,5 +1,7 @@
 """ Contains the BaseSprite class. """
 
+from contextlib import contextmanager
+
 import sdl2
 import sdl2.ext
 import sdl2.sdlgfx as gfx
@@ -9,22 +11,88 @@ from penroseGenerator.src.core.geometrysurface import GeometrySurface
 
 
 class BaseSprite(GeometrySurface):
-    """ Allows simple sprite-based behaviour. """
+    """
+    Allows simple sprite-based behaviour.
+    By default a sprite draws into its own surface with a software renderer, and every `draw` uploads it.
+    Given the `renderer` of the window, it draws through that renderer into a target texture instead,
+    see `drawing`, and the surface only stages pixels written on the CPU, see `upload_pixels`.
+    """
 
-    def __init__(self, size:tuple[int,int], position:tuple[int,int]=(0,0)):
+    def __init__(self, size:tuple[int,int], position:tuple[int,int]=(0,0), renderer=None):
         self.surface = sdl2.SDL_CreateRGBSurface(0, *size, 32,
                                    0xff000000,  # r mask
                                    0x00ff0000,  # g mask
                                    0x0000ff00,  # b mask
                                    0x000000ff)  # a mask
-        self.renderer = sdl2.render.SDL_CreateSoftwareRenderer(self.surface)
+        self.targettexture = None
+        self.uploadtexture = None
+        if renderer is None:
+            self.renderer = sdl2.render.SDL_CreateSoftwareRenderer(self.surface)
+        else:
+            self.renderer = renderer.sdlrenderer if isinstance(renderer, sdl2.ext.Renderer) else renderer
+            self.targettexture = sdl2.SDL_CreateTexture(
+                self.renderer, sdl2.SDL_PIXELFORMAT_RGBA8888, sdl2.SDL_TEXTUREACCESS_TARGET, *size
+            )
+            if not self.targettexture:
+                raise sdl2.ext.SDLError()
+            sdl2.SDL_SetTextureBlendMode(self.targettexture, sdl2.SDL_BLENDMODE_BLEND)
         self.position = position
         self.xyscale = np.array([1,1])
         self.origin = np.array(size) * .5
         self.size = np.array(size)
 
+    @property
+    def direct(self) -> bool:
+        """ Whether the sprite draws through the window renderer into a target texture. """
+        return self.targettexture is not None
+
+    @contextmanager
+    def drawing(self):
+        """ Make the renderer of a direct sprite draw into its texture while in this context. """
+        if self.targettexture is None:
+            yield
+            return
+        previous = sdl2.SDL_GetRenderTarget(self.renderer)
+        sdl2.SDL_SetRenderTarget(self.renderer, self.targettexture)
+        try:
+            yield
+        finally:
+            sdl2.SDL_SetRenderTarget(self.renderer, previous)
+
+    def upload_pixels(self, blendmode:int=sdl2.SDL_BLENDMODE_NONE):
+        """
+        Copy the surface pixels onto the texture of a direct sprite with `blendmode`.
+        Software sprites draw into the surface anyway, so there is nothing to do for them.
+        """
+        if self.targettexture is None:
+            return
+        if self.uploadtexture is None:
+            self.uploadtexture = sdl2.SDL_CreateTexture(
+                self.renderer, sdl2.SDL_PIXELFORMAT_RGBA8888, sdl2.SDL_TEXTUREACCESS_STREAMING, *map(int, self.size)
+            )
+        contents = self.surface.contents
+        sdl2.SDL_UpdateTexture(self.uploadtexture, None, contents.pixels, contents.pitch)
+        sdl2.SDL_SetTextureBlendMode(self.uploadtexture, blendmode)
+        with self.drawing():
+            sdl2.SDL_RenderCopy(self.renderer, self.uploadtexture, None, None)
+
+    def blend_pixels(self, colors:np.ndarray, alpha:np.ndarray):
+        """ Blend the (height, width, 3) `colors` over the sprite with the (height, width) opacities `alpha`. """
+        if self.targettexture is None:
+            pixels = self.pixels()[..., :3]
+            pixels[:] = pixels * (1 - alpha[..., None]) + colors * alpha[..., None]
+            return
+        pixels = self.pixels()
+        pixels[..., :3] = colors
+        pixels[..., 3] = alpha * 255
+        self.upload_pixels(sdl2.SDL_BLENDMODE_BLEND)
+
     def draw(self, target:sdl2.ext.Renderer):
         """ Draw the sprite to a render target. """
+        if self.targettexture is not None:
+            sdl2.SDL_RenderCopy(target.sdlrenderer, self.targettexture, None,
+                                sdl2.SDL_Rect(*self.position, *self.size))
+            return
         sdl2.SDL_RenderPresent(self.renderer)
         texture = sdl2.ext.Texture(target, self.surface)
         target.blit(texture, dstrect = sdl2.SDL_Rect(*self.position, *self.size))
@@ -34,6 +102,16 @@ class BaseSprite(GeometrySurface):
         x,y = (self.xyscale * (point + self.origin)).astype(np.int16)
         return np.array([x, self.size[1] - y])
 
+    def transform_points_pixel(self, points:np.ndarray, dtype:type=np.int16):
+        """ Transform an array of points with shape (..., 2) into screen space at once. """
+        pixels = (self.xyscale * (points + self.origin)).astype(dtype)
+        pixels[..., 1] = self.size[1] - pixels[..., 1]
+        return pixels
+
+    def pixels(self):
+        """ Return a writable (height, width, 4) RGBA view of the surface pixels. """
+        return sdl2.ext.pixels3d(self.surface, transpose=False)[..., ::-1]
+
     #pylint: disable=missing-function-docstring
     def draw_line_transformed(self, start, end, width=1, color=(255,255,255,255)):
         gfx.thickLineRGBA(
@@ -0,0 +1,159 @@
+""" Contains the JobTelemetry class. """
+
+import json
+import os
+import threading
+import time
+
+from penroseGenerator.src.core.frameprofiler import get_peak_rss
+
+PROMETHEUS_METRICS = {
+    "items_done": ("counter", "Items (tiles, points, wave vectors) finished."),
+    "items_per_second": ("gauge", "Items finished per second since the start."),
+    "chunks_done": ("counter", "Chunks finished."),
+    "chunks_total": ("gauge", "Chunks of the whole job."),
+    "elapsed_seconds": ("gauge", "Seconds since the start."),
+    "eta_seconds": ("gauge", "Estimated seconds until the job is done."),
+    "seconds_since_progress": ("gauge", "Seconds since the last finished chunk."),
+    "worker_utilization": ("gauge", "Busy time reported by the workers over their available time."),
+    "stalled_workers": ("gauge", "Workers that reported nothing for longer than the stall timeout."),
+    "peak_rss_bytes": ("gauge", "Peak resident memory of this process or the largest reported by a worker."),
+}
+
+
+class JobTelemetry:
+    """
+    Reports the progress of a non-interactive job every `interval` seconds to `path`,
+    as one json line per report or, if `path` ends in .prom, as a Prometheus text file that is replaced each time.
+    The job only counts finished work with `advance`, the reports are written by a background thread,
+    so a stalled job still reports and the overhead per chunk is a lock and a few additions.
+    Workers that reported once and then stay silent for `stall_after` seconds are counted as stalled.
+    """
+
+    def __init__(
+        self,
+        path:str,
+        job:str,
+        total_chunks:"int|None"=None,
+        total_items:"int|None"=None,
+        unit:str="tiles",
+        workers:int=1,
+        interval:float=5.0,
+        stall_after:"float|None"=None,
+    ):
+        assert interval > 0 and workers > 0
+        self.path = path
+        self.job = job
+        self.total_chunks = total_chunks
+        self.total_items = total_items
+        self.unit = unit
+        self.workers = workers
+        self.interval = interval
+        self.stall_after = 3 * interval if stall_after is None else stall_after
+        self.prometheus = path.endswith(".prom")
+        self.items = 0
+        self.chunks = 0
+        self.busy = 0.0
+        self.worker_peak_rss = 0
+        self._lastseen: dict[object, float] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: "threading.Thread|None" = None
+        self._start = time.monotonic()
+        self._progress = self._start
+
+    def start(self):
+        """ Start the clock and the reporting thread. """
+        if not self.prometheus:
+            open(self.path, "w", encoding="utf-8").close()
+        self._start = self._progress = time.monotonic()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._report_loop, name="telemetry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stop reporting and write a last report. """
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+        self.write(self.report())
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def advance(self, items:int=0, chunks:int=1, worker=None, busy:float=0.0, peak_rss:"int|None"=None):
+        """
+        Count `chunks` finished chunks with `items` items. Pass the `worker` that did them,
+        the seconds it was `busy` with them and its `peak_rss` for utilisation, stalls and memory.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.items += items
+            self.chunks += chunks
+            self.busy += busy
+            if peak_rss is not None:
+                self.worker_peak_rss = max(self.worker_peak_rss, peak_rss)
+            if worker is not None:
+                self._lastseen[worker] = now
+            self._progress = now
+
+    def report(self) -> dict:
+        """ Return the current progress as a dictionary. """
+        now = time.monotonic()
+        with self._lock:
+            items, chunks, busy, lastseen = self.items, self.chunks, self.busy, list(self._lastseen.values())
+            progress = self._progress
+        elapsed = max(now - self._start, 1e-9)
+        eta = None
+        if self.total_items and items:
+            eta = elapsed * (self.total_items - items) / items
+        elif self.total_chunks and chunks:
+            eta = elapsed * (self.total_chunks - chunks) / chunks
+        done = self.total_chunks is not None and chunks >= self.total_chunks
+        return {
+            "time": time.time(),
+            "job": self.job,
+            "unit": self.unit,
+            "items_done": items,
+            "items_total": self.total_items,
+            "items_per_second": items / elapsed,
+            "chunks_done": chunks,
+            "chunks_total": self.total_chunks,
+            "elapsed_seconds": elapsed,
+            "eta_seconds": eta,
+            "seconds_since_progress": now - progress,
+            "worker_utilization": busy / (elapsed * self.workers) if busy else None,
+            "stalled_workers": 0 if done else sum(now - seen > self.stall_after for seen in lastseen),
+            "peak_rss_bytes": max(get_peak_rss() or 0, self.worker_peak_rss) or None,
+        }
+
+    def write(self, report:dict):
+        """ Append `report` as a json line, or replace the Prometheus text file with it. """
+        if not self.prometheus:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(report) + "\n")
+            return
+        labels = f'job="{self.job}",unit="{self.unit}"'
+        lines = []
+        for name, (kind, description) in PROMETHEUS_METRICS.items():
+            if report[name] is None:
+                continue
+            lines.append(f"# HELP penrose_job_{name} {description}")
+            lines.append(f"# TYPE penrose_job_{name} {kind}")
+            value = report[name]
+            lines.append(f"penrose_job_{name}{{{labels}}} {value if isinstance(value, int) else f'{value:.6g}'}")
+        # Scrapers must never see a half written file.
+        tmppath = self.path + ".tmp"
+        with open(tmppath, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(tmppath, self.path)
+
+    def _report_loop(self):
+        while not self._stopped.wait(self.interval):
+            self.write(self.report())
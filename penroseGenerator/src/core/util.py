@@ -12,6 +12,12 @@ def round_half(number:float):
     return math.copysign(hi_int if abs(hi_int-nabs) < .5 else lo_int, number)
 
 
+def smoothstep(lower:float, upper:float, value:float):
+    """ Return 0 below `lower`, 1 above `upper` and a smooth transition in between. """
+    t = min(max((value - lower) / (upper - lower), 0.0), 1.0)
+    return t * t * (3 - 2 * t)
+
+
 def find_closest_integral_point(point:np.ndarray):
     """ Return the closest point with integer value only. """
     return np.array([round(x) for x in point])
@@ -1,6 +1,9 @@
 ''' Containts the WindowManager class. '''
 
 import os
+import sys
+import time
+from contextlib import nullcontext
 from typing import Callable
 
 import ctypes
@@ -10,6 +13,10 @@ from PIL import Image
 
 from penroseGenerator.src.core.sprite import BaseSprite
 from penroseGenerator.src.core.controls import Controls
+from penroseGenerator.src.core.frameprofiler import FrameProfiler
+from penroseGenerator.src.core.framestream import PipeFrameStream, SharedMemoryFrameRing, open_frame_stream
+from penroseGenerator.src.core.inputrecording import InputRecorder, InputReplay
+from penroseGenerator.src.core.qualitycontroller import QualityController
 
 CallbackType = Callable[[sdl2.SDL_Event], None]
 
@@ -17,8 +24,11 @@ class WindowManager:
     """
     The WindowManager creates and manages the window, forwards events,
     and calls the event loop a given number of times per second.
+    By default every frame is drawn into `surface` in software and uploaded to the window.
+    With `accelerated`, frames are drawn through the window renderer directly if it supports target textures,
+    pass `sprite_renderer` to sprites so they do the same, and `surface` is only read back to capture or stream.
     """
-    def __init__(self, title:str, size:tuple[int,int], *windowargs) -> None:
+    def __init__(self, title:str, size:tuple[int,int], *windowargs, accelerated:bool=False) -> None:
         sdl2.ext.init()
         fontpath = os.path.realpath(__file__ + "/../../../FreeMonoBold.ttf")
         self.fontmanager = sdl2.ext.FontManager(fontpath)
@@ -28,6 +38,7 @@ class WindowManager:
         self.paused = False
         self.tickmethod : "Callable[[],None]|None" = None
         self.ticks = 0
+        self.frame = 0
         self.window = sdl2.ext.Window(title, size, *windowargs)
         self.window.show()
         self.surface = sdl2.SDL_CreateRGBSurface(0, *size, 32,
@@ -35,22 +46,50 @@ class WindowManager:
                                    0x00ff0000,  # g mask
                                    0x0000ff00,  # b mask
                                    0x000000ff)  # a mask
-        self.renderer = sdl2.ext.Renderer(self.surface)
-        self.windowrenderer = sdl2.ext.Renderer(self.window)
+        self.windowrenderer, self.direct = self._create_windowrenderer(accelerated)
+        # Directly, everything is drawn through the window renderer and the surface only receives readbacks.
+        self.renderer = self.windowrenderer if self.direct else sdl2.ext.Renderer(self.surface)
+        self.sprite_renderer = self.windowrenderer if self.direct else None
         self.tickdisplay = BaseSprite((20,20), (10,10))
         self.capturing = False
         self.capturefolder = None
         self.capturetarget = None
         self.capturedframes:list[str] = []
+        self.stream: "PipeFrameStream|SharedMemoryFrameRing|None" = None
+        self.profiler: "FrameProfiler|None" = None
+        self.qualitycontroller: "QualityController|None" = None
+        self.recorder: "InputRecorder|None" = None
+        self.replay: "InputReplay|None" = None
         self.show_controls = True
         controls_width = 300
         controls_size = (controls_width, self.window.size[1])
         controls_pos =  (self.window.size[0] - controls_width, 0)
-        self.controls = Controls(controls_size, controls_pos)
+        self.controls = Controls(controls_size, controls_pos, self.sprite_renderer)
         self.set_key_event(sdl2.keycode.SDLK_SPACE, self.pause)
         self.set_key_event(sdl2.keycode.SDLK_h, self.toggle_controls)
         self.controls.controls = ["Space: Pause", "h: show/hide controls"]
 
+    def _create_windowrenderer(self, accelerated:bool) -> "tuple[sdl2.ext.Renderer, bool]":
+        if accelerated:
+            # SDL tries the accelerated drivers first and only falls back to its software renderer without them.
+            try:
+                renderer = sdl2.ext.Renderer(self.window, flags=sdl2.SDL_RENDERER_TARGETTEXTURE)
+            except sdl2.ext.SDLError:
+                renderer = None
+            if renderer is not None:
+                info = sdl2.SDL_RendererInfo()
+                sdl2.SDL_GetRendererInfo(renderer.sdlrenderer, info)
+                if info.flags & sdl2.SDL_RENDERER_TARGETTEXTURE:
+                    return renderer, True
+            print("No renderer with target textures available, falling back to software rendering.", file=sys.stderr)
+        return sdl2.ext.Renderer(self.window), False
+
+    def read_pixels(self):
+        """ Copy the pixels drawn through the window renderer into `surface`, e.g. to capture them. """
+        contents = self.surface.contents
+        sdl2.SDL_RenderReadPixels(self.windowrenderer.sdlrenderer, None, contents.format.contents.format,
+                                  contents.pixels, contents.pitch)
+
     def set_key_event(self, key:int, callback:Callable[[sdl2.SDL_Event],None]):
         """ Set the callback for key `key` to `callback`. """
         self.eventdict[key] = callback
@@ -58,15 +97,23 @@ class WindowManager:
     def handle_key_event(self, event):
         """ Call the callbacks registered for they key event `event`. """
         if event.key.keysym.sym in self.eventdict:
+            if self.recorder is not None:
+                self.recorder.record(self.frame, event)
             self.eventdict[event.key.keysym.sym](event)
 
     def handle_events(self):
-        """ Poll events and handle them. """
+        """ Poll events and handle them. While replaying, key events come from the recording instead. """
+        if self.replay is not None:
+            for replayed in self.replay.events_for(self.frame):
+                self.handle_key_event(replayed)
+            if self.replay.finished(self.frame):
+                self.exit()
         event = sdl2.events.SDL_Event()
         while sdl2.events.SDL_PollEvent(ctypes.byref(event), 1) == 1:
             match event.type:
                 case sdl2.events.SDL_KEYDOWN | sdl2.events.SDL_KEYUP:
-                    self.handle_key_event(event)
+                    if self.replay is None:
+                        self.handle_key_event(event)
                 case sdl2.events.SDL_QUIT:
                     self.exit()
 
@@ -77,29 +124,111 @@ class WindowManager:
             print("No tickmethod assigned. Exiting...")
             exit()
         while not self.exiting:
-            self.handle_events()
+            with self.stage("events"):
+                self.handle_events()
+            self.frame += 1
             if self.paused:
+                if self.profiler is not None:
+                    # Paused iterations are no frames, start over instead of adding them to the next one.
+                    self.profiler.begin_frame()
                 continue
-            self.renderer.clear((0,0,0,255))
-            self.tickmethod()
+            workstart = time.perf_counter()
+            with self.stage("tick"):
+                self.renderer.clear((0,0,0,255))
+                self.tickmethod()
             newticks = sdl2.SDL_GetTicks()
             frametime = max(1, newticks - self.ticks)
-            sdl2.SDL_RenderClear(self.tickdisplay.renderer, 0,0,0)
-            self.tickdisplay.surface = self.fontmanager.render(str(round(frametime)).zfill(2), size=20)
-            self.tickdisplay.draw(self.renderer)
-            if self.show_controls:
-                self.controls.draw(self.renderer)
-            self.renderer.present()
-            remainingticks = int(max(1000/self.framerate - frametime, 0))
-            sdl2.timer.SDL_Delay(remainingticks)
+            with self.stage("overlay"):
+                sdl2.SDL_RenderClear(self.tickdisplay.renderer, 0,0,0)
+                self.tickdisplay.surface = self.fontmanager.render(str(round(frametime)).zfill(2), size=20)
+                self.tickdisplay.draw(self.renderer)
+                if self.show_controls:
+                    self.controls.draw(self.renderer)
+                if not self.direct:
+                    self.renderer.present()
+            worktime = (time.perf_counter() - workstart) * 1000
+            if self.qualitycontroller is not None:
+                self.qualitycontroller.update(worktime)
+            if self.replay is not None:
+                # Replays run at fixed ticks as fast as possible, so they only measure the work itself.
+                self.replay.frametimes.append(worktime)
+            else:
+                remainingticks = int(max(1000/self.framerate - frametime, 0))
+                sdl2.timer.SDL_Delay(remainingticks)
             self.ticks = newticks
-            if self.capturing and self.capturefolder is not None:
-                filename = f"{len(self.capturedframes)}.bmp"
-                sdl2.SDL_SaveBMP(self.surface, (self.capturefolder + filename).encode('ascii'))
-                self.capturedframes.append(filename)
-            self.windowrenderer.blit(sdl2.ext.Texture(self.windowrenderer, self.surface))
-            self.windowrenderer.present()
-            self.window.refresh()
+            with self.stage("capture"):
+                if self.direct and ((self.capturing and self.capturefolder is not None) or self.stream is not None):
+                    self.read_pixels()
+                if self.capturing and self.capturefolder is not None:
+                    filename = f"{len(self.capturedframes)}.bmp"
+                    sdl2.SDL_SaveBMP(self.surface, (self.capturefolder + filename).encode('ascii'))
+                    self.capturedframes.append(filename)
+            with self.stage("stream"):
+                if self.stream is not None and not self.stream.write(self.frame):
+                    self.stop_streaming()
+            with self.stage("present"):
+                if self.direct:
+                    self.windowrenderer.present()
+                else:
+                    self.windowrenderer.blit(sdl2.ext.Texture(self.windowrenderer, self.surface))
+                    self.windowrenderer.present()
+                    self.window.refresh()
+            if self.profiler is not None:
+                self.profiler.end_frame()
+        self.stop_profiling()
+        self.stop_recording()
+        self.stop_streaming()
+
+    def start_recording(self, path:str):
+        """ Record every dispatched key event with its frame to `path`, see `replay_input`. """
+        self.stop_recording()
+        self.recorder = InputRecorder(path)
+
+    def stop_recording(self):
+        """ Stop recording key events. """
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def replay_input(self, path:str):
+        """
+        Feed the key events recorded in `path` back at their frames during the next `run`,
+        which then returns once the recording is over. Frame times end up in `replay.report()`.
+        """
+        self.replay = InputReplay(path)
+        self.frame = 0
+
+    def start_streaming(self, target:str):
+        """
+        Hand every rendered frame to `target` as raw video until stopped, see `open_frame_stream`.
+        Streams to pipes stop by themselves once the reader goes away.
+        """
+        self.stop_streaming()
+        self.stream = open_frame_stream(target, self.surface)
+
+    def stop_streaming(self):
+        """ Stop streaming frames. """
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def stage(self, name:str):
+        """ Return a context manager that profiles the enclosed code as frame stage `name`, if profiling. """
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.stage(name)
+
+    def start_profiling(self, path:str, snapshot_interval:int=60):
+        """ Record time, allocations and memory of every frame stage to `path` until stopped. """
+        self.stop_profiling()
+        self.profiler = FrameProfiler(path, snapshot_interval)
+        self.profiler.start()
+
+    def stop_profiling(self):
+        """ Stop recording frame statistics. """
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler = None
 
     def pause(self, event):
         """
@@ -0,0 +1,61 @@
+"""
+Generates the cut-and-project sequences (Sturmian words) of lines through the square lattice in bulk.
+A line y = slope * x + offset with slope >= 0 steps through the squares of the lattice either
+horizontally (0) or vertically (1). Step n is vertical exactly when
+floor((n+1) * alpha + rho) > floor(n * alpha + rho), with alpha = slope/(1+slope) and rho = offset/(1+slope).
+The Fibonacci chain is the sequence of slope 1/golden_ratio.
+Lines hitting lattice points exactly (rational slopes) are ambiguous there
+and resolved by floating point rounding.
+"""
+
+from fractions import Fraction
+
+import numpy as np
+
+DEFAULT_CHUNKSIZE = 1 << 22
+
+
+def _alpha_rho(slopes, offsets) -> tuple[np.ndarray, np.ndarray]:
+    slopes = np.atleast_1d(np.asarray(slopes, dtype=float))
+    offsets = np.broadcast_to(np.asarray(offsets, dtype=float), slopes.shape)
+    assert np.all(slopes >= 0)
+    return slopes / (1 + slopes), offsets / (1 + slopes)
+
+
+def sturmian_bits(slopes, offsets, start: int, count: int) -> np.ndarray:
+    """
+    Return steps `start` to `start + count` of the sequences of every slope/offset pair,
+    one row of 0 (horizontal) and 1 (vertical) per pair.
+    The fractional part of the starting position is computed exactly,
+    so chunks far into the sequence are as accurate as the first one.
+    """
+    alphas, rhos = _alpha_rho(slopes, offsets)
+    bases = np.array([
+        float((Fraction(alpha) * start + Fraction(rho)) % 1) for alpha, rho in zip(alphas, rhos)
+    ])
+    positions = np.arange(count + 1, dtype=float) * alphas[:, None]
+    positions += bases[:, None]
+    np.floor(positions, out=positions)
+    return (positions[:, 1:] != positions[:, :-1]).astype(np.uint8)
+
+
+def sturmian_packed(slopes, offsets, start: int, count: int) -> np.ndarray:
+    """ Like `sturmian_bits`, but packed into bytes, most significant bit first. """
+    return np.packbits(sturmian_bits(slopes, offsets, start, count), axis=-1)
+
+
+def write_sturmian(path: str, slopes, offsets, length: int, chunksize: int = DEFAULT_CHUNKSIZE) -> np.memmap:
+    """
+    Write the first `length` steps of the sequence of every slope/offset pair bit-packed to `path`,
+    as a raw uint8 array with one row of ceil(length/8) bytes per pair.
+    The sequences are computed chunk by chunk, so memory use only depends on `chunksize`.
+    """
+    assert chunksize % 8 == 0
+    alphas, _ = _alpha_rho(slopes, offsets)
+    rowbytes = (length + 7) // 8
+    output = np.memmap(path, dtype=np.uint8, mode="w+", shape=(len(alphas), rowbytes))
+    for start in range(0, length, chunksize):
+        count = min(chunksize, length - start)
+        output[:, start // 8 : (start + count + 7) // 8] = sturmian_packed(slopes, offsets, start, count)
+    output.flush()
+    return output
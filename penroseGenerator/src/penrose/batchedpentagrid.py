@@ -0,0 +1,127 @@
+''' Evaluates many multigrid configurations at once, the batched counterpart of MathPentagrid. '''
+
+import numpy as np
+from penroseGenerator.src.penrose.penrosemaps import MultigridMap
+
+class BatchedPentagrid():
+    '''
+    Holds `len(gammas)` configurations of the same multigrid, configuration b having the gammas `gammas[b]`
+    and the factors `c_to_r5_factors[b]`. Every method works on arrays with a leading axis of configurations,
+    so sweeps over gammas and rotations need no Python loop per configuration.
+    Lines are numbered the same way in every configuration, so all patches have the same shape.
+    '''
+    def __init__(
+        self,
+        gammas:np.ndarray,
+        c_to_r5_factors:"np.ndarray|None"=None,
+        r5_to_c_factors:"np.ndarray|None"=None,
+    ) -> None:
+        gammas = np.atleast_2d(np.asarray(gammas, dtype=float))
+        reference = MultigridMap(gammas[0].copy())
+        shape = gammas.shape
+        self.gammas = gammas
+        self.c_to_r5_factors = np.broadcast_to(
+            reference.c_to_r5_factor if c_to_r5_factors is None else np.asarray(c_to_r5_factors, complex), shape
+        )
+        self.r5_to_c_factors = np.broadcast_to(
+            reference.r5_to_c_factor if r5_to_c_factors is None else np.asarray(r5_to_c_factors, complex), shape
+        )
+
+    @classmethod
+    def from_maps(cls, penrosemaps:list[MultigridMap]) -> "BatchedPentagrid":
+        ''' Stack the configurations of maps with the same number of grids. '''
+        return cls(
+            np.stack([penrosemap.gamma for penrosemap in penrosemaps]),
+            np.stack([penrosemap.c_to_r5_factor for penrosemap in penrosemaps]),
+            np.stack([penrosemap.r5_to_c_factor for penrosemap in penrosemaps]),
+        )
+
+    @property
+    def grids(self) -> int:
+        ''' The number of grids of every configuration. '''
+        return self.gammas.shape[1]
+
+    def __len__(self) -> int:
+        return len(self.gammas)
+
+    def _per_config(self, values:np.ndarray, ndim:int) -> np.ndarray:
+        # Insert axes, so values of shape (batch, grids) broadcast against (batch, ..., grids).
+        return values.reshape(len(values), *([1] * (ndim - 2)), self.grids)
+
+    def c_to_r5(self, z:np.ndarray) -> np.ndarray:
+        ''' Map points `z` of shape (batch, ...) to R^n, returning shape (batch, ..., grids). '''
+        z = np.asarray(z)[..., None]
+        factors = self._per_config(self.c_to_r5_factors, z.ndim)
+        # Re(z f) without the complex product.
+        values = z.real * factors.real - z.imag * factors.imag + self._per_config(self.gammas, z.ndim)
+        return values.round(10)
+
+    def r5_to_r5(self, k:np.ndarray) -> np.ndarray:
+        ''' The projection inside R^n, the same for every configuration. '''
+        return np.ceil(k)
+
+    def r5_to_c(self, k:np.ndarray) -> np.ndarray:
+        ''' Map vectors of shape (batch, ..., grids) to the plane, returning shape (batch, ...). '''
+        return np.sum(k * self._per_config(self.r5_to_c_factors, k.ndim), axis=-1)
+
+    def get_intersections(self, imin:int, imax:int) -> np.ndarray:
+        '''
+        Return the intersections of lines `imin` to `imax` of every pair of grids as rows (x, y, r, s),
+        of shape (batch, pairs * lines**2, 4) and in the order of `intersect_lattices`.
+        Pairs that are parallel in a configuration get NaN coordinates there.
+        '''
+        lat_i, lat_j = np.triu_indices(self.grids, 1)
+        linenos = np.arange(imin, imax + 1, dtype=float)
+        linecount = len(linenos)
+        # Line a of grid r is where x Re(f_r) - y Im(f_r) = a - gamma_r.
+        normals = np.stack([self.c_to_r5_factors.real, -self.c_to_r5_factors.imag], axis=-1)
+        n_i, n_j = normals[:, lat_i], normals[:, lat_j]
+        determinants = n_i[..., 0] * n_j[..., 1] - n_i[..., 1] * n_j[..., 0]
+        determinants = np.where(np.abs(determinants) > 1e-10, determinants, np.nan)
+        dists_i = linenos - self.gammas[:, lat_i, None]
+        dists_j = linenos - self.gammas[:, lat_j, None]
+        # Cramer's rule for every configuration, pair, line b of grid s and line a of grid r.
+        d_i, d_j = dists_i[:, :, None, :], dists_j[:, :, :, None]
+        points_x = (d_i * n_j[..., 1, None, None] - d_j * n_i[..., 1, None, None]) / determinants[..., None, None]
+        points_y = (n_i[..., 0, None, None] * d_j - n_j[..., 0, None, None] * d_i) / determinants[..., None, None]
+        intersections = np.empty((len(self), len(lat_i), linecount, linecount, 4), dtype=float)
+        intersections[..., 0] = points_x
+        intersections[..., 1] = points_y
+        intersections[..., 2] = lat_i[:, None, None]
+        intersections[..., 3] = lat_j[:, None, None]
+        return intersections.reshape(len(self), -1, 4)
+
+    def get_Ks_from_intersections(self, intersections:np.ndarray) -> np.ndarray:
+        ''' Return the K vectors for every row (x, y, r, s) of `intersections` of shape (batch, n, 4). '''
+        return self.r5_to_r5(self.c_to_r5(intersections[..., 0] + 1j * intersections[..., 1]))
+
+    def get_verts_from_intersections(self, intersections:np.ndarray, k_vals:"np.ndarray|None"=None):
+        '''
+        Return the vertices of every rhomb as an array of shape (batch, n, 4, 2).
+        r5_to_c is linear, so the vertices K + e_s, K + e_r + e_s and K + e_r are the image of K
+        plus the images of the unit vectors, which saves building the 5d vertices.
+        '''
+        if k_vals is None:
+            k_vals = self.get_Ks_from_intersections(intersections)
+        r, s = intersections[..., 2].astype(int), intersections[..., 3].astype(int)
+        base = self.r5_to_c(k_vals)
+        unit_r = np.take_along_axis(self.r5_to_c_factors, r, axis=1)
+        unit_s = np.take_along_axis(self.r5_to_c_factors, s, axis=1)
+        vertices2d = np.stack([base, base + unit_s, base + unit_r + unit_s, base + unit_r], axis=-1)
+        return np.stack([vertices2d.real, vertices2d.imag], axis=-1)
+
+    def get_patch(self, imin:int, imax:int):
+        '''
+        Return intersections, K vectors and vertices of every rhomb between lines `imin` and `imax`
+        of every configuration. The two crossing lines of every rhomb are known exactly and used for K.
+        '''
+        intersections = self.get_intersections(imin, imax)
+        k_vals = self.get_Ks_from_intersections(intersections)
+        pairs, linecount = len(intersections[0]) // (imax - imin + 1) ** 2, imax - imin + 1
+        lines_a = np.tile(np.arange(imin, imax + 1), pairs * linecount)
+        lines_b = np.tile(np.repeat(np.arange(imin, imax + 1), linecount), pairs)
+        rows = np.arange(intersections.shape[1])
+        r, s = intersections[0, :, 2].astype(int), intersections[0, :, 3].astype(int)
+        k_vals[:, rows, r] = lines_a
+        k_vals[:, rows, s] = lines_b
+        return intersections, k_vals, self.get_verts_from_intersections(intersections, k_vals)
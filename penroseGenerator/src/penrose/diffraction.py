@@ -0,0 +1,168 @@
+'''
+Computes the diffraction pattern (structure factor) |sum_j w_j exp(i k x_j)|^2 / N of point sets,
+to check the quasicrystalline order of generated tilings by their sharp Bragg peaks.
+On a rectangular grid of wave vectors the phase factors separate into exp(i kx x) exp(i ky y),
+so the sum over a chunk of points is one complex matrix product.
+Points are processed in chunks and the grid in rectangular blocks on a process pool, so memory stays bounded
+even for millions of wave vectors.
+'''
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from PIL import Image
+from penroseGenerator.src.core.frameprofiler import get_peak_rss
+from penroseGenerator.src.core.telemetry import JobTelemetry
+from penroseGenerator.src.penrose.mathpentagrid import MathPentagrid
+from penroseGenerator.src.penrose.penrosemaps import MultigridMap, PenroseMap
+
+_worker_points: "np.ndarray|None" = None
+_worker_weights: "np.ndarray|None" = None
+
+def get_patch_vertices(mathpg:MathPentagrid, imin:int, imax:int) -> np.ndarray:
+    ''' Return the distinct vertices of the patch between lines `imin` and `imax` as an array of shape (n, 2). '''
+    intersections, k_vals, _ = mathpg.get_patch(imin, imax)
+    rows = np.arange(len(intersections))
+    r, s = intersections[:, 2].astype(int), intersections[:, 3].astype(int)
+    k_vals = np.rint(k_vals).astype(np.int64)
+    vertices5d = np.repeat(k_vals[:, None, :], 4, axis=1)
+    vertices5d[rows, 2:, r] += 1
+    vertices5d[rows, 1:3, s] += 1
+    vertices5d = np.unique(vertices5d.reshape(-1, mathpg.grids), axis=0)
+    positions = mathpg.penrosemap.r5_to_c(vertices5d.astype(float))
+    return np.stack([positions.real, positions.imag], axis=-1)
+
+def crop_to_disc(points:np.ndarray, fraction:float=.9) -> np.ndarray:
+    '''
+    Keep the points within the disc around their center whose diameter is `fraction` of their smaller extent.
+    The round window avoids the streaks the straight, anisotropic edges of a patch add to the pattern.
+    '''
+    center = (points.min(axis=0) + points.max(axis=0)) / 2
+    radius = fraction * float(np.min(np.ptp(points, axis=0))) / 2
+    return points[np.sum((points - center) ** 2, axis=1) <= radius**2]
+
+def structure_factor_block(
+    points:np.ndarray,
+    kx:np.ndarray,
+    ky:np.ndarray,
+    weights:"np.ndarray|None"=None,
+    chunksize:int=8192,
+    dtype:type=np.complex64,
+) -> np.ndarray:
+    '''
+    Return the summed amplitudes sum_j w_j exp(i (kx x_j + ky y_j)) for every pair of `kx` and `ky`.
+    Phases are computed and the chunks summed in double precision, only the factors are stored as `dtype`.
+    Rounding the factors to complex64 costs about 1e-6 of the peak intensity, complex128 is exact to 1e-12.
+    '''
+    amplitude = np.zeros((len(kx), len(ky)), dtype=np.complex128)
+    for start in range(0, len(points), chunksize):
+        chunk = points[start:start + chunksize]
+        factors_x = np.exp(1j * np.outer(chunk[:, 0], kx)).astype(dtype)
+        factors_y = np.exp(1j * np.outer(chunk[:, 1], ky)).astype(dtype)
+        if weights is not None:
+            factors_x *= weights[start:start + chunksize, None]
+        amplitude += factors_x.T @ factors_y
+    return amplitude
+
+def _init_worker(points:np.ndarray, weights:"np.ndarray|None"):
+    global _worker_points, _worker_weights #pylint: disable=global-statement
+    _worker_points, _worker_weights = points, weights
+
+def _worker_block(block:tuple[int, int], kx:np.ndarray, ky:np.ndarray, chunksize:int, dtype:type):
+    assert _worker_points is not None
+    start = time.perf_counter()
+    amplitude = structure_factor_block(_worker_points, kx, ky, _worker_weights, chunksize, dtype)
+    return block, np.abs(amplitude) ** 2, os.getpid(), time.perf_counter() - start, get_peak_rss()
+
+def structure_factor(
+    points:np.ndarray,
+    kx:np.ndarray,
+    ky:np.ndarray,
+    weights:"np.ndarray|None"=None,
+    workers:"int|None"=None,
+    chunksize:int=8192,
+    blocksize:int=256,
+    telemetry:"JobTelemetry|None"=None,
+    dtype:type=np.complex64,
+) -> np.ndarray:
+    '''
+    Return the diffraction intensity |sum_j w_j exp(i k x_j)|^2 / N on the grid of wave vectors (`kx`, `ky`),
+    as an array of shape (len(kx), len(ky)).
+    The grid is split into blocks of at most `blocksize` by `blocksize` wave vectors and computed on `workers`
+    processes, each holding at most `chunksize` points times one block of phase factors of `dtype` in memory.
+    Every block is counted in `telemetry`, if given, as soon as it finished, whichever worker computed it.
+    The telemetry also learns the number of blocks and workers.
+    '''
+    points = np.ascontiguousarray(points, dtype=float)
+    kx, ky = np.asarray(kx, dtype=float), np.asarray(ky, dtype=float)
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    rowsize = max(1, min(blocksize, -(-len(kx) // max(workers, 1))))
+    blocks = [(x, y) for x in range(0, len(kx), rowsize) for y in range(0, len(ky), blocksize)]
+    arguments = (
+        blocks,
+        [kx[x:x + rowsize] for x, _ in blocks],
+        [ky[y:y + blocksize] for _, y in blocks],
+        [chunksize] * len(blocks),
+        [dtype] * len(blocks),
+    )
+    if telemetry is not None:
+        telemetry.total_chunks, telemetry.workers = len(blocks), max(workers, 1)
+    intensity = np.zeros((len(kx), len(ky)))
+    def collect(results):
+        for (x, y), block, pid, busy, peak_rss in results:
+            intensity[x:x + block.shape[0], y:y + block.shape[1]] = block
+            if telemetry is not None:
+                telemetry.advance(block.size, worker=pid, busy=busy, peak_rss=peak_rss)
+    if workers <= 1 or len(blocks) == 1:
+        _init_worker(points, weights)
+        collect(map(_worker_block, *arguments))
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(points, weights)) as executor:
+            futures = [executor.submit(_worker_block, *blockarguments) for blockarguments in zip(*arguments)]
+            collect(future.result() for future in as_completed(futures))
+    return intensity / max(len(points), 1)
+
+def intensity_image(intensity:np.ndarray, dynamic_range:float=1e4) -> Image.Image:
+    ''' Map intensities logarithmically to a grayscale image, kx to the right and ky upwards. '''
+    peak = float(intensity.max()) if intensity.size else 1.0
+    scaled = np.log10(np.maximum(intensity, peak / dynamic_range) / (peak / dynamic_range))
+    scaled /= max(float(scaled.max()), 1e-12)
+    return Image.fromarray((255 * scaled.T[::-1]).astype(np.uint8))
+
+def main():
+    ''' Write the diffraction pattern of a patch to a png. '''
+    parser = argparse.ArgumentParser(description="Computes the diffraction pattern of a tiling's vertices.")
+    parser.add_argument("output", help="The png to write.")
+    parser.add_argument("--gamma", default=".0,.1,.2,.3,-.6",
+                        help="Comma separated gammas, one per grid. Five gammas give a Penrose tiling.")
+    parser.add_argument("--lines", type=int, default=20, help="Use the patch between lines -lines and lines.")
+    parser.add_argument("--kmax", type=float, default=4 * np.pi, help="Largest wave vector component.")
+    parser.add_argument("--resolution", type=int, default=512, help="Wave vectors per axis.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--telemetry",
+                        help="Report progress to this file, as json lines or as Prometheus text if it ends in .prom.")
+    parser.add_argument("--telemetry-interval", type=float, default=5.0, help="Seconds between reports.")
+    args = parser.parse_args()
+    gamma = np.array([float(value) for value in args.gamma.split(",")])
+    penrosemap = PenroseMap(gamma) if len(gamma) == 5 else MultigridMap(gamma)
+    mathpg = MathPentagrid(penrosemap)
+    points = crop_to_disc(get_patch_vertices(mathpg, -args.lines, args.lines))
+    k = np.linspace(-args.kmax, args.kmax, args.resolution)
+    telemetry = None
+    if args.telemetry:
+        telemetry = JobTelemetry(args.telemetry, "diffraction", total_items=len(k) ** 2, unit="wave vectors",
+                                 interval=args.telemetry_interval)
+        telemetry.start()
+    try:
+        intensity = structure_factor(points, k, k, workers=args.workers, telemetry=telemetry)
+    finally:
+        if telemetry is not None:
+            telemetry.stop()
+    intensity_image(intensity).save(args.output)
+    print(f"{len(points)} vertices, {args.resolution}x{args.resolution} wave vectors -> {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+''' Contains the IncrementalTiling class. '''
+
+from typing import TYPE_CHECKING, NamedTuple
+
+import numpy as np
+from penroseGenerator.src.core.geometry import intersect_lattices
+from penroseGenerator.src.penrose.mathpentagrid import MathPentagrid
+from penroseGenerator.src.penrose.penrosemaps import MultigridMap
+if TYPE_CHECKING:
+    from penroseGenerator.src.penrose.patchcache import PatchCache
+
+class TileChanges(NamedTuple):
+    '''
+    The tiles that changed during an update. Tiles are identified by their grid pair and K vector.
+    `added` and `moved` are row indices into the new tile arrays, `removed` into the old ones.
+    Moved tiles kept their K vector, and with it their vertices, but their intersection moved.
+    '''
+    added: np.ndarray
+    removed: np.ndarray
+    moved: np.ndarray
+
+def tile_keys(intersections:np.ndarray, k_vals:np.ndarray) -> np.ndarray:
+    ''' Return one comparable key per tile, made of its grid pair and K vector. '''
+    keys = np.empty((len(intersections), 2 + k_vals.shape[1]), dtype=np.int64)
+    keys[:, :2] = intersections[:, 2:4]
+    keys[:, 2:] = np.rint(k_vals)
+    return keys.view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).ravel()
+
+class IncrementalTiling():
+    '''
+    Keeps the tiles of a map up to date while its gammas change.
+    The rows stay in the order of `intersect_lattices`, so a tile keeps its index
+    as long as the grid layout (factors, line range) stays the same.
+    When only some gammas changed, only the intersections involving those grids are recomputed,
+    the other tiles only get the changed components of their K vectors updated.
+    The old and new tiles are then diffed by grid pair and K vector. Only the rows whose K vector changed
+    have to be compared as keys, as every other row still holds the same tile.
+    Every update returns new arrays, so older ones can still be read on another thread.
+    Full regenerations are loaded from `cache` if one is given.
+    '''
+    def __init__(self, cache:"PatchCache|None"=None) -> None:
+        self.cache = cache
+        self.intersections = np.zeros((0, 4), dtype=float)
+        self.k_vals = np.zeros((0, 0), dtype=float)
+        self.tiles = np.zeros((0, 4, 2), dtype=float)
+        self._layout: "tuple[int, int, bytes]|None" = None
+        self._gamma = np.zeros(0)
+
+    def update(self, mathpg:MathPentagrid, linemin:int, linemax:int) -> TileChanges:
+        ''' Bring the tiles up to date with the map of `mathpg` and return what changed. '''
+        penrosemap = mathpg.penrosemap
+        assert isinstance(penrosemap, MultigridMap)
+        layout = (linemin, linemax, penrosemap.c_to_r5_factor.tobytes())
+        if layout != self._layout:
+            return self._regenerate(mathpg, linemin, linemax, layout)
+        changed = np.flatnonzero(penrosemap.gamma != self._gamma)
+        self._gamma = penrosemap.gamma.copy()
+        if len(changed) == 0:
+            return TileChanges(np.zeros(0, int), np.zeros(0, int), np.zeros(0, int))
+        r, s = self.intersections[:, 2].astype(int), self.intersections[:, 3].astype(int)
+        affected = np.isin(r, changed) | np.isin(s, changed)
+        intersections = self.intersections.copy()
+        k_vals = self.k_vals.copy()
+        pair_rows = np.flatnonzero(affected)[::(linemax - linemin + 1)**2]
+        pairs = (r[pair_rows], s[pair_rows])
+        lattices = [mathpg.reverse_is_on_grid(j, linemin, linemax) for j in range(mathpg.grids)]
+        intersections[affected] = intersect_lattices(lattices, pairs)
+        k_vals[affected] = mathpg.get_Ks_from_intersections(intersections[affected])
+        # Lines of the other grids did not move, so only the changed components of their K vectors can.
+        points = intersections[~affected, 0] + 1j * intersections[~affected, 1]
+        k_changed = (points[:, None] * penrosemap.c_to_r5_factor[changed]).real + penrosemap.gamma[changed]
+        k_vals[np.ix_(~affected, changed)] = penrosemap.r5_to_r5(k_changed.round(10))
+        rekeyed = np.flatnonzero(np.any(k_vals != self.k_vals, axis=1))
+        tiles = self.tiles.copy()
+        tiles[rekeyed] = mathpg.get_verts_from_intersections(intersections[rekeyed], k_vals[rekeyed])
+        oldkeys = tile_keys(self.intersections[rekeyed], self.k_vals[rekeyed])
+        newkeys = tile_keys(intersections[rekeyed], k_vals[rekeyed])
+        # A tile can only reappear in another row if rows were reordered, but diff by key anyway.
+        added = rekeyed[~np.isin(newkeys, oldkeys)]
+        removed = rekeyed[~np.isin(oldkeys, newkeys)]
+        moved = np.union1d(np.setdiff1d(np.flatnonzero(affected), rekeyed), rekeyed[np.isin(newkeys, oldkeys)])
+        self.intersections, self.k_vals, self.tiles = intersections, k_vals, tiles
+        return TileChanges(added, removed, moved)
+
+    def _regenerate(self, mathpg:MathPentagrid, linemin:int, linemax:int, layout) -> TileChanges:
+        removed = np.arange(len(self.intersections))
+        if self.cache is not None:
+            patch = self.cache.get_patch(mathpg, linemin, linemax)
+        else:
+            patch = mathpg.get_patch(linemin, linemax)
+        self.intersections, self.k_vals, self.tiles = patch
+        self._layout = layout
+        self._gamma = mathpg.penrosemap.gamma.copy()
+        return TileChanges(np.arange(len(self.intersections)), removed, np.zeros(0, int))
@@ -1,18 +1,24 @@
 ''' Acts as a facade for the maps defined in penrosemaps.py. '''
 
 import numpy as np
-from penroseGenerator.src.core.geometry import Lattice
-from penroseGenerator.src.penrose.penrosemaps import PenroseMap
+from penroseGenerator.src.core.geometry import Lattice, intersect_lattices
+from penroseGenerator.src.core.telemetry import JobTelemetry
+from penroseGenerator.src.penrose.penrosemaps import MapBase
 
 class MathPentagrid():
     ''' Provides helpers for calculating a pentagrid and transforming vertices. '''
-    def __init__(self, penrosemap:PenroseMap) -> None:
-        assert isinstance(penrosemap, PenroseMap)
+    def __init__(self, penrosemap:MapBase) -> None:
+        assert isinstance(penrosemap, MapBase)
         self.penrosemap = penrosemap
 
+    @property
+    def grids(self) -> int:
+        ''' The number of grids (and dimensions of the lattice) used by the map. '''
+        return len(self.penrosemap.gamma)
+
     def is_on_grid(self, z:complex, j:int):
         ''' Return whether `z` is part of the `j`-th grid. '''
-        assert 0 <= j <= 4
+        assert 0 <= j < self.grids
         tmp = self.penrosemap.c_to_r5(z)[j]
         return abs(tmp - round(tmp, 11)) <= 1e-10
 
@@ -26,9 +32,9 @@ class MathPentagrid():
 
     def get_verts_from_intersect(self, z:complex, r:int, s:int):
         ''' Return the vertices for the rhomb determined by the intersection of 2 grids. '''
-        delta1 = np.zeros(5, float)
+        delta1 = np.zeros(self.grids, float)
         delta1[r]=1
-        delta2 = np.zeros(5, float)
+        delta2 = np.zeros(self.grids, float)
         delta2[s]=1
         vertices = np.ndarray((4,2), float)
         epsilons = [[0,0], [0,1], [1,1], [1,0]]
@@ -38,3 +44,115 @@ class MathPentagrid():
             vertex2d = self.penrosemap.r5_to_c(vertex5d)
             vertices[i:,] = np.array([vertex2d.real, vertex2d.imag])
         return vertices
+
+    def get_Ks_from_intersections(self, intersections:np.ndarray):
+        ''' Return the K vectors for every row (x, y, r, s) of `intersections` at once. '''
+        points = intersections[:, 0] + 1j * intersections[:, 1]
+        return self.penrosemap.r5_to_r5(self.penrosemap.c_to_r5(points[:, None]))
+
+    def get_verts_from_intersections(self, intersections:np.ndarray, k_vals:"np.ndarray|None"=None):
+        '''
+        Return the vertices of every rhomb in `intersections` as an array of shape (n, 4, 2).
+        Pass `k_vals` if the K vectors of the intersections are already known.
+        '''
+        if k_vals is None:
+            k_vals = self.get_Ks_from_intersections(intersections)
+        rows = np.arange(len(intersections))
+        r, s = intersections[:, 2].astype(int), intersections[:, 3].astype(int)
+        vertices5d = np.repeat(k_vals[:, None, :], 4, axis=1).astype(float)
+        vertices5d[rows, 2:, r] += 1
+        vertices5d[rows, 1:3, s] += 1
+        vertices2d = self.penrosemap.r5_to_c(vertices5d)
+        return np.stack([vertices2d.real, vertices2d.imag], axis=-1)
+
+    def get_patch(self, imin:int, imax:int, telemetry:"JobTelemetry|None"=None):
+        '''
+        Return intersections, K vectors and vertices of every rhomb between lines `imin` and `imax`.
+        With `telemetry`, the patch is generated and counted one grid pair at a time.
+        '''
+        lattices = [self.reverse_is_on_grid(j, imin, imax) for j in range(self.grids)]
+        if telemetry is None:
+            intersections = intersect_lattices(lattices)
+            k_vals = self.get_Ks_from_intersections(intersections)
+            return intersections, k_vals, self.get_verts_from_intersections(intersections, k_vals)
+        pairs = np.triu_indices(self.grids, 1)
+        telemetry.total_chunks = len(pairs[0])
+        parts = []
+        for i, j in zip(*pairs):
+            intersections = intersect_lattices(lattices, (np.array([i]), np.array([j])))
+            k_vals = self.get_Ks_from_intersections(intersections)
+            parts.append((intersections, k_vals, self.get_verts_from_intersections(intersections, k_vals)))
+            telemetry.advance(len(intersections))
+        return tuple(np.concatenate(column) for column in zip(*parts))
+
+    def get_region_patch(self, lower:np.ndarray, upper:np.ndarray):
+        '''
+        Return intersections, K vectors and vertices of every rhomb
+        touching the rectangle between `lower` and `upper` in tiling space.
+        '''
+        penrosemap = self.penrosemap
+        # Up to the rounding of the K vectors, tiles lie at the affine image of their intersection.
+        base = penrosemap.r5_to_c(penrosemap.c_to_r5(0j))
+        unit_x = penrosemap.r5_to_c(penrosemap.c_to_r5(1+0j)) - base
+        unit_y = penrosemap.r5_to_c(penrosemap.c_to_r5(1j)) - base
+        affine = np.array([[unit_x.real, unit_y.real], [unit_x.imag, unit_y.imag]])
+        edges = np.abs(np.array([penrosemap.r5_to_c(unit) for unit in np.eye(self.grids)]))
+        pad = edges.sum() + 2 * edges.max()
+        lo_padded = np.asarray(lower, float) - pad - (base.real, base.imag)
+        hi_padded = np.asarray(upper, float) + pad - (base.real, base.imag)
+        corners = np.array(
+            [[lo_padded[0], lo_padded[1]], [lo_padded[0], hi_padded[1]],
+             [hi_padded[0], lo_padded[1]], [hi_padded[0], hi_padded[1]]]
+        )
+        gridcorners = np.linalg.solve(affine, corners.T).T
+        values = penrosemap.c_to_r5((gridcorners[:, 0] + 1j * gridcorners[:, 1])[:, None])
+        starts = np.floor(values.min(axis=0)).astype(int)
+        linecount = int(np.max(np.ceil(values.max(axis=0)) - starts))
+        lattices = [
+            self.reverse_is_on_grid(j, int(starts[j]), int(starts[j]) + linecount) for j in range(self.grids)
+        ]
+        intersections = intersect_lattices(lattices)
+        projected = intersections[:, :2] @ affine.T
+        near = np.all((projected >= lo_padded) & (projected <= hi_padded), axis=1)
+        intersections = intersections[near]
+        k_vals = self.get_Ks_from_intersections(intersections)
+        tiles = self.get_verts_from_intersections(intersections, k_vals)
+        touching = np.all(tiles.max(axis=1) >= lower, axis=1) & np.all(tiles.min(axis=1) <= upper, axis=1)
+        return intersections[touching], k_vals[touching], tiles[touching]
+
+    def iter_ribbon(self, j:int, line:int, tmin:float, tmax:float, chunklength:float=1000.0):
+        '''
+        Yield the ribbon of rhombs dual to line `line` of grid `j` between the line parameters
+        `tmin` and `tmax`, in order along the line, in chunks of `chunklength`.
+        Every chunk is a tuple (params, intersections, K vectors, vertices).
+        Consecutive rhombs share an edge parallel to the `j`-th unit vector.
+        '''
+        assert tmin < tmax and chunklength > 0
+        ribbonline, _, _, step, offset = self.reverse_is_on_grid(j, line, line)
+        ribbonline.dist_to_zero = line * step + offset
+        start, direction = ribbonline.start, ribbonline.direction
+        base = self.penrosemap.c_to_r5(complex(*start))
+        slopes = self.penrosemap.c_to_r5(complex(*(start + direction))) - base
+        others = np.array([k for k in range(self.grids) if k != j and abs(slopes[k]) > 1e-12])
+        for chunkstart in np.arange(tmin, tmax, chunklength):
+            chunkend = min(chunkstart + chunklength, tmax)
+            # Grid k crosses the ribbon line wherever base[k] + slopes[k] * t is an integer.
+            ends = base[others, None] + slopes[others, None] * np.array([chunkstart, chunkend])
+            firsts = np.ceil(ends.min(axis=1)).astype(int)
+            counts = np.floor(ends.max(axis=1)).astype(int) - firsts + 1
+            grids = np.repeat(others, counts)
+            linenos = np.repeat(firsts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            params = (linenos - base[grids]) / slopes[grids]
+            inside = (params >= chunkstart) & (params < chunkend)
+            order = np.argsort(params[inside], kind="stable")
+            params, grids, linenos = params[inside][order], grids[inside][order], linenos[inside][order]
+            intersections = np.empty((len(params), 4), dtype=float)
+            intersections[:, :2] = start + params[:, None] * direction
+            intersections[:, 2] = np.minimum(grids, j)
+            intersections[:, 3] = np.maximum(grids, j)
+            # The two crossing lines are known exactly, which the intersection points are not far out.
+            values = base + params[:, None] * slopes
+            values[np.arange(len(params)), grids] = linenos
+            values[:, j] = line
+            k_vals = self.penrosemap.r5_to_r5(values.round(10))
+            yield params, intersections, k_vals, self.get_verts_from_intersections(intersections, k_vals)
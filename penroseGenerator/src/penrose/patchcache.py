@@ -0,0 +1,128 @@
+''' Contains the PatchCache class. '''
+
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+from penroseGenerator.src.core.telemetry import JobTelemetry
+from penroseGenerator.src.penrose.mathpentagrid import MathPentagrid
+from penroseGenerator.src.penrose.penrosemaps import MapBase
+from penroseGenerator.src.penrose.tilestore import TileStore
+
+ENGINE_VERSION = 3
+''' Bump this whenever the generated patches change, so old cache entries are not used anymore. '''
+CACHE_COLUMNS = ("intersections", "k_vals", "tiles")
+
+class PatchCache():
+    '''
+    Stores generated patches on disk, one directory of .npy files per patch: the float64 intersections
+    in the layout of `MathPentagrid.get_patch`, as K vectors are recomputed from them,
+    and the compact K vectors and vertices of a TileStore.
+    Hits are memory-mapped read-only and returned without copies, unreadable patches count as misses.
+    Once the cache grows beyond `max_bytes`, the least recently used patches are removed.
+    The sizes and order of use are scanned from disk once and then kept in memory,
+    so storing a patch does not list the whole directory.
+    '''
+    def __init__(self, directory:str, max_bytes:int=1 << 30) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(directory):
+            if entry.name.startswith(".") or not entry.is_dir():
+                continue
+            entries.append((entry.stat().st_mtime, entry.name, self._size(entry.path)))
+        self._index: "OrderedDict[str, int]" = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self.total_bytes = sum(self._index.values())
+
+    @staticmethod
+    def _size(path:str) -> int:
+        return sum(file.stat().st_size for file in os.scandir(path))
+
+    @staticmethod
+    def make_key(penrosemap:MapBase, region:tuple) -> str:
+        ''' Hash the map state, the region and the engine version into a key. '''
+        digest = hashlib.sha256()
+        digest.update(f"{ENGINE_VERSION}:{type(penrosemap).__name__}:{region!r}".encode("ascii"))
+        digest.update(np.ascontiguousarray(penrosemap.gamma, dtype=float).tobytes())
+        digest.update(np.ascontiguousarray(penrosemap.c_to_r5_factor, dtype=complex).tobytes())
+        return digest.hexdigest()
+
+    def get(self, key:str) -> "dict[str, np.ndarray]|None":
+        ''' Return the memory-mapped arrays stored under `key`, or None if there are none. '''
+        path = os.path.join(self.directory, key)
+        try:
+            arrays = {
+                filename[:-4]: np.load(os.path.join(path, filename), mmap_mode="r")
+                for filename in os.listdir(path) if filename.endswith(".npy")
+            }
+            os.utime(path)
+        except FileNotFoundError:
+            self._forget(key)
+            return None
+        except (OSError, ValueError):
+            # Truncated or otherwise broken files, e.g. from a crash.
+            self.discard(key)
+            return None
+        if key in self._index:
+            self._index.move_to_end(key)
+        return arrays
+
+    def put(self, key:str, arrays:"dict[str, np.ndarray]"):
+        ''' Store `arrays` under `key` and evict old patches if the cache got too large. '''
+        path = os.path.join(self.directory, key)
+        tmppath = tempfile.mkdtemp(dir=self.directory, prefix=".tmp-")
+        for name, array in arrays.items():
+            np.save(os.path.join(tmppath, name + ".npy"), array)
+        try:
+            os.rename(tmppath, path)
+        except OSError:
+            shutil.rmtree(tmppath, ignore_errors=True)
+            if not os.path.isdir(path):
+                # Not stored, e.g. the disk is full. The patch is only generated again next time.
+                return
+            # Otherwise another process stored the same patch in the meantime.
+        self._forget(key)
+        self._index[key] = self._size(path)
+        self.total_bytes += self._index[key]
+        self.evict()
+
+    def discard(self, key:str):
+        ''' Remove the patch stored under `key`, if there is one. '''
+        shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+        self._forget(key)
+
+    def _forget(self, key:str):
+        self.total_bytes -= self._index.pop(key, 0)
+
+    def get_patch(self, mathpg:MathPentagrid, imin:int, imax:int, telemetry:"JobTelemetry|None"=None):
+        '''
+        Like `MathPentagrid.get_patch`, but loaded from the cache if possible, with K vectors as int16 or int32
+        and vertices as float32. A patch that has to be generated and stored is counted in `telemetry`, if given.
+        '''
+        key = self.make_key(mathpg.penrosemap, (imin, imax))
+        arrays = self.get(key)
+        if arrays is not None and any(name not in arrays for name in CACHE_COLUMNS):
+            self.discard(key)
+            arrays = None
+        if arrays is None:
+            intersections, k_vals, tiles = mathpg.get_patch(imin, imax, telemetry)
+            store = TileStore.from_patch(intersections, k_vals, tiles)
+            arrays = {"intersections": intersections, "k_vals": store.k_vals, "tiles": store.tiles}
+            self.put(key, arrays)
+        return arrays["intersections"], arrays["k_vals"], arrays["tiles"]
+
+    def get_store(
+        self, mathpg:MathPentagrid, imin:int, imax:int, telemetry:"JobTelemetry|None"=None
+    ) -> TileStore:
+        ''' Like `get_patch`, but as a TileStore. Only its small grid column is copied, the rest are views. '''
+        intersections, k_vals, tiles = self.get_patch(mathpg, imin, imax, telemetry)
+        return TileStore(intersections[:, :2], intersections[:, 2:4].astype(np.uint8), k_vals, tiles)
+
+    def evict(self):
+        ''' Remove the least recently used patches until the cache fits into `max_bytes`. '''
+        while self.total_bytes > self.max_bytes and self._index:
+            self.discard(next(iter(self._index)))
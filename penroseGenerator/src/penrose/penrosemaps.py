@@ -12,6 +12,7 @@ class MapBase(ABC):
     The Base class for every map used to draw Penrose-like tilings.
     '''
     gamma:ndarray
+    c_to_r5_factor:ndarray
     @abstractmethod
     def c_to_r5(self, z:complex) -> ndarray:
         ''' Defines the mapping from the complex plane to R^5. '''
@@ -28,33 +29,23 @@ class MapBase(ABC):
     def get_solution_space(self, j:int, imin:int=-5, imax:int=5) -> Lattice:
         ''' The explicit version of the grid lines. '''
 
-class PenroseMap(MapBase):
+class MultigridMap(MapBase):
     '''
-    Use this to obtain a normal penrose tiling
+    Use this to obtain a tiling from `len(gamma)` grids, e.g. 7 grids for a 7-fold tiling,
+    4 grids for an 8-fold (Ammann-Beenker-like) or 6 grids for a 12-fold tiling.
+    Odd grid counts use the n-th roots of unity, even ones the 2n-th roots of unity,
+    so no two grids are parallel.
     '''
     def __init__(self, gamma:ndarray) -> None:
         super().__init__()
-        self.phi =  (1+sqrt(5)) / 2
         self.gamma = gamma
-        zeta = e ** (2j*pi/5)
-        self.c_to_r5_factor = power(array([zeta]*5, None), -arange(5))
-        self.r5_to_c_factor = power(array([zeta]*5, None),  arange(5))
-        self.inflationmatrix = self.phi * array([
-            [0,1,0,0,1],
-            [1,0,1,0,0],
-            [0,1,0,1,0],
-            [0,0,1,0,1],
-            [1,0,0,1,0],
-        ], dtype=float)
-        self.deflationmatrix = 1/self.phi * .5 * array([
-            [1,1,-1,-1,1],
-            [1,1,1,-1,-1],
-            [-1,1,1,1,-1],
-            [-1,-1,1,1,1],
-            [1,-1,-1,1,1],
-
-        ], dtype=float)
-        self.validate_values()
+        self.grids = len(gamma)
+        assert self.grids >= 3
+        zeta = e ** ((2j if self.grids % 2 else 1j) * pi/self.grids)
+        self.c_to_r5_factor = power(array([zeta]*self.grids, None), -arange(self.grids))
+        self.r5_to_c_factor = power(array([zeta]*self.grids, None),  arange(self.grids))
+        if self.grids % 2:
+            self.validate_values()
 
     def get_solution_space(self, j:int, imin:int=-5, imax:int=5) -> Lattice:
         ''' Return imax-imin of parameterized parallel lines representing the jth grid. '''
@@ -71,6 +62,37 @@ class PenroseMap(MapBase):
     def r5_to_c(self, k: ndarray) -> complex:
         return inner(k, self.r5_to_c_factor)
 
+    def validate_values(self, sum_cr5=True, sum_r5c=True):
+        ''' Ensure that the sums of the different map values are zero. '''
+        if sum_cr5:
+            assert abs(sum(self.c_to_r5_factor)) <= 1e-10
+        if sum_r5c:
+            assert abs(sum(self.r5_to_c_factor)) <= 1e-10
+
+class PenroseMap(MultigridMap):
+    '''
+    Use this to obtain a normal penrose tiling
+    '''
+    def __init__(self, gamma:ndarray) -> None:
+        assert len(gamma) == 5
+        super().__init__(gamma)
+        self.phi =  (1+sqrt(5)) / 2
+        self.inflationmatrix = self.phi * array([
+            [0,1,0,0,1],
+            [1,0,1,0,0],
+            [0,1,0,1,0],
+            [0,0,1,0,1],
+            [1,0,0,1,0],
+        ], dtype=float)
+        self.deflationmatrix = 1/self.phi * .5 * array([
+            [1,1,-1,-1,1],
+            [1,1,1,-1,-1],
+            [-1,1,1,1,-1],
+            [-1,-1,1,1,1],
+            [1,-1,-1,1,1],
+
+        ], dtype=float)
+
     def inflate(self):
         ''' Generate a new penrose map from the ecurrent one with smalle tiles. '''
         self.c_to_r5_factor = self.c_to_r5_factor @ self.inflationmatrix
@@ -80,10 +102,3 @@ class PenroseMap(MapBase):
         ''' Generate a new penrose map from the ecurrent one with larger tiles. '''
         self.c_to_r5_factor = self.c_to_r5_factor @ self.deflationmatrix
         self.gamma = modf((self.gamma @ self.deflationmatrix))[0]
-
-    def validate_values(self, sum_cr5=True, sum_r5c=True):
-        ''' Ensure that the sums of the different map values are zero. '''
-        if sum_cr5:
-            assert abs(sum(self.c_to_r5_factor)) <= 1e-10
-        if sum_r5c:
-            assert abs(sum(self.r5_to_c_factor)) <= 1e-10
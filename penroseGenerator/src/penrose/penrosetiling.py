@@ -1,21 +1,82 @@
 ''' Entry point for the Penrose tiling '''
 
+import argparse
+import json
+import os
+import sys
+
 import numpy as np
 import sdl2
+from penroseGenerator.src.core.controlsocket import ControlServer
+from penroseGenerator.src.core.framestream import raw_pixel_format
+from penroseGenerator.src.core.qualitycontroller import QualityController
 from penroseGenerator.src.core.windowmanager import WindowManager
 from penroseGenerator.src.penrose.pentagrid import Pentagrid
 
+CONTROL_FIELDS = {"gamma", "c_to_r5_factor", "origin", "zoom"}
+
+def apply_control(pentagrid:Pentagrid, updates:dict):
+    '''
+    Apply the latest parameter updates of a ControlServer.
+    c_to_r5_factor is given as [real, imaginary] pairs, zoom as the pixel size of a unit edge.
+    Values of the wrong shape or with NaN or infinite entries are ignored,
+    so a misbehaving controller cannot break the frame loop.
+    '''
+    penrosemap = pentagrid.mathpg.penrosemap
+    grids = pentagrid.mathpg.grids
+    try:
+        if "gamma" in updates:
+            gamma = np.asarray(updates["gamma"], dtype=float)
+            if gamma.shape == (grids,) and np.isfinite(gamma).all():
+                penrosemap.gamma = gamma
+        if "c_to_r5_factor" in updates:
+            factor = np.asarray(updates["c_to_r5_factor"], dtype=float)
+            if factor.shape == (grids, 2) and np.isfinite(factor).all():
+                penrosemap.c_to_r5_factor = factor[:, 0] + 1j * factor[:, 1]
+        if "origin" in updates:
+            origin = np.asarray(updates["origin"], dtype=float)
+            if origin.shape == (2,) and np.isfinite(origin).all():
+                pentagrid.origin = origin
+        if "zoom" in updates:
+            zoom = np.broadcast_to(np.asarray(updates["zoom"], dtype=float), (2,))
+            if np.isfinite(zoom).all():
+                pentagrid.xyscale = np.maximum(zoom, .1)
+    except (TypeError, ValueError):
+        pass
+
 def main():
     ''' Open a window and draw a Penrose tiling. '''
+    parser = argparse.ArgumentParser(description="Draws a Penrose tiling interactively.")
+    parser.add_argument("--profile", default=os.environ.get("PENROSEGENERATOR_PROFILE"),
+                        help="Write per-frame allocation and memory statistics to this file.")
+    parser.add_argument("--record", help="Record the key presses of this session to this file.")
+    parser.add_argument("--replay",
+                        help="Replay a recorded session headlessly, deterministically and as fast as possible.")
+    parser.add_argument("--report", help="Write the frame times of a replay to this file instead of stdout, or stderr with --stream -.")
+    parser.add_argument("--control",
+                        help="Accept parameter updates on this Unix socket path, or TCP port on localhost.")
+    parser.add_argument("--accelerated", action="store_true",
+                        help="Draw through the window renderer into textures, falling back to software if needed.")
+    parser.add_argument("--stream",
+                        help="Write every frame as raw video to - (stdout), a named pipe, or shm:NAME[:SLOTS].")
+    args = parser.parse_args()
+    if args.replay:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        os.environ.setdefault("SDL_RENDER_DRIVER", "software")
     screensize = (1400, 800)
-    pentagrid = Pentagrid(([int(i) for i in screensize]))
-    windowmanager = WindowManager("Penrose tiling", screensize)
+    windowmanager = WindowManager("Penrose tiling", screensize, accelerated=args.accelerated)
+    pentagrid = Pentagrid(([int(i) for i in screensize]), renderer=windowmanager.sprite_renderer)
     gamma_movement = np.zeros(5)
     zeta_movement = np.ones(5, dtype=complex)
     camera_movement = np.zeros(2)
     speed = 1/50
+    control = None
+    if args.control:
+        control = ControlServer(int(args.control) if args.control.isdigit() else args.control, CONTROL_FIELDS)
 
     def tickmethod():
+        if control is not None:
+            apply_control(pentagrid, control.take())
         pentagrid.mathpg.penrosemap.gamma += gamma_movement
         pentagrid.mathpg.penrosemap.gamma %= 1
         pentagrid.mathpg.penrosemap.c_to_r5_factor *= zeta_movement
@@ -92,6 +153,18 @@ def main():
         if event.type == sdl2.events.SDL_KEYDOWN:
             pentagrid.mathpg.penrosemap.deflate()
 
+    def next_cellmode(event):
+        if event.type == sdl2.events.SDL_KEYDOWN:
+            pentagrid.next_cellmode()
+
+    def toggle_color_by_type(event):
+        if event.type == sdl2.events.SDL_KEYDOWN:
+            pentagrid.color_by_type = not pentagrid.color_by_type
+
+    def toggle_outlines(event):
+        if event.type == sdl2.events.SDL_KEYDOWN:
+            pentagrid.show_outlines = not pentagrid.show_outlines
+
     controltext = [
         "Enter : Start/Stop scene capture"
         "",
@@ -105,6 +178,9 @@ def main():
         "",
         "+           : Inflate",
         "-           : Deflate",
+        "c           : Cycle cell coloring modes",
+        "f           : Color tiles by type/grids",
+        "o           : Show/hide tile outlines",
         "",
         "",
         "========== Camera Controls =========",
@@ -139,10 +215,42 @@ def main():
     windowmanager.set_key_event(sdl2.keycode.SDLK_MINUS, deflate)
 
     windowmanager.set_key_event(sdl2.keycode.SDLK_RETURN, start_stop_capture)
+    windowmanager.set_key_event(sdl2.keycode.SDLK_c, next_cellmode)
+    windowmanager.set_key_event(sdl2.keycode.SDLK_f, toggle_color_by_type)
+    windowmanager.set_key_event(sdl2.keycode.SDLK_o, toggle_outlines)
 
     windowmanager.controls.controls.extend(controltext)
 
-    windowmanager.run()
+    if args.profile:
+        windowmanager.start_profiling(args.profile)
+    if control is not None:
+        control.start()
+    if args.record:
+        windowmanager.start_recording(args.record)
+    if args.stream:
+        windowmanager.start_streaming(args.stream)
+        print(f"Streaming rawvideo {raw_pixel_format(windowmanager.surface)} {screensize[0]}x{screensize[1]} "
+              f"at {windowmanager.framerate} fps to {args.stream}", file=sys.stderr)
+    if args.replay:
+        # Neither the worker nor the quality controller are deterministic, so replays go without them.
+        windowmanager.replay_input(args.replay)
+        windowmanager.run()
+        assert windowmanager.replay is not None
+        if args.report:
+            windowmanager.replay.write_report(args.report)
+        else:
+            # A stream to stdout owns it, any text there would corrupt the video.
+            output = sys.stderr if args.stream == "-" else sys.stdout
+            print(json.dumps(windowmanager.replay.report(), indent=1), file=output)
+    else:
+        windowmanager.qualitycontroller = QualityController(
+            1000 / windowmanager.framerate, len(Pentagrid.QUALITY_LEVELS), pentagrid.set_quality
+        )
+        pentagrid.start_worker()
+        windowmanager.run()
+        pentagrid.stop_worker()
+    if control is not None:
+        control.stop()
 
 
 if __name__ == "__main__":
@@ -1,111 +1,316 @@
 ''' Contains the PentaGrid class '''
 
+import copy
+from typing import NamedTuple
+
 import numpy as np
 import sdl2.ext
-from penroseGenerator.src.core.geometry import Line2D, intersect_line2d, Lattice
+from penroseGenerator.src.core.util import smoothstep
+from penroseGenerator.src.core.frameworker import FrameWorker
+from penroseGenerator.src.core.geometrybuffer import QuadBuffer
+from penroseGenerator.src.core.geometry import Line2D, Lattice, intersect_lattices
 from penroseGenerator.src.core.sprite import BaseSprite
+from penroseGenerator.src.penrose.incrementaltiling import IncrementalTiling, TileChanges
 from penroseGenerator.src.penrose.mathpentagrid import MathPentagrid
-from penroseGenerator.src.penrose.penrosemaps import PenroseMap #pylint: disable=W0611
+from penroseGenerator.src.penrose.patchcache import PatchCache
+from penroseGenerator.src.penrose.penrosemaps import MapBase, MultigridMap, PenroseMap
+from penroseGenerator.src.penrose.tilepyramid import TilePyramid
+from penroseGenerator.src.penrose.tilerasterizer import (
+    CELL_MODES, get_linecolors, get_tilecolors, get_typecolors, rasterize_cells
+)
+
+class PentagridSnapshot(NamedTuple):
+    ''' Everything needed to compute the tiles of a frame, independent of the sprite if taken for the worker. '''
+    penrosemap: MapBase
+    linemin: int
+    linemax: int
+    latticemax: int
+    view: "tuple[np.ndarray, np.ndarray, float]|None" = None # lower and upper corner, pixels per edge
+
+class FrameData(NamedTuple):
+    ''' The geometry of one frame, ready to be rendered. '''
+    lattices: list[Lattice]
+    intersections: np.ndarray
+    tiles: np.ndarray
+    changes: "TileChanges|None" = None
+    edge: float = 1.0
+
+class QualityLevel(NamedTuple):
+    ''' The knobs a quality controller can turn, see `Pentagrid.QUALITY_LEVELS`. '''
+    linerange_scale: float
+    linewidths: tuple[int, int]
+    lod_bias: float
+    show_dots: bool
+    show_lattices: bool
 
 class Pentagrid(BaseSprite):
-    ''' Draws and manages a pentagrid with its corresponding Penrose tiling. (Sort of...)'''
+    '''
+    Draws and manages a pentagrid with its corresponding Penrose tiling. (Sort of...)
+    Zoomed out until rhombs are smaller than `min_edge_px`, the viewport is drawn with composed rhombs
+    of a TilePyramid instead, if the map can be composed.
+    '''
+
+    PYRAMID_LEVELS = 16
 
-    def __init__(self, size) -> None:
-        super().__init__(size)
-        self.mathpg = MathPentagrid(PenroseMap(np.array([.0,.1,.2,.3,-.6], float)))
+    QUALITY_LEVELS = [
+        QualityLevel(1.0, (5, 2), 1.0, True, True),
+        QualityLevel(1.0, (3, 1), 1.0, False, True),
+        QualityLevel(1.0, (3, 1), 2.0, False, False),
+        QualityLevel(.75, (1, 1), 4.0, False, False),
+        QualityLevel(.5, (1, 1), 8.0, False, False),
+    ]
+
+    def __init__(
+        self,
+        size,
+        penrosemap:"MapBase|None"=None,
+        cache:"PatchCache|None"=None,
+        renderer=None,
+        incremental:bool=True,
+    ) -> None:
+        super().__init__(size, renderer=renderer)
+        if penrosemap is None:
+            penrosemap = PenroseMap(np.array([.0,.1,.2,.3,-.6], float))
+        self.mathpg = MathPentagrid(penrosemap)
         self.texture = None
         self.xyscale = np.array([100,100], dtype=float)
         self.origin = (self.size / self.xyscale) / 2
-        self.linecolors = [
-            (255,  0,  0,255),
-            (255,255,  0,255),
-            (  0,255,  0,255),
-            (  0,255,255,255),
-            (  0,  0,255,255)]
+        self.latticemax = self.mathpg.grids
+        self.linecolors = self.get_linecolors(self.latticemax)
         self.linemin, self.linemax = -1,1
-        self.latticemax = 5
+        self.lod_fill_px = 3.0
+        self.lod_outline_px = 12.0
+        self.lod_blocksize = 4
+        self.min_edge_px = 4.0
+        self.quality = self.QUALITY_LEVELS[0]
+        self.cellmode: "str|None" = None
+        self.color_by_type = False
+        self.show_outlines = True
+        self.quadbuffer = QuadBuffer()
+        self._buffered: "tuple[np.ndarray, bool]|None" = None
+        self.worker: "FrameWorker|None" = None
+        self.cache = cache
+        self._pyramid: "tuple[bytes, TilePyramid|None]|None" = None
+        self.incremental: "IncrementalTiling|None" = \
+            IncrementalTiling(cache) if incremental and isinstance(penrosemap, MultigridMap) else None
 
-    def intersect_latices(self, lattice1:Lattice, lattice2:Lattice):
-        ''' 
-        Compute every intersection between two groups of evenly spaced, parallel lines.
-        '''
-        line1, start1, stop1, step1, offset1 = lattice1
-        line2, start2, stop2, step2, offset2 = lattice2
-        line1 = Line2D.copyconstruct(line1)
-        line2 = Line2D.copyconstruct(line2)
-        line1.dist_to_zero = start1 * step1 + offset1
-        line2.dist_to_zero = start2 * step2 + offset2
-        intersect0 = intersect_line2d(line1, line2)
-        line1.dist_to_zero += step1
-        intersect1 = intersect_line2d(line1 ,line2)
-        line1.dist_to_zero -= step1
-        line2.dist_to_zero += step2
-        intersect2 = intersect_line2d(line1 ,line2)
-        line2.dist_to_zero -= step2
-        if intersect0 is None or intersect1 is None or intersect2 is None:
-            return None
-        lineno1 = stop1 - start1 + 1
-        lineno2 = stop2 - start2 + 1
-        dintersect1 = intersect1 - intersect0
-        dintersect2 = intersect2 - intersect0
-        lincomb1 = np.outer(np.arange(lineno1), dintersect1)
-        lincomb2 = np.outer(np.arange(lineno2), dintersect2)
-        intersects = intersect0 + lincomb1[None,:] + lincomb2[:,None]
-        return np.reshape(intersects, (lineno1 * lineno2, 2))
+    @staticmethod
+    def get_linecolors(count:int) -> list[tuple[int,int,int,int]]:
+        ''' Return one color per grid, the classic five colors for a pentagrid. '''
+        return get_linecolors(count)
 
     def get_intersections(self, lattices:list[Lattice]):
         ''' Return every intersection between the groups of evenly spaced, parallel lines. '''
-        latticelines = self.linemax - self.linemin +1
-        latticecount = len(lattices)
-        intersectioncount = latticelines**2 * int(latticecount * (latticecount-1) / 2)
-        intersections = np.zeros((intersectioncount, 4), dtype=float)
-        index = 0
-        for i, ilattice in enumerate(lattices):
-            for j, jlattice in enumerate(lattices):
-                if i >= j:
-                    continue
-                latt_inter = self.intersect_latices(ilattice, jlattice)
-                licount = (ilattice[2] - ilattice[1] + 1) * (jlattice[2] - jlattice[1] + 1)
-                if latt_inter is None:
-                    continue
-                intersections[index : index+licount, 0:2] = latt_inter
-                intersections[index : index+licount, 2] = i
-                intersections[index : index+licount, 3] = j
-                index += licount
-        return intersections
+        return intersect_lattices(lattices)
+
+    def get_lod_weights(self, edge:float=1.0) -> tuple[float, float, float]:
+        '''
+        Return the opacities of the raster, fill and outline levels of detail for tiles with edges of `edge`.
+        Tiles have unit edges unless composed, so the zoom is their size in pixels.
+        Each level fades into the next over half its threshold.
+        '''
+        tilesize = edge * float(np.min(np.abs(self.xyscale))) / self.quality.lod_bias
+        fill = smoothstep(self.lod_fill_px, 1.5 * self.lod_fill_px, tilesize)
+        outline = smoothstep(self.lod_outline_px, 1.5 * self.lod_outline_px, tilesize)
+        return 1 - fill, fill * (1 - outline), outline
+
+    def get_tilecolors(self, intersections:np.ndarray, by_type:bool=False):
+        ''' Return the color of every tile, the mean of the colors of its two grids or one color per rhomb type. '''
+        if by_type:
+            return get_typecolors(intersections, self.mathpg.grids)
+        return get_tilecolors(intersections, self.linecolors)
 
     def draw_penrose(self, lattices):
         ''' Draw a penrose tiling defined by `lattices`. '''
         intersections = self.get_intersections(lattices)
-        for lattice_intersection in intersections:
+        self.draw_tiles(intersections, self.mathpg.get_verts_from_intersections(intersections))
+
+    def draw_tiles(self, intersections:np.ndarray, tiles:np.ndarray, edge:float=1.0):
+        ''' Draw the given tiles with edges of `edge`, using the level of detail for the current zoom. '''
+        raster, fill, outline = self.get_lod_weights(edge)
+        if raster > 0:
+            self.draw_tiles_raster(intersections, tiles, raster, edge)
+        if fill > 0:
+            self.draw_tiles_filled(intersections, tiles, fill)
+        if outline > 0 and self.show_outlines:
+            self.draw_tiles_outlined(intersections, tiles, outline)
+
+    def draw_tiles_outlined(self, intersections:np.ndarray, tiles:np.ndarray, opacity:float=1.0):
+        ''' Draw the outlines of every tile and mark its intersection with the colors of both grids. '''
+        alpha = int(255 * opacity)
+        outerwidth, innerwidth = self.quality.linewidths
+        for lattice_intersection, vertices in zip(intersections, tiles):
             intersect, r, s = lattice_intersection[:2], *lattice_intersection[2:].astype(int)
-            if r + s == 0:
-                continue
-            self.draw_dot_transformed(intersect, 4, color=self.linecolors[r])
-            self.draw_dot_transformed(intersect, 2, color=self.linecolors[s])
-            vertices = self.mathpg.get_verts_from_intersect(complex(*intersect), r, s)
+            if self.quality.show_dots:
+                self.draw_dot_transformed(intersect, 4, color=(*self.linecolors[r][:3], alpha))
+                self.draw_dot_transformed(intersect, 2, color=(*self.linecolors[s][:3], alpha))
             for i,vertex in enumerate(vertices):
-                self.draw_line_transformed(vertices[i-1], vertex, width=5, color=self.linecolors[r])
-                self.draw_line_transformed(vertices[i-1], vertex, width=2, color=self.linecolors[s])
+                self.draw_line_transformed(
+                    vertices[i-1], vertex, width=outerwidth, color=(*self.linecolors[r][:3], alpha))
+                self.draw_line_transformed(
+                    vertices[i-1], vertex, width=innerwidth, color=(*self.linecolors[s][:3], alpha))
+
+    def draw_tiles_filled(self, intersections:np.ndarray, tiles:np.ndarray, opacity:float=1.0):
+        '''
+        Draw every tile as two filled triangles, all of them in one call.
+        The tiles stay in the quad buffer until their vertices, grid pairs or coloring change,
+        so most frames only update the transform. Comparing the contents also catches tiles updated in place.
+        '''
+        pairs = intersections[:, 2:4]
+        buffered = self.quadbuffer.quads[:self.quadbuffer.count]
+        if self._buffered is None or self._buffered[1] != self.color_by_type \
+                or not np.array_equal(self._buffered[0], pairs) \
+                or not np.array_equal(buffered, tiles.astype(np.float32)):
+            self.quadbuffer.set_quads(tiles, self.get_tilecolors(intersections, self.color_by_type))
+            self._buffered = (pairs.copy(), self.color_by_type)
+        self.quadbuffer.set_alpha(int(255 * opacity))
+        self.quadbuffer.transform(self.xyscale, self.origin, float(self.size[1]))
+        self.quadbuffer.draw(self.renderer)
+
+    def draw_tiles_raster(self, intersections:np.ndarray, tiles:np.ndarray, opacity:float=1.0, edge:float=1.0):
+        '''
+        Blend the mean tile color of every `lod_blocksize` pixel block into the surface,
+        weighted by how much of the block is covered by tiles.
+        '''
+        block = self.lod_blocksize
+        width, height = int(self.size[0]), int(self.size[1])
+        blocks_x, blocks_y = -(-width // block), -(-height // block)
+        centers = self.transform_points_pixel(tiles.mean(axis=1), float) // block
+        inside = (centers[:, 0] >= 0) & (centers[:, 0] < blocks_x) \
+            & (centers[:, 1] >= 0) & (centers[:, 1] < blocks_y)
+        index = centers[inside, 1].astype(int) * blocks_x + centers[inside, 0].astype(int)
+        colors = self.get_tilecolors(intersections)[inside]
+        counts = np.bincount(index, minlength=blocks_x * blocks_y)
+        colorsums = np.stack(
+            [np.bincount(index, colors[:, c], minlength=blocks_x * blocks_y) for c in range(3)], axis=-1
+        )
+        tilearea = edge**2 * float(np.prod(np.abs(self.xyscale)))
+        coverage = np.clip(counts * tilearea / block**2, 0, 1) * opacity
+        meancolors = colorsums / np.maximum(counts, 1)[:, None]
+        coverage = np.repeat(np.repeat(coverage.reshape(blocks_y, blocks_x), block, 0), block, 1)
+        meancolors = np.repeat(np.repeat(meancolors.reshape(blocks_y, blocks_x, 3), block, 0), block, 1)
+        self.blend_pixels(meancolors[:height, :width], coverage[:height, :width])
+
+    def draw_cells(self):
+        '''
+        Color every pixel by the pentagrid cell below it, see `rasterize_cells`.
+        No lines or intersections are needed, so the cost is the same for any zoom and gamma.
+        '''
+        lower = -self.origin
+        upper = self.size / self.xyscale - self.origin
+        image = rasterize_cells(
+            self.mathpg.penrosemap, lower, upper, (int(self.size[0]), int(self.size[1])), self.cellmode, self.linecolors
+        )
+        pixels = self.pixels()
+        pixels[..., :3] = image
+        pixels[..., 3] = 255
+        self.upload_pixels()
+
+    def next_cellmode(self):
+        ''' Cycle through the cell modes of `CELL_MODES`, and back to drawing tiles. '''
+        modes = [None, *CELL_MODES]
+        self.cellmode = modes[(modes.index(self.cellmode) + 1) % len(modes)]
 
     def add_zoom(self, zoom:np.ndarray):
-        self.xyscale += zoom
+        self.xyscale = np.maximum(self.xyscale + zoom, .1)
 
-    def draw(self, target:sdl2.ext.Renderer):
-        sdl2.SDL_SetRenderDrawColor(self.renderer, 0,0,0,0)
-        sdl2.SDL_RenderClear(self.renderer, 0,0,0)
+    def get_pyramid(self, penrosemap:MapBase) -> "TilePyramid|None":
+        ''' Return the TilePyramid of `penrosemap`, built again whenever the map changed, or None if not composable. '''
+        key = penrosemap.gamma.tobytes() + penrosemap.c_to_r5_factor.tobytes()
+        if self._pyramid is None or self._pyramid[0] != key:
+            pyramid = TilePyramid(penrosemap, self.PYRAMID_LEVELS) if TilePyramid.supports(penrosemap) else None
+            self._pyramid = (key, pyramid)
+        return self._pyramid[1]
+
+    def snapshot(self) -> PentagridSnapshot:
+        '''
+        Return the current map and grid parameters, with a copy of the map while the worker thread uses them.
+        The line range is scaled toward zero by the quality level, keeping at least one line.
+        The viewport is only included while zoomed out far enough to draw composed tiles.
+        '''
+        scale = self.quality.linerange_scale
+        linemin = int(self.linemin * scale)
+        penrosemap = self.mathpg.penrosemap
+        pixels_per_edge = float(np.min(np.abs(self.xyscale)))
+        view = None
+        if 0 < pixels_per_edge < self.min_edge_px:
+            view = (-self.origin, self.size / self.xyscale - self.origin, pixels_per_edge)
+        return PentagridSnapshot(
+            copy.deepcopy(penrosemap) if self.worker is not None else penrosemap,
+            linemin,
+            max(int(self.linemax * scale), linemin),
+            self.latticemax,
+            view,
+        )
+
+    def compute_frame(self, snapshot:PentagridSnapshot) -> FrameData:
+        '''
+        Compute the lattices, intersections and tile vertices for `snapshot`.
+        With a viewport, the tiles covering it are taken from the TilePyramid of the map, composed for the zoom.
+        Otherwise tiles are updated incrementally from the previous frame if the pentagrid was created with
+        `incremental` and a multigrid map, or every frame gets a full patch, loaded from the patch cache if any.
+        '''
+        mathpg = MathPentagrid(snapshot.penrosemap)
         lattices = [
-            self.mathpg.reverse_is_on_grid(
-                j,
-                self.linemin,
-                self.linemax
-            ) for j in range(self.latticemax)
+            mathpg.reverse_is_on_grid(j, snapshot.linemin, snapshot.linemax)
+            for j in range(snapshot.latticemax)
         ]
-        botleft = 5 * -self.size/(2*self.xyscale)
-        topright = 5 * self.size/(2*self.xyscale)
-        for i,lattice in enumerate(lattices):
-            Line2D.draw_lattice(self, botleft, topright, lattice, color=(*self.linecolors[i][:-1], 200))
-        self.draw_penrose(lattices)
-        self.draw_dot_transformed(np.array([0,0]), 3, (255,0,0,255))
+        pyramid = self.get_pyramid(snapshot.penrosemap) if snapshot.view is not None else None
+        if pyramid is not None:
+            lower, upper, pixels_per_edge = snapshot.view
+            level, intersections, _, tiles = pyramid.get_view(lower, upper, pixels_per_edge, self.min_edge_px)
+            return FrameData(lattices, intersections, tiles, edge=pyramid.scale(level))
+        if self.incremental is not None:
+            changes = self.incremental.update(mathpg, snapshot.linemin, snapshot.linemax)
+            return FrameData(lattices, self.incremental.intersections, self.incremental.tiles, changes)
+        if self.cache is not None:
+            intersections, _, tiles = self.cache.get_patch(mathpg, snapshot.linemin, snapshot.linemax)
+        else:
+            intersections, _, tiles = mathpg.get_patch(snapshot.linemin, snapshot.linemax)
+        return FrameData(lattices, intersections, tiles)
+
+    def set_quality(self, level:int):
+        ''' Switch to the quality level `level` of `QUALITY_LEVELS`, 0 being the best one. '''
+        self.quality = self.QUALITY_LEVELS[level]
+
+    def start_worker(self):
+        '''
+        Compute the geometry on a background thread from now on.
+        Every draw then renders the latest finished frame instead of waiting for the current one.
+        '''
+        if self.worker is None:
+            self.worker = FrameWorker(self.compute_frame)
+        self.worker.start()
+
+    def stop_worker(self):
+        ''' Stop the background thread and compute the geometry while drawing again. '''
+        if self.worker is not None:
+            self.worker.stop()
+            self.worker = None
+
+    def draw(self, target:sdl2.ext.Renderer):
+        if self.cellmode is None and self.worker is not None:
+            self.worker.submit(self.snapshot())
+        with self.drawing():
+            sdl2.SDL_SetRenderDrawColor(self.renderer, 0,0,0,0)
+            sdl2.SDL_RenderClear(self.renderer, 0,0,0)
+            if self.cellmode is not None:
+                self.draw_cells()
+                frame = None
+            elif self.worker is not None:
+                self.worker.poll()
+                frame = self.worker.latest()
+            else:
+                frame = self.compute_frame(self.snapshot())
+            if frame is not None:
+                botleft = 5 * -self.size/(2*self.xyscale)
+                topright = 5 * self.size/(2*self.xyscale)
+                for i,lattice in enumerate(frame.lattices if self.quality.show_lattices else []):
+                    Line2D.draw_lattice(self, botleft, topright, lattice, color=(*self.linecolors[i][:-1], 200))
+                self.draw_tiles(frame.intersections, frame.tiles, frame.edge)
+            self.draw_dot_transformed(np.array([0,0]), 3, (255,0,0,255))
+        if self.direct:
+            super().draw(target)
+            return
         self.texture = sdl2.ext.Texture(target, self.surface)
         target.blit(self.texture)
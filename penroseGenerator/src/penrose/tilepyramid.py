@@ -0,0 +1,219 @@
+'''
+Keeps a Penrose tiling at several composition levels for continuous deep zoom.
+Level l+1 is the composition of level l: its rhombs are phi times larger and every one of its vertices is
+a vertex of level l. With M the integer part of the inflation matrix, gamma of level l+1 is gamma of level l
+times M, and the vertex K of level l+1 is the vertex (I + M) K - m of level l,
+where m only depends on the vertex index sum(K).
+'''
+
+from typing import NamedTuple
+
+import numpy as np
+from penroseGenerator.src.penrose.mathpentagrid import MathPentagrid
+from penroseGenerator.src.penrose.penrosemaps import PenroseMap
+
+# Parents are looked up slightly off the centre of a child, as children straddling
+# a parent edge have their centre exactly on it. The direction is parallel to no edge.
+PROBE_OFFSET = np.array([.3141, .2718]) * 1e-6
+# How many levels above the one drawn the viewport is culled, before descending to the children of the visible tiles.
+CULL_LEVELS = 3
+
+class PyramidLevel(NamedTuple):
+    ''' The tiles of one level around a region. K vectors belong to the unreduced gamma of the level. '''
+    level: int
+    lower: np.ndarray
+    upper: np.ndarray
+    intersections: np.ndarray
+    k_vals: np.ndarray
+    tiles: np.ndarray
+
+def locate_points(tiles:np.ndarray, points:np.ndarray) -> np.ndarray:
+    '''
+    Return for every point the index of the rhomb in `tiles` containing it, or -1.
+    Rhombs are bucketed by their centre into cells of one edge length,
+    so every point is only tested against the rhombs of the 9 cells around it.
+    '''
+    result = np.full(len(points), -1, dtype=np.int64)
+    if not len(tiles) or not len(points):
+        return result
+    origins = tiles[:, 0]
+    edges_a, edges_b = tiles[:, 1] - origins, tiles[:, 3] - origins
+    determinants = edges_a[:, 0] * edges_b[:, 1] - edges_a[:, 1] * edges_b[:, 0]
+    cellsize = float(np.max(np.linalg.norm(edges_a, axis=1)))
+    def cellkeys(cells):
+        return (cells[:, 0] << 32) + (cells[:, 1] + (1 << 31))
+    keys = cellkeys(np.floor(tiles.mean(axis=1) / cellsize).astype(np.int64))
+    order = np.argsort(keys, kind="stable")
+    sortedkeys = keys[order]
+    maxcount = int(np.unique(sortedkeys, return_counts=True)[1].max())
+    pointcells = np.floor(points / cellsize).astype(np.int64)
+    for offset in np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]):
+        querykeys = cellkeys(pointcells + offset)
+        starts = np.searchsorted(sortedkeys, querykeys, "left")
+        ends = np.searchsorted(sortedkeys, querykeys, "right")
+        for slot in range(maxcount):
+            pending = np.flatnonzero((starts + slot < ends) & (result < 0))
+            if not len(pending):
+                continue
+            candidates = order[starts[pending] + slot]
+            delta = points[pending] - origins[candidates]
+            a, b, det = edges_a[candidates], edges_b[candidates], determinants[candidates]
+            u = (delta[:, 0] * b[:, 1] - delta[:, 1] * b[:, 0]) / det
+            v = (a[:, 0] * delta[:, 1] - a[:, 1] * delta[:, 0]) / det
+            inside = (u >= 0) & (u <= 1) & (v >= 0) & (v <= 1)
+            result[pending[inside]] = candidates[inside]
+    return result
+
+class TilePyramid():
+    '''
+    Provides the tiles of `levels` composition levels of a Penrose tiling, in the coordinates of level 0.
+    Every level caches the patch around the last requested region, grown by `margin` of its size,
+    so zooming and panning within it only culls the cached tiles.
+    Views are culled on a coarser level and refined through the children of the visible tiles,
+    so only the tiles around the viewport are touched on the level drawn.
+    '''
+    def __init__(self, penrosemap:PenroseMap, levels:int=8, margin:float=.5) -> None:
+        assert levels > 0
+        assert self.supports(penrosemap), "Compositions need a Penrose map whose gammas have an integer sum."
+        total = float(np.sum(penrosemap.gamma))
+        self.phi = penrosemap.phi
+        self.levels = levels
+        self.margin = margin
+        self.compositionmatrix = np.rint(penrosemap.inflationmatrix / self.phi).astype(np.int64)
+        self.substitutionmatrix = np.eye(5, dtype=np.int64) + self.compositionmatrix
+        self.gammas = [np.asarray(penrosemap.gamma, float)]
+        self.indexsums = [round(total)]
+        for _ in range(1, levels):
+            gamma = self.gammas[-1] @ self.compositionmatrix
+            indexsum = 2 * self.indexsums[-1]
+            # M doubles the sum of gamma, and with it its rounding error.
+            self.gammas.append(gamma + (indexsum - gamma.sum()) / 5)
+            self.indexsums.append(indexsum)
+        self.offsets = [np.floor(gamma).astype(np.int64) for gamma in self.gammas]
+        self.mathpgs = [
+            MathPentagrid(PenroseMap(gamma - offset)) for gamma, offset in zip(self.gammas, self.offsets)
+        ]
+        self._levels: dict[int, PyramidLevel] = {}
+        self._parents: dict[int, np.ndarray] = {}
+        self._childorder: dict[int, np.ndarray] = {}
+
+    @staticmethod
+    def supports(penrosemap) -> bool:
+        '''
+        Whether `penrosemap` can be composed, i.e. is a Penrose map with the usual factors
+        whose gammas have an integer sum.
+        '''
+        if not isinstance(penrosemap, PenroseMap):
+            return False
+        if not np.allclose(penrosemap.c_to_r5_factor, PenroseMap(penrosemap.gamma).c_to_r5_factor):
+            return False
+        total = float(np.sum(penrosemap.gamma))
+        return abs(total - round(total)) <= 1e-9
+
+    def scale(self, level:int) -> float:
+        ''' The edge length of the rhombs of `level`. '''
+        return self.phi ** level
+
+    def select_level(self, pixels_per_edge:float, min_edge_px:float) -> int:
+        ''' Return the finest level whose rhombs are at least `min_edge_px` large. '''
+        if pixels_per_edge >= min_edge_px:
+            return 0
+        level = int(np.ceil(np.log(min_edge_px / pixels_per_edge) / np.log(self.phi)))
+        return min(level, self.levels - 1)
+
+    def get_level(self, level:int, lower:np.ndarray, upper:np.ndarray, margin:"float|None"=None) -> PyramidLevel:
+        ''' Return the cached patch of `level` if it covers the region, else regenerate it with margin. '''
+        lower, upper = np.asarray(lower, float), np.asarray(upper, float)
+        cached = self._levels.get(level)
+        if cached is not None and np.all(cached.lower <= lower) and np.all(upper <= cached.upper):
+            return cached
+        grow = (upper - lower) * (self.margin if margin is None else margin)
+        lower, upper = lower - grow, upper + grow
+        scale = self.scale(level)
+        shift = self.mathpgs[level].penrosemap.r5_to_c(self.offsets[level])
+        shift = np.array([shift.real, shift.imag])
+        intersections, k_vals, tiles = \
+            self.mathpgs[level].get_region_patch(lower / scale - shift, upper / scale - shift)
+        patch = PyramidLevel(
+            level, lower, upper, intersections, k_vals + self.offsets[level], (tiles + shift) * scale
+        )
+        self._levels[level] = patch
+        for finer in (level, level - 1):
+            self._parents.pop(finer, None)
+            self._childorder.pop(finer, None)
+        return patch
+
+    def cull(
+        self, patch:PyramidLevel, lower:np.ndarray, upper:np.ndarray, indices:"np.ndarray|None"=None
+    ) -> np.ndarray:
+        ''' Return the indices of the tiles of `patch`, or only of those in `indices`, touching the region. '''
+        if indices is None:
+            indices = np.arange(len(patch.tiles))
+        tiles = patch.tiles[indices]
+        return indices[np.all(tiles.max(axis=1) >= lower, axis=1) & np.all(tiles.min(axis=1) <= upper, axis=1)]
+
+    def get_view(self, lower:np.ndarray, upper:np.ndarray, pixels_per_edge:float, min_edge_px:float):
+        '''
+        Return the level for the zoom and the intersections, K vectors and tiles of it in the region.
+        The region is culled on the cached patch `CULL_LEVELS` above, then every level below only
+        looks at the children of the tiles still visible.
+        '''
+        lower, upper = np.asarray(lower, float), np.asarray(upper, float)
+        level = self.select_level(pixels_per_edge, min_edge_px)
+        top = min(level + CULL_LEVELS, self.levels - 1)
+        self.get_level(level, lower, upper)
+        for finer in range(level, top):
+            # Extends every coarser patch to cover the one below, usually a cache hit.
+            self.get_parents(finer)
+        # Children stick out of their parents by up to their diameter, less than two edges,
+        # so coarser levels are culled with the region grown by the diameters of all levels below.
+        pads = np.concatenate([[0.], np.cumsum([2 * self.scale(finer) for finer in range(level, top)])])
+        visible = self.cull(self._levels[top], lower - pads[-1], upper + pads[-1])
+        for coarser in range(top, level, -1):
+            # Tiles without a parent are looked up as children of -1, so they are culled directly.
+            children = self.get_children(coarser, np.append(visible, -1))
+            pad = pads[coarser - 1 - level]
+            visible = self.cull(self._levels[coarser - 1], lower - pad, upper + pad, children)
+        patch = self._levels[level]
+        return level, patch.intersections[visible], patch.k_vals[visible], patch.tiles[visible]
+
+    def to_finer(self, level:int, k_vals:np.ndarray) -> np.ndarray:
+        ''' Map vertices of `level` to the same vertices of `level - 1`. '''
+        assert level > 0
+        k_vals = np.rint(k_vals).astype(np.int64)
+        # The image of a vertex has index 3 sum(K) - 5m, which has to lie in the index range of the finer level.
+        shifts = (3 * k_vals.sum(axis=-1) - self.indexsums[level - 1] - 1) // 5
+        return k_vals @ self.substitutionmatrix.T - shifts[..., None]
+
+    def get_parents(self, level:int) -> np.ndarray:
+        '''
+        Return for every tile of the cached patch of `level` the index of the tile of `level + 1`
+        containing it, or -1. The patch of `level + 1` is extended to cover it if needed.
+        '''
+        assert level + 1 < self.levels and level in self._levels
+        if level in self._parents:
+            return self._parents[level]
+        patch = self._levels[level]
+        pad = self.scale(level)
+        coarse = self.get_level(level + 1, patch.lower - pad, patch.upper + pad, margin=0)
+        probes = patch.tiles.mean(axis=1) + PROBE_OFFSET * self.scale(level)
+        self._parents[level] = locate_points(coarse.tiles, probes)
+        return self._parents[level]
+
+    def get_children(self, level:int, parents:np.ndarray) -> np.ndarray:
+        '''
+        Return the sorted indices of the tiles of the cached patch of `level - 1` inside the given tiles of `level`.
+        The finer tiles are sorted by parent once per patch, so a lookup only touches the children.
+        '''
+        assert level > 0
+        allparents = self.get_parents(level - 1)
+        if level - 1 not in self._childorder:
+            self._childorder[level - 1] = np.argsort(allparents, kind="stable")
+        order = self._childorder[level - 1]
+        sortedparents = allparents[order]
+        parents = np.unique(parents)
+        starts = np.searchsorted(sortedparents, parents, "left")
+        counts = np.searchsorted(sortedparents, parents, "right") - starts
+        # Concatenates the ranges [start, start + count) without a loop over the parents.
+        firsts = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        return np.sort(order[firsts + np.arange(int(counts.sum()))])
@@ -0,0 +1,152 @@
+''' Contains a headless rasterizer for tiles. '''
+
+import colorsys
+
+import numpy as np
+from PIL import Image, ImageDraw
+from penroseGenerator.src.penrose.penrosemaps import MapBase, MultigridMap
+
+CELL_MODES = ("index", "cell", "grid", "perpendicular")
+HUES = np.array(
+    [[int(255 * channel) for channel in colorsys.hsv_to_rgb(hue / 360, .7, 1)] for hue in range(360)], dtype=np.uint8
+)
+
+def get_linecolors(count:int) -> list[tuple[int,int,int,int]]:
+    ''' Return one color per grid, the classic five colors for a pentagrid. '''
+    if count == 5:
+        return [
+            (255,  0,  0,255),
+            (255,255,  0,255),
+            (  0,255,  0,255),
+            (  0,255,255,255),
+            (  0,  0,255,255)]
+    hues = [colorsys.hsv_to_rgb(i / count, 1, 1) for i in range(count)]
+    return [(int(r*255), int(g*255), int(b*255), 255) for r,g,b in hues]
+
+def get_tilecolors(intersections:np.ndarray, linecolors) -> np.ndarray:
+    ''' Return the color of every tile, the mean of the colors of its two grids. '''
+    colors = np.array(linecolors, dtype=float)
+    r, s = intersections[:, 2].astype(int), intersections[:, 3].astype(int)
+    return (colors[r] + colors[s]) / 2
+
+def get_typecolors(intersections:np.ndarray, grids:int) -> np.ndarray:
+    '''
+    Return the color of every tile by its type. The angle of a rhomb only depends on how many grids
+    its two grids are apart, so a pentagrid has thick and thin rhombs.
+    '''
+    types = grids // 2
+    if types == 2:
+        colors = np.array([(230, 180, 60), (60, 110, 200)], dtype=float)
+    else:
+        colors = np.array(get_linecolors(types), dtype=float)[:, :3]
+    apart = np.abs(intersections[:, 3] - intersections[:, 2]).astype(int)
+    return colors[np.minimum(apart, grids - apart) - 1]
+
+def rasterize_tiles(
+    tiles:np.ndarray,
+    colors:np.ndarray,
+    lower:np.ndarray,
+    upper:np.ndarray,
+    size:tuple[int,int],
+    outline:"tuple[int,int,int,int]|None"=(0,0,0,255),
+    background:tuple[int,int,int,int]=(0,0,0,255),
+) -> Image.Image:
+    '''
+    Draw `tiles` of shape (n, 4, 2) filled with `colors` of shape (n, 3|4)
+    into an image showing the rectangle between `lower` and `upper`, y pointing up.
+    Outlines are left out once tiles get smaller than 4 pixels.
+    '''
+    image = Image.new("RGBA", size, background)
+    draw = ImageDraw.Draw(image)
+    scale = np.array(size, float) / (np.asarray(upper, float) - np.asarray(lower, float))
+    pixels = (tiles - lower) * scale
+    pixels[..., 1] = size[1] - pixels[..., 1]
+    if float(scale.min()) < 4:
+        outline = None
+    for polygon, color in zip(pixels.tolist(), colors.astype(int).tolist()):
+        draw.polygon([tuple(point) for point in polygon], fill=tuple(color), outline=outline)
+    return image
+
+def get_cellvalues(penrosemap:MapBase, lower:np.ndarray, upper:np.ndarray, size:tuple[int,int]):
+    '''
+    Yield c_to_r5 of the center of every pixel of the rectangle between `lower` and `upper`, one grid at a time,
+    as arrays of shape (height, width). The maps of the multigrid are affine, so every grid costs one addition
+    of a row and a column per pixel instead of a complex product.
+    '''
+    width, height = size
+    step = (np.asarray(upper, float) - np.asarray(lower, float)) / (width, height)
+    xs = lower[0] + (np.arange(width) + .5) * step[0]
+    ys = upper[1] - (np.arange(height) + .5) * step[1]
+    if isinstance(penrosemap, MultigridMap):
+        factor = penrosemap.c_to_r5_factor
+        for j, gamma in enumerate(penrosemap.gamma):
+            yield (ys * -factor[j].imag + gamma)[:, None] + xs * factor[j].real
+        return
+    values = penrosemap.c_to_r5((xs[None, :] + 1j * ys[:, None])[..., None])
+    for j in range(values.shape[-1]):
+        yield values[..., j]
+
+def rasterize_cells(
+    penrosemap:MapBase,
+    lower:np.ndarray,
+    upper:np.ndarray,
+    size:tuple[int,int],
+    mode:str="index",
+    linecolors=None,
+    linewidth:float=1.5,
+) -> np.ndarray:
+    '''
+    Color every pixel of the rectangle between `lower` and `upper` in grid space by the pentagrid cell it lies in,
+    and return the (height, width, 3) uint8 image. The cost only depends on the pixel count, not on the tiles.
+    - "index": the vertex index sum(K) of the cell.
+    - "cell": a color hashed from K, so neighbouring cells differ.
+    - "grid": the nearest grid line, antialiased over `linewidth` pixels, on top of the dimmed index colors.
+    - "perpendicular": the position of K in perpendicular space, which determines the vertex configuration.
+    '''
+    assert mode in CELL_MODES
+    grids = len(penrosemap.gamma)
+    width, height = size
+    palette = np.array(get_linecolors(grids) if linecolors is None else linecolors, dtype=np.uint8)[:, :3]
+    # Gathering whole pixels packed into one uint32 is a lot faster than gathering three bytes.
+    packed = np.zeros((grids, 4), dtype=np.uint8)
+    packed[:, :3] = palette
+    packed = packed.view(np.uint32)[:, 0]
+    indexsum = np.zeros((height, width), dtype=np.int32)
+    if mode == "cell":
+        cellhash = np.zeros((height, width), dtype=np.uint32)
+    elif mode == "grid":
+        nearest = np.full((height, width), np.inf, dtype=np.float32)
+        nearestgrid = np.zeros((height, width), dtype=np.uint8)
+        pixelsize = float(np.min((np.asarray(upper, float) - np.asarray(lower, float)) / (width, height)))
+        factor = np.abs(np.asarray(penrosemap.c_to_r5_factor))
+    elif mode == "perpendicular":
+        perpendicular = np.zeros((2, height, width), dtype=np.float32)
+    for j, values in enumerate(get_cellvalues(penrosemap, lower, upper, size)):
+        k_vals = penrosemap.r5_to_r5(values).astype(np.int32)
+        indexsum += k_vals
+        if mode == "cell":
+            cellhash = (cellhash ^ k_vals.view(np.uint32)) * np.uint32(0x9E3779B1)
+        elif mode == "grid":
+            # Lines of grid j are 1/|factor_j| apart, so this is the distance to the closest one in pixels.
+            below = (k_vals - values).astype(np.float32)
+            distance = np.minimum(below, 1 - below) * np.float32(1 / (factor[j] * pixelsize))
+            closer = distance < nearest
+            nearest[closer] = distance[closer]
+            nearestgrid[closer] = j
+        elif mode == "perpendicular":
+            angle = 4 * np.pi * j / grids
+            perpendicular[0] += k_vals * np.float32(np.cos(angle))
+            perpendicular[1] += k_vals * np.float32(np.sin(angle))
+    indexsum -= int(np.ceil(round(float(np.sum(penrosemap.gamma)), 9)))
+    indexcolors = packed[indexsum % grids].view(np.uint8).reshape(height, width, 4)[..., :3]
+    if mode == "index":
+        return indexcolors
+    if mode == "cell":
+        return HUES[(cellhash >> 16) % len(HUES)]
+    if mode == "grid":
+        coverage = np.clip(1 - nearest / linewidth, 0, 1)[..., None]
+        return (indexcolors * (.25 * (1 - coverage)) + palette[nearestgrid] * coverage).astype(np.uint8)
+    hues = np.arctan2(perpendicular[1], perpendicular[0]) * (len(HUES) / (2 * np.pi))
+    radius = np.hypot(perpendicular[0], perpendicular[1])
+    brightness = np.clip(radius / max(float(radius.max()), 1e-9), .2, 1)[..., None]
+    return (HUES[hues.astype(np.int32) % len(HUES)] * brightness).astype(np.uint8)
@@ -0,0 +1,208 @@
+''' Serves an unbounded Penrose tiling as slippy-map raster tiles. '''
+
+import argparse
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from penroseGenerator.src.penrose.mathpentagrid import MathPentagrid
+from penroseGenerator.src.penrose.penrosemaps import MapBase, MultigridMap, PenroseMap
+from penroseGenerator.src.penrose.tilepyramid import TilePyramid
+from penroseGenerator.src.penrose.tilerasterizer import get_linecolors, get_tilecolors, rasterize_tiles
+
+TILE_PATH = re.compile(r"^/(\d+)/(-?\d+)/(-?\d+)\.png$")
+PYRAMID_LEVELS = 32
+# Neighbouring tiles are usually requested together, so every level caches the 3x3 tiles around a request.
+PYRAMID_MARGIN = 1.0
+
+# Every render worker keeps its own map and TilePyramid, as the pyramid caches the last region of each level.
+_worker = threading.local()
+
+def render_tile(
+    penrosemap:MapBase, z:int, x:int, y:int, tilesize:int=256, worldsize:float=256.0, min_edge_px:float=0.0,
+    pyramid:"TilePyramid|None"=None,
+) -> bytes:
+    '''
+    Render the raster tile (`z`, `x`, `y`) as png.
+    At zoom 0 a tile covers `worldsize` tile edges, every zoom level halves that.
+    Tile (0, 0) has its top left corner at the origin and y grows downwards, like slippy maps do.
+    Rhombs that would be smaller than `min_edge_px` are drawn composed by `pyramid`, a TilePyramid of `penrosemap`.
+    '''
+    extent = worldsize / 2**z
+    lower = np.array([x * extent, -(y + 1) * extent])
+    upper = lower + extent
+    if min_edge_px > 0 and pyramid is not None:
+        _, intersections, _, tiles = pyramid.get_view(lower, upper, tilesize / extent, min_edge_px)
+    else:
+        intersections, _, tiles = MathPentagrid(penrosemap).get_region_patch(lower, upper)
+    colors = get_tilecolors(intersections, get_linecolors(len(penrosemap.gamma)))
+    image = rasterize_tiles(tiles, colors, lower, upper, (tilesize, tilesize))
+    buffer = io.BytesIO()
+    image.save(buffer, format="png")
+    return buffer.getvalue()
+
+def init_worker(penrosemap:MapBase, min_edge_px:float):
+    ''' Set up a render thread or process, building its TilePyramid once instead of once per tile. '''
+    _worker.penrosemap = penrosemap
+    _worker.min_edge_px = min_edge_px
+    _worker.pyramid = TilePyramid(penrosemap, levels=PYRAMID_LEVELS, margin=PYRAMID_MARGIN) \
+        if min_edge_px > 0 and TilePyramid.supports(penrosemap) else None
+
+def render_worker_tile(z:int, x:int, y:int, tilesize:int, worldsize:float) -> bytes:
+    ''' Render a tile with the map and pyramid of this worker, see `init_worker`. '''
+    return render_tile(_worker.penrosemap, z, x, y, tilesize, worldsize, _worker.min_edge_px, _worker.pyramid)
+
+class TileServer():
+    '''
+    Renders tiles on a thread or process pool and answers http requests for /{z}/{x}/{y}.png.
+    Rendered tiles are kept in an in-memory LRU cache and, if `cachedir` is given, on disk.
+    Concurrent requests for the same tile share one rendering.
+    Composing needs gammas with an integer sum, so `min_edge_px` is rejected for other Penrose maps.
+    '''
+    def __init__(
+        self,
+        penrosemap:MapBase,
+        workers:int=4,
+        use_processes:bool=False,
+        cachesize:int=1024,
+        cachedir:"str|None"=None,
+        tilesize:int=256,
+        worldsize:float=256.0,
+        min_edge_px:float=0.0,
+    ) -> None:
+        assert min_edge_px <= 0 or not isinstance(penrosemap, PenroseMap) or TilePyramid.supports(penrosemap), \
+            "Composed tiles need gammas with an integer sum."
+        self.penrosemap = penrosemap
+        self.tilesize = tilesize
+        self.worldsize = worldsize
+        self.min_edge_px = min_edge_px
+        self.cachesize = cachesize
+        self.cachedir = cachedir
+        executortype = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        self.executor: Executor = executortype(workers, initializer=init_worker, initargs=(penrosemap, min_edge_px))
+        self._lock = threading.Lock()
+        self._memcache: "OrderedDict[tuple[int,int,int], bytes]" = OrderedDict()
+        self._inflight: "dict[tuple[int,int,int], Future]" = {}
+
+    def get_tile(self, z:int, x:int, y:int) -> bytes:
+        ''' Return the png for tile (`z`, `x`, `y`), rendering it if it is not cached yet. '''
+        key = (z, x, y)
+        with self._lock:
+            if key in self._memcache:
+                self._memcache.move_to_end(key)
+                return self._memcache[key]
+            future = self._inflight.get(key)
+            if future is None:
+                future = Future()
+                self._inflight[key] = future
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return future.result()
+        try:
+            png = self._load_from_disk(key)
+            if png is None:
+                png = self.executor.submit(render_worker_tile, z, x, y, self.tilesize, self.worldsize).result()
+                self._save_to_disk(key, png)
+            with self._lock:
+                self._memcache[key] = png
+                while len(self._memcache) > self.cachesize:
+                    self._memcache.popitem(last=False)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        finally:
+            # A failed tile is rendered again by the next request for it.
+            with self._lock:
+                del self._inflight[key]
+        future.set_result(png)
+        return png
+
+    def _diskpath(self, key:tuple[int,int,int]) -> str:
+        assert self.cachedir is not None
+        z, x, y = key
+        return os.path.join(self.cachedir, str(z), str(x), f"{y}.png")
+
+    def _load_from_disk(self, key:tuple[int,int,int]) -> "bytes|None":
+        if self.cachedir is None:
+            return None
+        try:
+            with open(self._diskpath(key), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def _save_to_disk(self, key:tuple[int,int,int], png:bytes):
+        if self.cachedir is None:
+            return
+        path = self._diskpath(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmppath = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmppath, "wb") as file:
+            file.write(png)
+        os.replace(tmppath, path)
+
+    def make_handler(self) -> type[BaseHTTPRequestHandler]:
+        ''' Return a request handler class answering /{z}/{x}/{y}.png from this server. '''
+        tileserver = self
+
+        class TileRequestHandler(BaseHTTPRequestHandler):
+            ''' Maps /{z}/{x}/{y}.png to the tile server, failed renderings to 500. '''
+            def do_GET(self): #pylint: disable=invalid-name
+                match = TILE_PATH.match(self.path)
+                if not match:
+                    self.send_error(404)
+                    return
+                try:
+                    png = tileserver.get_tile(*(int(value) for value in match.groups()))
+                except Exception as error: #pylint: disable=broad-exception-caught
+                    self.send_error(500, explain=repr(error))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(png)))
+                self.end_headers()
+                self.wfile.write(png)
+
+        return TileRequestHandler
+
+    def serve(self, host:str="127.0.0.1", port:int=8000):
+        ''' Answer http requests until interrupted. '''
+        with ThreadingHTTPServer((host, port), self.make_handler()) as httpserver:
+            print(f"Serving Penrose tiles on http://{host}:{port}/{{z}}/{{x}}/{{y}}.png")
+            try:
+                httpserver.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        self.executor.shutdown()
+
+def main():
+    ''' Start a tile server for the tiling given on the command line. '''
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--gamma", default=".0,.1,.2,.3,-.6",
+                        help="Comma separated gammas, one per grid. Five gammas give a Penrose tiling.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--processes", action="store_true", help="Render on processes instead of threads.")
+    parser.add_argument("--cachesize", type=int, default=1024, help="Tiles kept in memory.")
+    parser.add_argument("--cachedir", default=None, help="Also keep rendered tiles in this folder.")
+    parser.add_argument("--min-edge-px", type=float, default=0.0,
+                        help="Draw Penrose tilings composed once rhombs get smaller than this many pixels.")
+    args = parser.parse_args()
+    gamma = np.array([float(value) for value in args.gamma.split(",")])
+    penrosemap = PenroseMap(gamma) if len(gamma) == 5 else MultigridMap(gamma)
+    if args.min_edge_px > 0 and isinstance(penrosemap, PenroseMap) and not TilePyramid.supports(penrosemap):
+        parser.error("--min-edge-px needs gammas with an integer sum.")
+    TileServer(
+        penrosemap, args.workers, args.processes, args.cachesize, args.cachedir, min_edge_px=args.min_edge_px
+    ).serve(args.host, args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+''' Contains the TileStore class. '''
+
+import numpy as np
+
+TILE_COLUMNS = ("points", "grids", "k_vals", "tiles")
+
+def smallest_int_type(values:np.ndarray) -> type:
+    ''' Return int16 if all `values` fit into it, else int32. '''
+    if not values.size:
+        return np.int16
+    bound = max(abs(float(np.min(values))), abs(float(np.max(values))))
+    return np.int16 if bound <= np.iinfo(np.int16).max else np.int32
+
+class TileStore():
+    '''
+    Holds tiles as separate compact columns instead of the float64 arrays of `MathPentagrid.get_patch`:
+    - points: the intersection (x, y) of every tile, float32 by default,
+    - grids: its grids r and s as uint8,
+    - k_vals: its K vector as int16, or int32 if needed,
+    - tiles: its vertices (4, 2), float32 by default, ready for the geometry buffers.
+    Indexing returns a TileStore of the indexed columns, so slices are views without copies.
+    '''
+    def __init__(self, points:np.ndarray, grids:np.ndarray, k_vals:np.ndarray, tiles:np.ndarray) -> None:
+        assert len(points) == len(grids) == len(k_vals) == len(tiles)
+        self.points = points
+        self.grids = grids
+        self.k_vals = k_vals
+        self.tiles = tiles
+
+    @classmethod
+    def from_patch(
+        cls,
+        intersections:np.ndarray,
+        k_vals:np.ndarray,
+        tiles:np.ndarray,
+        pointtype:type=np.float32,
+        tiletype:type=np.float32,
+    ) -> "TileStore":
+        ''' Compact the intersections, K vectors and vertices of a patch. '''
+        k_vals = np.rint(k_vals)
+        return cls(
+            np.ascontiguousarray(intersections[:, :2], dtype=pointtype),
+            np.ascontiguousarray(intersections[:, 2:4], dtype=np.uint8),
+            np.ascontiguousarray(k_vals, dtype=smallest_int_type(k_vals)),
+            np.ascontiguousarray(tiles, dtype=tiletype),
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays:"dict[str, np.ndarray]") -> "TileStore":
+        ''' Wrap columns, e.g. memory-mapped ones, by their names in TILE_COLUMNS. '''
+        return cls(*(arrays[name] for name in TILE_COLUMNS))
+
+    def arrays(self) -> "dict[str, np.ndarray]":
+        ''' Return the columns by their names, e.g. to save them. '''
+        return {name: getattr(self, name) for name in TILE_COLUMNS}
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def __getitem__(self, index) -> "TileStore":
+        return TileStore(self.points[index], self.grids[index], self.k_vals[index], self.tiles[index])
+
+    @property
+    def nbytes(self) -> int:
+        ''' The memory held by the columns. '''
+        return sum(array.nbytes for array in self.arrays().values())
+
+    def intersections(self) -> np.ndarray:
+        ''' Return the rows (x, y, r, s) in the float64 layout of `intersect_lattices`. '''
+        intersections = np.empty((len(self), 4), dtype=float)
+        intersections[:, :2] = self.points
+        intersections[:, 2:] = self.grids
+        return intersections
+
+    def patch(self):
+        ''' Return intersections, K vectors and vertices like `MathPentagrid.get_patch`, K and vertices as views. '''
+        return self.intersections(), self.k_vals, self.tiles
@@ -0,0 +1,263 @@
+'''
+Verifies generated tilings with K vector arithmetic only.
+Every rhomb (r, s, K) has the vertices K, K+e_s, K+e_r+e_s and K+e_r,
+so its edges are identified exactly by their lower vertex and direction, without any geometry.
+'''
+
+from typing import Iterable, Iterator, NamedTuple
+
+import numpy as np
+from penroseGenerator.src.core.geometry import intersect_lattices
+from penroseGenerator.src.core.telemetry import JobTelemetry
+from penroseGenerator.src.penrose.mathpentagrid import MathPentagrid
+
+SINGULAR_TOLERANCE = 1e-9
+MISSING_TILES_BLOCK = 1 << 18
+''' Open edges whose missing tiles are located at once, which bounds the memory of the last step. '''
+
+class VerificationResult(NamedTuple):
+    ''' Counts of everything the verifier checked. The tiling is valid if `ok` is True. '''
+    tiles: int
+    interior_edges: int
+    boundary_edges: int
+    overused_edges: int
+    same_side_edges: int
+    index_violations: int
+    singular_intersections: int
+    gap_edges: int = 0
+
+    @property
+    def ok(self) -> bool:
+        ''' No overlaps, no gaps, no index violations and no singular intersections. '''
+        return self.overused_edges == 0 and self.same_side_edges == 0 and self.gap_edges == 0 \
+            and self.index_violations == 0 and self.singular_intersections == 0
+
+def iter_patch_chunks(mathpg:MathPentagrid, imin:int, imax:int) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    ''' Yield the intersections and K vectors of the patch between lines `imin` and `imax`, one grid pair at a time. '''
+    lattices = [mathpg.reverse_is_on_grid(j, imin, imax) for j in range(mathpg.grids)]
+    for i, j in zip(*np.triu_indices(mathpg.grids, 1)):
+        intersections = intersect_lattices(lattices, (np.array([i]), np.array([j])))
+        yield intersections, mathpg.get_Ks_from_intersections(intersections)
+
+class EdgeTable(NamedTuple):
+    '''
+    Edges sorted by their packed key, with the number of tiles at them and the sum of the sides they lie on.
+    `tiles` names the tile of the first record of every edge as 2 * (its other grid) + (1 if the edge
+    does not contain K), so the tile can be recovered from the key. Closed edges, with two tiles on opposite sides,
+    are not kept.
+    '''
+    keys: np.ndarray
+    counts: np.ndarray
+    sidesums: np.ndarray
+    tiles: np.ndarray
+
+def reduce_edges(keys:np.ndarray, counts:"np.ndarray|None", sidesums:np.ndarray, kind:str="quicksort"):
+    '''
+    Sum up the counts and side sums of equal keys and drop the closed edges. Return the sorted keys,
+    counts and side sums of the kept edges, the index of their first records and the number of closed edges.
+    Without `counts`, every record counts once.
+    Sort with kind="stable" when `keys` are a few sorted runs, which it merges in linear time.
+    '''
+    order = np.argsort(keys, kind=kind)
+    keys = keys[order]
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    bounds = np.append(starts, len(keys))
+    if counts is None:
+        counts = np.diff(bounds).astype(np.int32)
+    else:
+        counts = np.diff(np.concatenate([[0], np.cumsum(counts[order], dtype=np.int32)])[bounds])
+    # Differences of the int32 running sums are exact even if the sums wrap around.
+    sidesums = np.diff(np.concatenate([[0], np.cumsum(sidesums[order], dtype=np.int32)])[bounds])
+    kept = np.flatnonzero((counts != 2) | (sidesums != 0))
+    return keys[starts[kept]], counts[kept], sidesums[kept], order[starts[kept]], len(starts) - len(kept)
+
+def merge_edges(tables:"list[EdgeTable]") -> tuple[EdgeTable, int]:
+    ''' Merge sorted edge tables into one, return it and the number of edges closed by merging. '''
+    keys, counts, sidesums, tiles = (np.concatenate(column) for column in zip(*tables))
+    keys, counts, sidesums, first, closed = reduce_edges(keys, counts, sidesums, "stable")
+    return EdgeTable(keys, counts, sidesums, tiles[first]), closed
+
+class TilingVerifier():
+    '''
+    Checks chunks of a tiling for overlaps, gaps, the vertex index rule and singular grids.
+    - Every edge has to belong to exactly two tiles lying on opposite sides of it,
+      or to a single tile on the boundary of the patch. An edge is dual to a piece of grid line,
+      and its missing tile would be the next intersection along that line. The edge is on the boundary
+      only if that intersection is with a line outside the lines of its grid in the patch.
+      The intersection of a tile is where its lines K_r and K_s cross, so this is only computed
+      at the end, for the edges still open.
+    - For grids whose directions sum to zero, every vertex index sum(K) has to lie strictly between
+      sum(gamma) and sum(gamma) + grids. For the pentagrid this is equivalent to the matching rules.
+    - No intersection may lie on the line of a third grid, where the K vectors are ambiguous.
+    Edges are packed into int64 keys and reduced per chunk. The open edges of every chunk are merged into
+    a sorted table of compact columns, and edges closed by two tiles on opposite sides are dropped from it,
+    so memory only grows with the edges still waiting for their second tile. A further tile at a dropped edge
+    stays unmatched and counts as a gap, as the tiles beyond it are inside the patch.
+    '''
+    def __init__(self, mathpg:MathPentagrid) -> None:
+        self.mathpg = mathpg
+        grids = mathpg.grids
+        self.dirbits = int(np.ceil(np.log2(grids)))
+        self.compbits = (63 - self.dirbits) // grids
+        # Packing is linear, so adding units[g] to a key adds e_g to its K vector.
+        self.units = np.left_shift(1, self.dirbits + self.compbits * np.arange(grids), dtype=np.int64)
+        factor = np.asarray(mathpg.penrosemap.c_to_r5_factor)
+        self.normals = np.stack([factor.real, -factor.imag], axis=1)
+        # rates[l, o] is how fast every grid value changes along line l, going where the value of grid o grows.
+        along = np.stack([self.normals[:, 1], -self.normals[:, 0]], axis=1)
+        along = along[:, None] * np.sign(self.normals @ along.T).T[:, :, None]
+        rates = (along @ self.normals.T).reshape(grids * grids, grids)
+        moving = np.abs(rates) > 1e-12
+        self._rates = rates
+        self._inverse_rates = np.where(moving, 1 / np.where(moving, np.abs(rates), 1), 0)
+        self._blocked = np.where(moving, 0, np.inf)
+        units = np.array([mathpg.penrosemap.r5_to_c(unit) for unit in np.eye(grids)])
+        # sides[d, t] is the side of an edge in direction d a tile extending along t lies on.
+        self.sides = np.sign(np.imag(np.conj(units[:, None]) * units[None, :])).astype(np.int8)
+        gamma = np.asarray(mathpg.penrosemap.gamma, dtype=float)
+        self.index_bounds = (float(gamma.sum()), float(gamma.sum()) + grids) \
+            if abs(np.sum(mathpg.penrosemap.c_to_r5_factor)) <= 1e-10 else None
+
+    def _pack(self, k_vals:np.ndarray) -> np.ndarray:
+        ''' Pack K vectors into keys with direction 0. Their components may still grow by one. '''
+        shifted = k_vals + (1 << (self.compbits - 1))
+        if shifted.size and (shifted.min() < 0 or shifted.max() + 1 >= 1 << self.compbits):
+            raise ValueError("K vectors of this patch are too large to be packed into edge keys.")
+        return shifted @ self.units
+
+    def _unpack(self, keys:np.ndarray, grids:np.ndarray) -> np.ndarray:
+        ''' Return component `grids` of the base K vectors of packed edge keys, one grid per key. '''
+        components = np.right_shift(keys, self.dirbits + self.compbits * grids) & ((1 << self.compbits) - 1)
+        return components - (1 << (self.compbits - 1))
+
+    def _missing_tiles(self, edges:EdgeTable) -> tuple[np.ndarray, np.ndarray]:
+        ''' Return the grid and line of the intersection beyond every edge of `edges`, where a second tile would be. '''
+        lines = (edges.keys & ((1 << self.dirbits) - 1)).astype(np.intp)
+        others, shifted = np.divmod(edges.tiles.astype(np.intp), 2)
+        # The tile is (lines, others, K), its lines K_r and K_s cross at its intersection.
+        gamma = np.asarray(self.mathpg.penrosemap.gamma, dtype=float)
+        rhs1 = self._unpack(edges.keys, lines) - gamma[lines]
+        rhs2 = self._unpack(edges.keys, others) - shifted - gamma[others]
+        normal1, normal2 = self.normals[lines], self.normals[others]
+        determinant = normal1[:, 0] * normal2[:, 1] - normal1[:, 1] * normal2[:, 0]
+        points = np.stack([
+            rhs1 * normal2[:, 1] - rhs2 * normal1[:, 1], normal1[:, 0] * rhs2 - normal2[:, 0] * rhs1
+        ], axis=1) / determinant[:, None]
+        values = (points @ self.normals.T + gamma).round(10)
+        # The edges with base K lie on the side of the lower line value of the other grid.
+        return self._next_intersections(values, lines, others, 2 * shifted - 1)
+
+    def _next_intersections(self, values:np.ndarray, lines:np.ndarray, others:np.ndarray, signs:np.ndarray):
+        '''
+        For intersections with the values `values` of c_to_r5, return the grid and line of the next intersection
+        along line `lines` in the direction in which the value of grid `others` changes by `signs`.
+        '''
+        pairs = lines * self.mathpg.grids + others
+        rising = (self._rates[pairs] * signs[:, None]) > 0
+        targets = np.where(rising, np.floor(values + 1e-9) + 1, np.ceil(values - 1e-9) - 1)
+        distances = np.abs(targets - values)
+        distances *= self._inverse_rates[pairs]
+        distances += self._blocked[pairs]
+        nextgrids = np.argmin(distances, axis=1)
+        return nextgrids, targets[np.arange(len(lines)), nextgrids].astype(np.int64)
+
+    def check_chunk(self, intersections:np.ndarray, k_vals:np.ndarray):
+        '''
+        Check the tiles of one chunk on their own. Return the index violations, singular intersections,
+        the number of edges closed within the chunk, the table of the other edges
+        and the lowest and highest line of every grid.
+        '''
+        count = len(intersections)
+        rows = np.arange(count)
+        r, s = intersections[:, 2].astype(int), intersections[:, 3].astype(int)
+        k_int = k_vals.astype(np.int64)
+        # The edges K to K+e_s, K+e_s to K+e_r+e_s, K+e_r to K+e_r+e_s and K to K+e_r.
+        tilekeys = self._pack(k_int)
+        keys = np.concatenate([tilekeys + s, tilekeys + self.units[s] + r, tilekeys + self.units[r] + s, tilekeys + r])
+        sides = np.concatenate([
+            self.sides[s, r], -self.sides[r, s], -self.sides[s, r], self.sides[r, s]
+        ]).astype(np.int32)
+        tiles = np.concatenate([2 * r, 2 * s + 1, 2 * r + 1, 2 * s]).astype(np.uint8)
+        keys, counts, sidesums, first, closed = reduce_edges(keys, None, sides)
+        edges = EdgeTable(keys, counts, sidesums, tiles[first])
+
+        index_violations = 0
+        if self.index_bounds is not None:
+            lower, upper = self.index_bounds
+            # The vertex indices are sum(K), twice sum(K)+1 and sum(K)+2.
+            indices = k_int.sum(axis=1)
+            index_violations = sum(
+                weight * int(np.count_nonzero((indices + offset <= lower + 1e-9) | (indices + offset >= upper - 1e-9)))
+                for offset, weight in ((0, 1), (1, 2), (2, 1))
+            )
+
+        points = intersections[:, 0] + 1j * intersections[:, 1]
+        values = self.mathpg.penrosemap.c_to_r5(points[:, None])
+        on_line = np.abs(values - np.round(values)) <= SINGULAR_TOLERANCE
+        on_line[rows, r] = False
+        on_line[rows, s] = False
+        singular = int(np.count_nonzero(on_line.any(axis=1)))
+
+        grids = self.mathpg.grids
+        linenumbers = np.concatenate([k_int[rows, r], k_int[rows, s]])
+        tilegrids = np.concatenate([r, s])
+        lowest = np.full(grids, np.iinfo(np.int64).max)
+        highest = np.full(grids, np.iinfo(np.int64).min)
+        np.minimum.at(lowest, tilegrids, linenumbers)
+        np.maximum.at(highest, tilegrids, linenumbers)
+        return index_violations, singular, closed, edges, (lowest, highest)
+
+    def verify(
+        self,
+        chunks:Iterable[tuple[np.ndarray, np.ndarray]],
+        telemetry:"JobTelemetry|None"=None,
+    ) -> VerificationResult:
+        '''
+        Verify a tiling given as chunks of (intersections, K vectors), counting every chunk in `telemetry`.
+        Chunk tables are merged into the open edges once they are as large together,
+        so many small chunks do not rewrite the table every time.
+        '''
+        tiles, index_violations, singular, closed = 0, 0, 0, 0
+        edges: "EdgeTable|None" = None
+        pending: list[EdgeTable] = []
+        lowest = np.full(self.mathpg.grids, np.iinfo(np.int64).max)
+        highest = np.full(self.mathpg.grids, np.iinfo(np.int64).min)
+        for intersections, k_vals in chunks:
+            if not len(intersections):
+                continue
+            chunk_violations, chunk_singular, chunk_closed, chunk_edges, (chunk_lowest, chunk_highest) = \
+                self.check_chunk(intersections, k_vals)
+            tiles += len(intersections)
+            index_violations += chunk_violations
+            singular += chunk_singular
+            closed += chunk_closed
+            pending.append(chunk_edges)
+            lowest, highest = np.minimum(lowest, chunk_lowest), np.maximum(highest, chunk_highest)
+            if edges is None or sum(len(table.keys) for table in pending) >= len(edges.keys):
+                edges, merged = merge_edges(pending if edges is None else [edges, *pending])
+                closed += merged
+                pending = []
+            if telemetry is not None:
+                telemetry.advance(len(intersections))
+        if edges is None:
+            return VerificationResult(0, 0, 0, 0, 0, 0, 0)
+        if pending:
+            edges, merged = merge_edges([edges, *pending])
+            closed += merged
+        counts = edges.counts
+        single = EdgeTable(*(column[counts == 1] for column in edges))
+        gaps = 0
+        for start in range(0, len(single.keys), MISSING_TILES_BLOCK):
+            block = EdgeTable(*(column[start:start + MISSING_TILES_BLOCK] for column in single))
+            nextgrids, nextlines = self._missing_tiles(block)
+            gaps += int(np.count_nonzero((nextlines >= lowest[nextgrids]) & (nextlines <= highest[nextgrids])))
+        return VerificationResult(
+            tiles=tiles,
+            interior_edges=closed + int(np.count_nonzero(counts == 2)),
+            boundary_edges=int(np.count_nonzero(counts == 1)),
+            overused_edges=int(np.count_nonzero(counts > 2)),
+            same_side_edges=int(np.count_nonzero(counts == 2)),
+            index_violations=index_violations,
+            singular_intersections=singular,
+            gap_edges=gaps,
+        )
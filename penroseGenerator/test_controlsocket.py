@@ -0,0 +1,72 @@
+""" Tests for the control socket and how its updates are applied. """
+
+import socket
+import time
+
+import pytest
+from numpy import array, allclose
+
+from penroseGenerator.src.core.controlsocket import ControlServer
+from penroseGenerator.src.penrose.penrosetiling import CONTROL_FIELDS, apply_control
+from penroseGenerator.src.penrose.pentagrid import Pentagrid
+
+def wait_for(server:ControlServer, received:int, rejected:int):
+    """ Wait until the server thread handled the given number of lines. """
+    deadline = time.monotonic() + 5
+    while (server.received, server.rejected) != (received, rejected):
+        assert time.monotonic() < deadline, (server.received, server.rejected)
+        time.sleep(.01)
+
+def test_control_server_round_trip(tmp_path):
+    """ Ensures split, oversized and malformed lines are handled and a batch keeps the newest value of every field. """
+    path = str(tmp_path / "control")
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    server = ControlServer(path, CONTROL_FIELDS, maxline=64)
+    server.start()
+    try:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(path)
+        client.sendall(b'{"gamma": [0.1, 0.2,')
+        time.sleep(.05)
+        client.sendall(b' 0.3, 0.4, -1]}\n')
+        wait_for(server, 1, 0)
+        assert server.take() == {"gamma": [.1, .2, .3, .4, -1]}
+        assert server.take() == {}
+        client.sendall(b'x' * 100)
+        wait_for(server, 1, 1)
+        client.sendall(b'\nnot json\n[1, 2]\n{"unknown": 1}\n')
+        wait_for(server, 1, 4)
+        client.sendall(b'{"zoom": 1, "origin": [0, 0]}\n{"zoom": 2}\n{"zoom": 3}\n')
+        wait_for(server, 4, 4)
+        assert server.take() == {"zoom": 3, "origin": [0, 0]}
+        client.close()
+    finally:
+        server.stop()
+
+def test_control_server_keeps_other_files(tmp_path):
+    """ Ensures the server refuses to replace a file at its path that is not a socket. """
+    path = tmp_path / "control"
+    path.write_text("keep me")
+    with pytest.raises(FileExistsError):
+        ControlServer(str(path)).start()
+    assert path.read_text() == "keep me"
+
+def test_apply_control_rejects_non_finite():
+    """ Ensures NaN and infinite values are ignored, while finite updates still apply. """
+    pentagrid = Pentagrid((64, 64))
+    gamma = pentagrid.mathpg.penrosemap.gamma.copy()
+    origin = pentagrid.origin.copy()
+    xyscale = pentagrid.xyscale.copy()
+    factor = pentagrid.mathpg.penrosemap.c_to_r5_factor.copy()
+    apply_control(pentagrid, {
+        "gamma": [.1, float("nan"), .2, .3, -.6], "origin": [float("inf"), 0], "zoom": float("-inf"),
+        "c_to_r5_factor": [[1, 0], [0, 1], [float("nan"), 0], [1, 1], [0, 0]],
+    })
+    assert allclose(pentagrid.mathpg.penrosemap.gamma, gamma)
+    assert allclose(pentagrid.mathpg.penrosemap.c_to_r5_factor, factor)
+    assert allclose(pentagrid.origin, origin) and allclose(pentagrid.xyscale, xyscale)
+    apply_control(pentagrid, {"gamma": [.1, .2, .2, .3, -.6], "zoom": 50})
+    assert allclose(pentagrid.mathpg.penrosemap.gamma, array([.1, .2, .2, .3, -.6]))
+    assert allclose(pentagrid.xyscale, [50, 50])
@@ -0,0 +1,68 @@
+""" Tests for drawing through the window renderer, headlessly with SDL's dummy video and software render drivers. """
+
+import ctypes
+
+import sdl2
+import sdl2.ext
+from numpy import full, uint8, zeros
+
+from penroseGenerator.src.core.sprite import BaseSprite
+from penroseGenerator.src.core.windowmanager import WindowManager
+
+SIZE = (32, 24)
+
+def make_windowmanager(monkeypatch, accelerated:bool=True) -> WindowManager:
+    """ Create a window on the dummy video driver, whose renderer is SDL's software renderer. """
+    monkeypatch.setenv("SDL_VIDEODRIVER", "dummy")
+    monkeypatch.setenv("SDL_RENDER_DRIVER", "software")
+    return WindowManager("test", SIZE, accelerated=accelerated)
+
+def read_window(windowmanager:WindowManager, sprite:BaseSprite):
+    """ Draw `sprite` onto the cleared window and read the result back as (height, width, 4) RGBA pixels. """
+    renderer = windowmanager.windowrenderer
+    renderer.clear((0, 0, 0, 255))
+    sprite.draw(renderer)
+    windowmanager.read_pixels()
+    return sdl2.ext.pixels3d(windowmanager.surface, transpose=False)[..., ::-1].copy()
+
+def test_direct_upload_and_blend(monkeypatch):
+    """ Ensures uploaded and blended pixels reach the window renderer's texture and come back through read_pixels. """
+    windowmanager = make_windowmanager(monkeypatch)
+    assert windowmanager.direct and windowmanager.sprite_renderer is windowmanager.windowrenderer
+    sprite = BaseSprite(SIZE, renderer=windowmanager.sprite_renderer)
+    assert sprite.direct
+    with sprite.drawing():
+        target = sdl2.SDL_GetRenderTarget(sprite.renderer)
+        assert ctypes.cast(target, ctypes.c_void_p).value == ctypes.cast(sprite.targettexture, ctypes.c_void_p).value
+    assert not sdl2.SDL_GetRenderTarget(sprite.renderer)
+    pixels = sprite.pixels()
+    pixels[:] = 0
+    pixels[4:12, 8:20] = (200, 100, 40, 255)
+    sprite.upload_pixels()
+    image = read_window(windowmanager, sprite)
+    assert (image[4:12, 8:20] == (200, 100, 40, 255)).all()
+    assert (image[:4, :, :3] == 0).all() and (image[12:, :, :3] == 0).all()
+    alpha = zeros(SIZE[::-1])
+    alpha[4:12, 8:14] = .5
+    sprite.blend_pixels(full((*SIZE[::-1], 3), (0, 200, 240), dtype=uint8), alpha)
+    image = read_window(windowmanager, sprite).astype(int)
+    assert (abs(image[4:12, 8:14, :3] - (100, 150, 140)) <= 2).all()
+    assert (image[4:12, 14:20] == (200, 100, 40, 255)).all()
+
+def test_fallback_without_target_textures(monkeypatch):
+    """ Ensures the window falls back to software drawing if no renderer with target textures can be created. """
+    renderer = sdl2.ext.Renderer
+    def without_targets(target, *args, flags=None, **kwargs):
+        if flags is not None:
+            raise sdl2.ext.SDLError("no target textures")
+        return renderer(target, *args, **kwargs)
+    monkeypatch.setattr(sdl2.ext, "Renderer", without_targets)
+    windowmanager = make_windowmanager(monkeypatch)
+    assert not windowmanager.direct and windowmanager.sprite_renderer is None
+    sprite = BaseSprite(SIZE, renderer=windowmanager.sprite_renderer)
+    assert not sprite.direct
+    pixels = sprite.pixels()
+    pixels[:] = (100, 0, 200, 255)
+    sprite.upload_pixels()
+    sprite.blend_pixels(full((*SIZE[::-1], 3), (200, 200, 0)), full(SIZE[::-1], .5))
+    assert (abs(sprite.pixels()[..., :3].astype(int) - (150, 100, 100)) <= 1).all()
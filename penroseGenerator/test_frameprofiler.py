@@ -0,0 +1,39 @@
+""" Tests for the per-frame allocation and timing records of the FrameProfiler. """
+
+import gc
+import json
+
+from penroseGenerator.src.core.frameprofiler import FrameProfiler
+
+def test_frame_profiler_records(tmp_path):
+    """ Ensures allocations, peaks, GC pauses and stages land in their frame and a paused iteration starts over. """
+    path = str(tmp_path / "profile.jsonl")
+    profiler = FrameProfiler(path, snapshot_interval=3)
+    kept = []
+    profiler.start()
+    try:
+        with profiler.stage("allocate"):
+            kept.append(bytearray(1 << 20))
+        temporary = bytearray(4 << 20)
+        del temporary
+        profiler.end_frame()
+        # A paused iteration begins the frame again, so what it allocated is not counted.
+        kept.append(bytearray(2 << 20))
+        profiler.begin_frame()
+        profiler.end_frame()
+        with profiler.stage("collect"):
+            gc.collect()
+        profiler.end_frame()
+    finally:
+        profiler.stop()
+    assert not profiler.active
+    records = [json.loads(line) for line in open(path, encoding="utf-8")]
+    assert [record["frame"] for record in records] == [0, 1, 2]
+    first, paused, collected = records
+    assert first["stages"]["allocate"]["bytes"] >= 1 << 20 and first["stages"]["allocate"]["ms"] >= 0
+    assert 1 << 20 <= first["bytes"] < 2 << 20 and first["peak_bytes"] >= 5 << 20
+    assert paused["bytes"] < 1 << 20 and paused["peak_bytes"] < 1 << 20 and paused["stages"] == {}
+    assert all(isinstance(record["blocks"], int) for record in records)
+    assert len(collected["gc_pauses_ms"]) >= 1 and min(collected["gc_pauses_ms"]) >= 0
+    assert collected["peak_rss"] is None or collected["peak_rss"] >= 2 << 20
+    assert "top_allocations" in collected and "top_allocations" not in first
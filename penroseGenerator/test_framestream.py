@@ -0,0 +1,31 @@
+""" Tests for handing frames to other processes. """
+
+import time
+
+import sdl2
+
+from penroseGenerator.src.core.framestream import (
+    RING_HEADER, RING_MAGIC, SharedMemoryFrameReader, SharedMemoryFrameRing, surface_pixels
+)
+
+def test_shared_memory_ring():
+    """ Ensures the ring header describes the frames and readers only get frames that were not overwritten yet. """
+    surface = sdl2.SDL_CreateRGBSurface(0, 5, 3, 32, 0xff000000, 0xff0000, 0xff00, 0xff)
+    pixels = surface_pixels(surface)
+    ring = SharedMemoryFrameRing(f"penrose-test-{time.monotonic_ns()}", surface, slots=3)
+    reader = SharedMemoryFrameReader(ring.memory.name)
+    try:
+        assert list(reader.header[:5]) == [RING_MAGIC, 5, 3, 3, 20] and reader.latest() is None
+        for frame in range(7):
+            pixels[...] = frame
+            ring.write(10 * frame)
+        assert reader.written == 7 and reader.read(3) is None and reader.read(7) is None
+        for index in range(4, 7):
+            number, frame_pixels = reader.read(index)
+            assert number == 10 * index and (frame_pixels == index).all()
+            assert reader.header[RING_HEADER + index % 3] == 10 * index + 1
+        assert reader.latest()[0] == 60
+    finally:
+        reader.close()
+        ring.close()
+        sdl2.SDL_FreeSurface(surface)
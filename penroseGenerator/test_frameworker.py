@@ -0,0 +1,24 @@
+""" Tests for computing frames on a background thread. """
+
+import time
+
+import pytest
+
+from penroseGenerator.src.core.frameworker import FrameWorker
+
+def test_frame_worker_errors():
+    """ Ensures an exception on the worker thread is raised again on the main thread once, and it can be restarted. """
+    worker = FrameWorker(lambda snapshot: 1 / snapshot)
+    worker.start()
+    worker.submit(0)
+    worker._thread.join(10) #pylint: disable=protected-access
+    with pytest.raises(ZeroDivisionError):
+        worker.poll()
+    worker.poll()
+    worker.start()
+    worker.submit(4)
+    deadline = time.monotonic() + 10
+    while worker.latest() is None and time.monotonic() < deadline:
+        time.sleep(.01)
+    worker.stop()
+    assert worker.latest() == .25
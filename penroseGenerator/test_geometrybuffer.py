@@ -0,0 +1,41 @@
+""" Tests for the QuadBuffer vertex, color and index layout. """
+
+from numpy import arange, array, float32, int32, uint8
+
+from penroseGenerator.src.core.geometrybuffer import QuadBuffer
+
+def test_quad_buffer_reserve_grows():
+    """ Ensures the capacity grows by at least half, keeps the old quads and never shrinks. """
+    buffer = QuadBuffer()
+    buffer.reserve(4)
+    assert len(buffer.quads) == len(buffer.positions) == len(buffer.colors) == 4 and len(buffer.indices) == 24
+    buffer.set_quads(arange(32, dtype=float).reshape(4, 4, 2), array([[1, 2, 3]] * 4))
+    buffer.reserve(5)
+    assert len(buffer.quads) == 6 and len(buffer.indices) == 36
+    assert (buffer.quads[:4].ravel() == arange(32)).all()
+    buffer.reserve(20)
+    assert len(buffer.quads) == 20
+    buffer.reserve(2)
+    assert len(buffer.quads) == 20
+
+def test_quad_buffer_layout():
+    """ Ensures the buffers have the dtypes SDL expects, 6 indices per quad and one color per vertex. """
+    buffer = QuadBuffer()
+    quads = arange(24, dtype=float).reshape(3, 4, 2)
+    buffer.set_quads(quads, array([[10, 20, 30], [40, 50, 60], [70, 80, 90]]))
+    assert buffer.count == 3
+    assert buffer.quads.dtype == buffer.positions.dtype == float32
+    assert buffer.colors.dtype == uint8 and buffer.indices.dtype == int32
+    assert buffer.indices[:18].tolist() == [0, 1, 2, 0, 2, 3, 4, 5, 6, 4, 6, 7, 8, 9, 10, 8, 10, 11]
+    assert (buffer.colors[1] == [40, 50, 60, 255]).all()
+    buffer.set_alpha(100)
+    assert (buffer.colors[:3, :, 3] == 100).all()
+    buffer.set_quads(quads[:1], array([[1, 2, 3, 4]]))
+    assert buffer.count == 1 and (buffer.colors[0] == [1, 2, 3, 4]).all()
+
+def test_quad_buffer_transform():
+    """ Ensures the screen positions are xyscale * (quad + origin) with y flipped at the height. """
+    buffer = QuadBuffer()
+    buffer.set_quads(array([[[0, 0], [1, 0], [1, 1], [0, 1]]], dtype=float), array([[0, 0, 0]]))
+    buffer.transform(array([10., 20.]), array([1., 2.]), 100.)
+    assert buffer.positions[0].tolist() == [[10, 60], [20, 60], [20, 40], [10, 40]]
@@ -0,0 +1,42 @@
+""" Tests for updating tilings incrementally while gammas change. """
+
+from numpy import array, allclose, flatnonzero, isin
+
+from penroseGenerator.src.core.geometry import intersect_lattices
+from penroseGenerator.src.penrose.incrementaltiling import IncrementalTiling, tile_keys
+from penroseGenerator.src.penrose.mathpentagrid import MathPentagrid
+from penroseGenerator.src.penrose.penrosemaps import PenroseMap
+
+def test_incremental_tiling_matches_regenerate():
+    """ Ensures moving a single gamma gives the same tiles as generating them from scratch. """
+    mathpg = MathPentagrid(PenroseMap(array([.0, .1, .2, .3, -.6])))
+    tiling = IncrementalTiling()
+    tiling.update(mathpg, -4, 4)
+    for _ in range(10):
+        mathpg.penrosemap.gamma[3] += .07
+        tiling.update(mathpg, -4, 4)
+        lattices = [mathpg.reverse_is_on_grid(j, -4, 4) for j in range(mathpg.grids)]
+        intersections = intersect_lattices(lattices)
+        assert allclose(tiling.intersections, intersections)
+        assert allclose(tiling.tiles, mathpg.get_verts_from_intersections(intersections))
+
+def test_incremental_changes_match_patch():
+    """ Ensures added, removed and moved tiles turn the old patch into a full patch after a single gamma changed. """
+    mathpg = MathPentagrid(PenroseMap(array([.0, .1, .2, .3, -.6])))
+    tiling = IncrementalTiling()
+    tiling.update(mathpg, -4, 4)
+    for step in range(8):
+        old_intersections, old_k_vals = tiling.intersections, tiling.k_vals
+        mathpg.penrosemap.gamma[step % 5] += .13
+        changes = tiling.update(mathpg, -4, 4)
+        intersections, k_vals, tiles = mathpg.get_patch(-4, 4)
+        assert (tiling.k_vals == k_vals).all() and allclose(tiling.tiles, tiles)
+        assert allclose(tiling.intersections, intersections)
+
+        oldkeys, newkeys = tile_keys(old_intersections, old_k_vals), tile_keys(intersections, k_vals)
+        assert len(changes.added) > 0 and len(changes.removed) == len(changes.added)
+        assert (flatnonzero(~isin(newkeys, oldkeys)) == changes.added).all()
+        assert (flatnonzero(~isin(oldkeys, newkeys)) == changes.removed).all()
+        kept = flatnonzero(isin(newkeys, oldkeys))
+        changed = kept[(intersections[kept] != old_intersections[kept]).any(axis=1)]
+        assert len(changed) > 0 and (changed == changes.moved).all()
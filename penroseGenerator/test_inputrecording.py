@@ -0,0 +1,42 @@
+""" Tests for recording and replaying key events. """
+
+import json
+
+import sdl2
+
+from penroseGenerator.src.core.inputrecording import InputRecorder, InputReplay
+
+def key_event(eventtype:int, sym:int, mod:int=0) -> sdl2.SDL_Event:
+    """ Build a key event like SDL dispatches it. """
+    event = sdl2.SDL_Event()
+    event.type = eventtype
+    event.key.type = eventtype
+    event.key.keysym.sym = sym
+    event.key.keysym.mod = mod
+    return event
+
+def test_record_and_replay(tmp_path):
+    """ Ensures recorded key events come back at their frames, the replay ends after the tail and reports its times. """
+    path = str(tmp_path / "session.jsonl")
+    recorder = InputRecorder(path)
+    recorder.record(2, key_event(sdl2.SDL_KEYDOWN, sdl2.SDLK_1, sdl2.KMOD_LSHIFT))
+    recorder.record(2, key_event(sdl2.SDL_KEYDOWN, sdl2.SDLK_q))
+    recorder.record(5, key_event(sdl2.SDL_KEYUP, sdl2.SDLK_1))
+    recorder.close()
+    assert [json.loads(line)["frame"] for line in open(path, encoding="utf-8")] == [2, 2, 5]
+    replay = InputReplay(path, tail=3)
+    assert replay.events_for(0) == [] and replay.events_for(3) == []
+    first, second = replay.events_for(2)
+    assert (first.type, first.key.keysym.sym, first.key.keysym.mod) == (sdl2.SDL_KEYDOWN, sdl2.SDLK_1, sdl2.KMOD_LSHIFT)
+    assert first.key.state == sdl2.SDL_PRESSED and second.key.keysym.sym == sdl2.SDLK_q
+    released, = replay.events_for(5)
+    assert released.type == released.key.type == sdl2.SDL_KEYUP and released.key.state == sdl2.SDL_RELEASED
+    assert not replay.finished(8) and replay.finished(9)
+    assert replay.report() == {"frames": 0}
+    replay.frametimes = [4., 1., 3., 2.]
+    report = replay.report()
+    assert (report["frames"], report["total_ms"], report["mean_ms"]) == (4, 10., 2.5)
+    assert (report["median_ms"], report["p95_ms"], report["max_ms"]) == (2.5, 4., 4.)
+    assert report["frametimes_ms"] == [4., 1., 3., 2.]
+    replay.write_report(str(tmp_path / "report.json"))
+    assert json.loads((tmp_path / "report.json").read_text()) == report
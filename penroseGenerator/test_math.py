@@ -1,8 +1,18 @@
 """ Some simple sanity checks for basic algebra stuff. """
 
-from numpy import pi, ndarray, ones, array
+from numpy import pi, ndarray, ones, array, allclose, complex128, concatenate, exp, fromfile, uint8
 
-from penroseGenerator.src.core.geometry import Line2D, intersect_line2d
+from penroseGenerator.src.core.cutandproject import CutAndProject
+from penroseGenerator.src.core.geometry import Line2D, intersect_line2d, intersect_lattices
+from penroseGenerator.src.fibonacci.sturmian import sturmian_bits, sturmian_packed, write_sturmian
+from penroseGenerator.src.penrose.batchedpentagrid import BatchedPentagrid
+from penroseGenerator.src.penrose.diffraction import structure_factor
+from penroseGenerator.src.penrose.mathpentagrid import MathPentagrid
+from penroseGenerator.src.penrose.penrosemaps import MultigridMap, PenroseMap
+from penroseGenerator.src.penrose.tilepyramid import TilePyramid
+from penroseGenerator.src.penrose.tilerasterizer import get_linecolors, rasterize_cells
+from penroseGenerator.src.penrose.tilestore import TileStore
+from penroseGenerator.src.penrose.tilingverifier import TilingVerifier, iter_patch_chunks
 
 def close_to(val1,val2):
     """ Are val1 and val2 close enough to be ocnsidered equal? """
@@ -26,3 +36,124 @@ def test_lineinstersect():
     intersection = intersect_line2d(line1, line2)
     assert intersection is not None
     assert close_to(intersection, ones(2))
+
+def test_intersect_lattices_multigrid():
+    """ Ensures the all-pairs intersections of a 7-grid agree with single line intersections. """
+    mathpg = MathPentagrid(MultigridMap(array([.1, .2, .3, .15, .05, .4, .33])))
+    lattices = [mathpg.reverse_is_on_grid(j, -2, 2) for j in range(mathpg.grids)]
+    intersections = intersect_lattices(lattices)
+    assert len(intersections) == 21 * 5 * 5
+    for x, y, i, j in intersections[::7]:
+        assert mathpg.is_on_grid(complex(x, y), int(i))
+        assert mathpg.is_on_grid(complex(x, y), int(j))
+
+def test_sturmian_fibonacci_word():
+    """ Ensures the sequence of slope 1/golden_ratio is the Fibonacci word, also when chunked. """
+    word = "0"
+    while len(word) < 1000:
+        word = "".join("01" if letter == "0" else "0" for letter in word)
+    golden_ratio = (1 + 5**.5) / 2
+    bits = sturmian_bits(1/golden_ratio, 0.0, 1, 1000)[0]
+    assert "".join(str(bit) for bit in bits) == word[:1000]
+    chunks = [sturmian_packed(1/golden_ratio, 0.0, start, 200)[0] for start in range(1, 1001, 200)]
+    assert (concatenate(chunks) == sturmian_packed(1/golden_ratio, 0.0, 1, 1000)[0][:125]).all()
+
+def test_write_sturmian_chunked(tmp_path):
+    """ Ensures the chunked file equals the packed sequences when the length is no multiple of the chunk size. """
+    slopes, offsets = array([2**.5 - 1, 5**.5]), array([.3, -.1])
+    output = write_sturmian(str(tmp_path / "words.bin"), slopes, offsets, 1001, chunksize=64)
+    expected = sturmian_packed(slopes, offsets, 0, 1001)
+    assert output.shape == expected.shape == (2, 126) and (output == expected).all()
+    assert (fromfile(str(tmp_path / "words.bin"), dtype=uint8).reshape(2, 126) == expected).all()
+
+def test_verifier():
+    """ Ensures a regular pentagrid passes verification, while singular gammas, duplicated and missing tiles do not. """
+    mathpg = MathPentagrid(PenroseMap(array([.0, .1, .2, .3, -.6])))
+    chunks = list(iter_patch_chunks(mathpg, -5, 5))
+    result = TilingVerifier(mathpg).verify(chunks)
+    assert result.ok and result.tiles == 10 * 11 * 11 and result.interior_edges > 0
+    pieces = [(inter[i:i + 37], k[i:i + 37]) for inter, k in chunks for i in range(0, len(inter), 37)]
+    assert TilingVerifier(mathpg).verify(pieces[::-1]) == result
+    assert not TilingVerifier(mathpg).verify(chunks + chunks[:1]).ok
+    intersections, k_vals = chunks[0]
+    keep = (intersections[:, 0] ** 2 + intersections[:, 1] ** 2).argsort()[1:]
+    holed = TilingVerifier(mathpg).verify([(intersections[keep], k_vals[keep])] + chunks[1:])
+    assert holed.gap_edges == 4 and not holed.ok
+    singular = MathPentagrid(PenroseMap(array([.0, .0, .0, .0, .0])))
+    assert TilingVerifier(singular).verify(iter_patch_chunks(singular, -5, 5)).singular_intersections > 0
+
+def test_ribbon_is_connected():
+    """ Ensures consecutive rhombs of a ribbon share the edge parallel to the ribbon's grid. """
+    mathpg = MathPentagrid(PenroseMap(array([.0, .1, .2, .3, -.6])))
+    chunks = list(mathpg.iter_ribbon(2, 3, -50, 50, 17))
+    tiles = concatenate([chunk[3] for chunk in chunks])
+    assert len(tiles) > 100
+    for tile, nexttile in zip(tiles[:-1], tiles[1:]):
+        shared = [vertex for vertex in tile if any(allclose(vertex, other) for other in nexttile)]
+        assert len(shared) == 2
+
+def test_pyramid_levels_nest():
+    """ Ensures vertices of a composed level are vertices of the finer one and every tile has a parent. """
+    pyramid = TilePyramid(PenroseMap(array([.0, .1, .2, .3, -.6])), levels=3)
+    fine = pyramid.get_level(1, array([-20., -20.]), array([20., 20.]))
+    assert (pyramid.get_parents(1) >= 0).all()
+    coarse = pyramid.get_level(2, fine.lower, fine.upper)
+    inside = ((coarse.tiles[:, 0] > fine.lower + 5) & (coarse.tiles[:, 0] < fine.upper - 5)).all(axis=1)
+    finevertices = {tuple(vertex) for vertex in fine.tiles.reshape(-1, 2).round(6)}
+    assert inside.sum() > 10
+    for k_vals in pyramid.to_finer(2, coarse.k_vals[inside]):
+        position = pyramid.mathpgs[1].penrosemap.r5_to_c(k_vals) * pyramid.scale(1)
+        assert (round(position.real, 6), round(position.imag, 6)) in finevertices
+
+def test_pyramid_view_matches_culled_level():
+    """ Ensures the view refined from coarser levels holds every tile of its level touching the region. """
+    pyramid = TilePyramid(PenroseMap(array([.0, .1, .2, .3, -.6])), levels=6)
+    for lower, upper in ((array([-30., -20.]), array([40., 25.])), (array([-35., -18.]), array([38., 27.]))):
+        level, _, k_vals, tiles = pyramid.get_view(lower, upper, 2., 4.)
+        fresh = TilePyramid(PenroseMap(array([.0, .1, .2, .3, -.6])), levels=6).get_level(level, lower, upper, 0)
+        touching = fresh.k_vals[pyramid.cull(fresh, lower, upper)]
+        assert level == 2 and len(tiles) == len(touching) > 100
+        assert sorted(map(tuple, k_vals.tolist())) == sorted(map(tuple, touching.tolist()))
+
+def test_cell_indices():
+    """ Ensures the cells of a pentagrid only have the vertex indices 1 to 4, so the first color never shows up. """
+    image = rasterize_cells(PenroseMap(array([.0, .1, .2, .3, -.6])), array([-9., -6.]), array([9., 6.]), (180, 120))
+    colors = {tuple(color) for color in image.reshape(-1, 3)}
+    assert len(colors) == 4 and get_linecolors(5)[0][:3] not in colors
+
+def test_structure_factor():
+    """ Ensures the chunked structure factor equals the direct sum, here for a small square lattice. """
+    points = array([[x, y] for x in range(6) for y in range(4)], dtype=float)
+    kx, ky = array([0., 1., 2 * pi]), array([0., .5])
+    direct = array([[abs(sum(exp(1j * (a * x + b * y)) for x, y in points))**2 for b in ky] for a in kx])
+    assert allclose(structure_factor(points, kx, ky, workers=1, chunksize=5), direct / len(points), atol=1e-6)
+    exact = structure_factor(points, kx, ky, workers=1, chunksize=5, blocksize=2, dtype=complex128)
+    assert allclose(exact, direct / len(points), rtol=1e-12, atol=1e-12)
+    assert allclose(structure_factor(points, kx, ky, workers=1)[2, 0], len(points))
+
+def test_batched_matches_mathpentagrid():
+    """ Ensures a batch of configurations gives the same patches as one MathPentagrid per configuration. """
+    maps = [PenroseMap(array([.0, .1, .2, .3, -.6])), PenroseMap(array([.2, -.1, .05, .3, -.45]))]
+    intersections, k_vals, tiles = BatchedPentagrid.from_maps(maps).get_patch(-3, 3)
+    for b, penrosemap in enumerate(maps):
+        expected = MathPentagrid(penrosemap).get_patch(-3, 3)
+        assert allclose(intersections[b], expected[0]) and (k_vals[b] == expected[1]).all()
+        assert allclose(tiles[b], expected[2])
+
+def test_cut_and_project_vertices():
+    """ Ensures the cut-and-project points are the vertices of the multigrid tilings, 5 -> 2 and 4 -> 2. """
+    for gamma in ([.0, .1, .2, .3, -.6], [.1, .2, .15, -.05]):
+        penrosemap = PenroseMap(array(gamma)) if len(gamma) == 5 else MultigridMap(array(gamma))
+        _, positions = CutAndProject.from_multigrid(penrosemap).points(array([-6., -6.]), array([6., 6.]))
+        tiles = MathPentagrid(penrosemap).get_patch(-8, 8)[2].reshape(-1, 2)
+        expected = {tuple(vertex) for vertex in tiles.round(6) if (abs(vertex) <= 6).all()}
+        assert {tuple(vertex) for vertex in positions.round(6)} == expected
+
+def test_tile_store():
+    """ Ensures the compact columns keep K exactly, vertices to float32 precision and use well under half the memory. """
+    patch = MathPentagrid(PenroseMap(array([.0, .1, .2, .3, -.6]))).get_patch(-5, 5)
+    store = TileStore.from_patch(*patch)
+    intersections, k_vals, tiles = store.patch()
+    assert (k_vals == patch[1]).all() and allclose(tiles, patch[2], atol=1e-5)
+    assert (intersections[:, 2:] == patch[0][:, 2:]).all()
+    assert store.nbytes < .4 * sum(array.nbytes for array in patch)
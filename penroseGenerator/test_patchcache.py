@@ -0,0 +1,58 @@
+""" Tests for the on-disk patch cache. """
+
+import os
+
+from numpy import array, allclose, memmap
+
+from penroseGenerator.src.penrose.mathpentagrid import MathPentagrid
+from penroseGenerator.src.penrose.patchcache import PatchCache
+from penroseGenerator.src.penrose.penrosemaps import PenroseMap
+
+def test_patch_cache(tmp_path):
+    """ Ensures cached patches equal generated ones, the cache keeps to its byte budget and survives broken files. """
+    mathpg = MathPentagrid(PenroseMap(array([.0, .1, .2, .3, -.6])))
+    cache = PatchCache(str(tmp_path))
+    expected = mathpg.get_patch(-2, 2)
+    for _ in range(2):
+        intersections, k_vals, tiles = cache.get_patch(mathpg, -2, 2)
+        assert (intersections == expected[0]).all() and (k_vals == expected[1]).all()
+        assert allclose(tiles, expected[2], atol=1e-6)
+    key = cache.make_key(mathpg.penrosemap, (-2, 2))
+    patchbytes = cache.total_bytes
+    assert cache.get(key) is not None and patchbytes > 0
+
+    cache.max_bytes = 2 * patchbytes
+    for imax in (3, 4):
+        cache.get_patch(mathpg, -2, imax)
+    assert cache.get(key) is None and cache.total_bytes <= cache.max_bytes
+    assert PatchCache(str(tmp_path)).total_bytes == cache.total_bytes
+
+    cache.max_bytes = 1 << 30
+    cache.get_patch(mathpg, -2, 2)
+    with open(tmp_path / key / "k_vals.npy", "wb") as file:
+        file.write(b"broken")
+    assert cache.get(key) is None and not (tmp_path / key).exists()
+    cache.get_patch(mathpg, -2, 2)
+    (tmp_path / key / "tiles.npy").unlink()
+    assert (cache.get_patch(mathpg, -2, 2)[1] == expected[1]).all()
+    assert cache.get(key) is not None and (tmp_path / key / "tiles.npy").exists()
+
+def test_patch_cache_hits_are_memory_mapped(tmp_path):
+    """ Ensures hits return the memory-mapped files themselves, and the store views them. """
+    mathpg = MathPentagrid(PenroseMap(array([.0, .1, .2, .3, -.6])))
+    cache = PatchCache(str(tmp_path))
+    cache.get_patch(mathpg, -2, 2)
+    patch = cache.get_patch(mathpg, -2, 2)
+    assert all(isinstance(column, memmap) for column in patch)
+    store = cache.get_store(mathpg, -2, 2)
+    assert store.points.base is not None and (store.grids == patch[0][:, 2:]).all()
+
+def test_patch_cache_failed_store(tmp_path, monkeypatch):
+    """ Ensures a patch that cannot be stored is still returned, and nothing is left behind or counted. """
+    mathpg = MathPentagrid(PenroseMap(array([.0, .1, .2, .3, -.6])))
+    cache = PatchCache(str(tmp_path))
+    def rename(*_):
+        raise PermissionError("read-only")
+    monkeypatch.setattr("penroseGenerator.src.penrose.patchcache.os.rename", rename)
+    intersections, _, _ = cache.get_patch(mathpg, -2, 2)
+    assert len(intersections) == 10 * 5 * 5 and cache.total_bytes == 0 and os.listdir(tmp_path) == []
@@ -0,0 +1,97 @@
+""" Tests for the Pentagrid sprite that are independent of a window. """
+
+from numpy import array, float32, linspace, zeros
+
+from penroseGenerator.src.penrose.mathpentagrid import MathPentagrid
+
+from penroseGenerator.src.penrose.patchcache import PatchCache
+from penroseGenerator.src.penrose.pentagrid import Pentagrid
+from penroseGenerator.src.penrose.penrosemaps import PenroseMap
+
+def test_full_and_incremental_frames_agree(tmp_path):
+    """ Ensures the full patch path, with and without cache, gives the tiles of the incremental path. """
+    gamma = array([.0, .1, .2, .3, -.6])
+    incremental = Pentagrid((64, 64), PenroseMap(gamma))
+    assert incremental.incremental is not None
+    frames = [incremental.compute_frame(incremental.snapshot())]
+    for cache in (None, PatchCache(str(tmp_path))):
+        full = Pentagrid((64, 64), PenroseMap(gamma), cache=cache, incremental=False)
+        assert full.incremental is None
+        frames.append(full.compute_frame(full.snapshot()))
+        frames.append(full.compute_frame(full.snapshot()))
+    for frame in frames[1:]:
+        assert frame.changes is None
+        assert (frame.intersections == frames[0].intersections).all()
+        assert abs(frame.tiles - frames[0].tiles).max() < 1e-6
+
+def test_filled_tiles_refill_on_content_change(monkeypatch):
+    """ Ensures the quad buffer is refilled when the tiles change in place, but not for the same tiles again. """
+    pentagrid = Pentagrid((64, 64))
+    intersections, _, tiles = MathPentagrid(pentagrid.mathpg.penrosemap).get_patch(-1, 1)
+    fills = []
+    set_quads = pentagrid.quadbuffer.set_quads
+    monkeypatch.setattr(pentagrid.quadbuffer, "set_quads", lambda *args: fills.append(1) or set_quads(*args))
+    pentagrid.draw_tiles_filled(intersections, tiles)
+    pentagrid.draw_tiles_filled(intersections, tiles.copy())
+    assert len(fills) == 1
+    tiles += 1
+    pentagrid.draw_tiles_filled(intersections, tiles)
+    assert len(fills) == 2 and (pentagrid.quadbuffer.quads[:len(tiles)] == tiles.astype(float32)).all()
+    intersections[:, 2:4] = intersections[::-1, 2:4]
+    pentagrid.draw_tiles_filled(intersections, tiles)
+    pentagrid.color_by_type = True
+    pentagrid.draw_tiles_filled(intersections, tiles)
+    assert len(fills) == 4
+
+def test_zoomed_out_frames_are_composed():
+    """ Ensures tiles smaller than `min_edge_px` are replaced by composed tiles covering the viewport. """
+    pentagrid = Pentagrid((64, 64))
+    assert pentagrid.snapshot().view is None and pentagrid.compute_frame(pentagrid.snapshot()).edge == 1
+    pentagrid.xyscale = array([.5, .5])
+    pentagrid.origin = pentagrid.size / pentagrid.xyscale / 2
+    frame = pentagrid.compute_frame(pentagrid.snapshot())
+    pyramid = pentagrid.get_pyramid(pentagrid.mathpg.penrosemap)
+    assert pyramid is not None and frame.edge == pyramid.scale(5) and frame.edge * .5 >= pentagrid.min_edge_px
+    assert (frame.tiles.min(axis=(0, 1)) < -64).all() and (frame.tiles.max(axis=(0, 1)) > 64).all()
+    pentagrid.mathpg.penrosemap.gamma = array([.0, .1, .2, .3, -.5])
+    assert pentagrid.get_pyramid(pentagrid.mathpg.penrosemap) is None
+    assert pentagrid.compute_frame(pentagrid.snapshot()).edge == 1
+
+def test_lod_weights():
+    """ Ensures the levels of detail switch fully at their thresholds and fade monotonically in between. """
+    pentagrid = Pentagrid((64, 64))
+    bias = pentagrid.quality.lod_bias
+    def weights(tilesize):
+        pentagrid.xyscale = array([tilesize, 2 * tilesize]) * bias
+        return pentagrid.get_lod_weights()
+    fill_px, outline_px = pentagrid.lod_fill_px, pentagrid.lod_outline_px
+    assert weights(fill_px) == (1, 0, 0) and weights(1.5 * fill_px) == (0, 1, 0)
+    assert weights(outline_px) == (0, 1, 0) and weights(1.5 * outline_px) == (0, 0, 1)
+    fades = [weights(tilesize) for tilesize in linspace(.5 * fill_px, 2 * outline_px, 200)]
+    rasters, fills, outlines = zip(*fades)
+    assert all(abs(sum(fade) - 1) < 1e-12 for fade in fades)
+    assert all(a >= b for a, b in zip(rasters, rasters[1:])) and all(a <= b for a, b in zip(outlines, outlines[1:]))
+    assert 0 < fills[len(fills) // 10] < 1
+
+def test_raster_counts_match_naive_loop():
+    """ Ensures the binned colors and coverage of the raster level equal a loop over every tile. """
+    pentagrid = Pentagrid((64, 64))
+    pentagrid.xyscale = array([2., 2.])
+    pentagrid.origin = pentagrid.size / pentagrid.xyscale / 2
+    intersections, _, tiles = MathPentagrid(pentagrid.mathpg.penrosemap).get_patch(-3, 3)
+    pixels = pentagrid.pixels()
+    pixels[:] = 0
+    pentagrid.draw_tiles_raster(intersections, tiles, .8)
+    block = pentagrid.lod_blocksize
+    counts, colorsums = zeros((16, 16)), zeros((16, 16, 3))
+    colors = pentagrid.get_tilecolors(intersections)
+    for tile, color in zip(tiles, colors):
+        x, y = pentagrid.transform_points_pixel(tile.mean(axis=0), float) // block
+        if 0 <= x < 16 and 0 <= y < 16:
+            counts[int(y), int(x)] += 1
+            colorsums[int(y), int(x)] += color[:3]
+    assert counts.max() > 1 and (counts == 0).any()
+    coverage = (counts * 4 / block**2).clip(0, 1) * .8
+    expected = colorsums / counts.clip(1)[..., None] * coverage[..., None]
+    expected = expected.repeat(block, 0).repeat(block, 1)
+    assert abs(pixels[..., :3] - expected).max() <= 1
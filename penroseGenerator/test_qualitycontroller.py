@@ -0,0 +1,29 @@
+""" Tests for the quality controller and the quality levels of the pentagrid. """
+
+from penroseGenerator.src.core.qualitycontroller import QualityController
+from penroseGenerator.src.penrose.pentagrid import Pentagrid
+
+def test_quality_controller():
+    """ Ensures quality degrades over budget and is restored level by level, shrinking the line range toward zero. """
+    pentagrid = Pentagrid((64, 64))
+    applied = []
+    def apply(level):
+        applied.append(level)
+        pentagrid.set_quality(level)
+    controller = QualityController(10.0, len(Pentagrid.QUALITY_LEVELS), apply, smoothing=1.0, patience=5)
+    for _ in range(10):
+        controller.update(20.0)
+    assert applied == [1, 2, 3, 4] and pentagrid.snapshot()[1:3] == (0, 0)
+    pentagrid.linemin, pentagrid.linemax = -4, 4
+    assert pentagrid.snapshot()[1:3] == (-2, 2)
+    for _ in range(4):
+        controller.update(1.0)
+    controller.update(8.0)
+    for _ in range(4):
+        controller.update(1.0)
+    assert applied == [1, 2, 3, 4]
+    controller.update(1.0)
+    assert applied == [1, 2, 3, 4, 3] and pentagrid.snapshot()[1:3] == (-3, 3)
+    for _ in range(30):
+        controller.update(1.0)
+    assert applied == [1, 2, 3, 4, 3, 2, 1, 0] and pentagrid.snapshot()[1:3] == (-4, 4)
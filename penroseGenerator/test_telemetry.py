@@ -0,0 +1,31 @@
+""" Tests for the progress telemetry of batch jobs. """
+
+import json
+import time
+
+from numpy import array
+
+from penroseGenerator.src.core.telemetry import JobTelemetry
+from penroseGenerator.src.penrose.mathpentagrid import MathPentagrid
+from penroseGenerator.src.penrose.penrosemaps import PenroseMap
+
+def test_telemetry(tmp_path):
+    """ Ensures rate, ETA and stalled workers are reported, and that a counted patch equals an uncounted one. """
+    telemetry = JobTelemetry(str(tmp_path / "job.jsonl"), "test", total_items=100, workers=2, stall_after=5.0)
+    telemetry._start = time.monotonic() - 10 #pylint: disable=protected-access
+    telemetry.advance(20, worker="a", busy=4.0)
+    telemetry.advance(5, worker="b", busy=1.0)
+    telemetry._lastseen["b"] -= 6 #pylint: disable=protected-access
+    report = telemetry.report()
+    assert abs(report["items_per_second"] - 2.5) < .1 and abs(report["eta_seconds"] - 30) < 1
+    assert abs(report["worker_utilization"] - .25) < .01 and report["stalled_workers"] == 1
+    telemetry.write(report)
+    assert json.loads((tmp_path / "job.jsonl").read_text())["items_done"] == 25
+
+    mathpg = MathPentagrid(PenroseMap(array([.0, .1, .2, .3, -.6])))
+    telemetry = JobTelemetry(str(tmp_path / "patch.prom"), "patch", interval=60)
+    with telemetry:
+        counted = mathpg.get_patch(-3, 3, telemetry)
+    assert telemetry.chunks == telemetry.total_chunks == 10 and telemetry.items == 10 * 7 * 7
+    assert all((a == b).all() for a, b in zip(counted, mathpg.get_patch(-3, 3)))
+    assert "penrose_job_items_done{job=\"patch\",unit=\"tiles\"} 490" in (tmp_path / "patch.prom").read_text()
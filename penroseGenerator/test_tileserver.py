@@ -0,0 +1,64 @@
+""" Tests for the tile server and the region patches it renders. """
+
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+from numpy import array, concatenate
+
+from penroseGenerator.src.penrose.mathpentagrid import MathPentagrid
+from penroseGenerator.src.penrose.penrosemaps import MultigridMap, PenroseMap
+from penroseGenerator.src.penrose.tileserver import TileServer
+
+def test_region_patch_matches_patch():
+    """ Ensures a region patch holds exactly the tiles of a large patch touching the region, for 4, 5 and 7 grids. """
+    lower, upper = array([-3., -2.]), array([2., 4.])
+    for gamma in ([.1, .2, .15, -.05], [.0, .1, .2, .3, -.6], [.1, -.2, .05, .3, .12, -.07, .2]):
+        penrosemap = PenroseMap(array(gamma)) if len(gamma) == 5 else MultigridMap(array(gamma))
+        mathpg = MathPentagrid(penrosemap)
+        intersections, k_vals, tiles = mathpg.get_patch(-12, 12)
+        touching = (tiles.max(axis=1) >= lower).all(axis=1) & (tiles.min(axis=1) <= upper).all(axis=1)
+        region = mathpg.get_region_patch(lower, upper)
+        def rows(intersections, k_vals):
+            return sorted(map(tuple, concatenate([intersections[:, 2:], k_vals], axis=1).round().tolist()))
+        assert len(region[0]) > 0 and rows(*region[:2]) == rows(intersections[touching], k_vals[touching])
+
+def test_tile_server_coalesces_and_recovers(monkeypatch):
+    """ Ensures concurrent requests for one tile render it once, and failed renderings answer 500 and are retried. """
+    started, release, renders = threading.Event(), threading.Event(), []
+    def render(*args):
+        renders.append(args)
+        started.set()
+        assert release.wait(10)
+        if len(renders) == 2:
+            raise RuntimeError("render failed")
+        return b"png"
+    monkeypatch.setattr("penroseGenerator.src.penrose.tileserver.render_worker_tile", render)
+    server = TileServer(PenroseMap(array([.0, .1, .2, .3, -.6])), workers=2)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(server.get_tile(1, 0, 0))) for _ in range(6)]
+    threads[0].start()
+    assert started.wait(10)
+    for thread in threads[1:]:
+        thread.start()
+    # Give the other requests time to find the rendering in flight.
+    time.sleep(.2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(renders) == 1 and results == [b"png"] * 6 and not server._inflight #pylint: disable=protected-access
+
+    with ThreadingHTTPServer(("127.0.0.1", 0), server.make_handler()) as httpserver:
+        threading.Thread(target=httpserver.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{httpserver.server_address[1]}/2/0/0.png"
+        with pytest.raises(HTTPError) as error:
+            urlopen(url, timeout=10)
+        assert error.value.code == 500
+        assert not server._inflight #pylint: disable=protected-access
+        with urlopen(url, timeout=10) as response:
+            assert response.status == 200 and response.read() == b"png"
+        httpserver.shutdown()
+    server.executor.shutdown()